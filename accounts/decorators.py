@@ -1,9 +1,50 @@
+import asyncio
 from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.views import redirect_to_login
 from django.http import HttpResponseForbidden, JsonResponse
 from django.shortcuts import redirect
 from .models import Staff
 
 
+def _guarded(view_func, check):
+    """Wrap `view_func` so that `check(request)` runs first.
+
+    `check` returns None to let the request through, or the response to send
+    instead. It may query the database (loading request.user does), so for
+    async views it runs through sync_to_async and the wrapper stays async.
+    """
+    if asyncio.iscoroutinefunction(view_func):
+        @wraps(view_func)
+        async def _wrapped_async(request, *args, **kwargs):
+            response = await sync_to_async(check)(request)
+            if response is not None:
+                return response
+            return await view_func(request, *args, **kwargs)
+
+        return _wrapped_async
+
+    @wraps(view_func)
+    def _wrapped(request, *args, **kwargs):
+        response = check(request)
+        if response is not None:
+            return response
+        return view_func(request, *args, **kwargs)
+
+    return _wrapped
+
+
+def login_required(view_func):
+    """django.contrib.auth's login_required, usable on async views as well."""
+    def check(request):
+        if not request.user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        return None
+
+    return _guarded(view_func, check)
+
+
 def staff_permission_required(name):
     """Decorator that accepts either:
       - a Django permission string ("app_label.codename")
@@ -14,90 +55,90 @@ def staff_permission_required(name):
       - Superusers bypass checks
       - Unauthenticated users are redirected to login
       - AJAX requests receive JSON 403
+      - Works on sync and async views
     """
 
-    def decorator(view_func):
-        @wraps(view_func)
-        def _wrapped(request, *args, **kwargs):
-            user = getattr(request, 'user', None)
-            if not user or not user.is_authenticated:
-                return redirect('accounts:login')
-
-            if user.is_superuser:
-                return view_func(request, *args, **kwargs)
+    def check(request):
+        user = getattr(request, 'user', None)
+        if not user or not user.is_authenticated:
+            return redirect('accounts:login')
 
-            # 1) If name looks like a permission (contains dot), use has_perm
-            if isinstance(name, str) and '.' in name:
-                if user.has_perm(name):
-                    return view_func(request, *args, **kwargs)
+        if user.is_superuser:
+            return None
 
-            # 2) If user has the permission via Django permissions (try as codename)
+        # 1) If name looks like a permission (contains dot), use has_perm
+        if isinstance(name, str) and '.' in name:
             if user.has_perm(name):
-                return view_func(request, *args, **kwargs)
+                return None
+
+        # 2) If user has the permission via Django permissions (try as codename)
+        if user.has_perm(name):
+            return None
 
-            # 3) If a group with this name exists on the user
-            if user.groups.filter(name=name).exists():
-                return view_func(request, *args, **kwargs)
+        # 3) If a group with this name exists on the user
+        if user.groups.filter(name=name).exists():
+            return None
 
-            # 4) Backwards-compat: check Staff boolean field (if present)
-            try:
-                staff = Staff.objects.get(user=user)
-            except Staff.DoesNotExist:
-                staff = None
+        # 4) Backwards-compat: check Staff boolean field (if present)
+        try:
+            staff = Staff.objects.get(user=user)
+        except Staff.DoesNotExist:
+            staff = None
 
-            if staff and hasattr(staff, name) and bool(getattr(staff, name)):
-                return view_func(request, *args, **kwargs)
+        if staff and hasattr(staff, name) and bool(getattr(staff, name)):
+            return None
 
-            # Deny
-            if request.headers.get('x-requested-with') == 'XMLHttpRequest' or getattr(request, 'is_ajax', lambda: False)():
-                return JsonResponse({'status': 'error', 'message': 'Permission denied'}, status=403)
-            return HttpResponseForbidden('Permission denied')
+        # Deny
+        if request.headers.get('x-requested-with') == 'XMLHttpRequest' or getattr(request, 'is_ajax', lambda: False)():
+            return JsonResponse({'status': 'error', 'message': 'Permission denied'}, status=403)
+        return HttpResponseForbidden('Permission denied')
 
-        return _wrapped
+    def decorator(view_func):
+        return _guarded(view_func, check)
 
     return decorator
 
 
 def require_module_access(module_name):
-    """Decorator to require access to a specific module
-    
+    """Decorator to require access to a specific module (sync or async views)
+
     Usage:
         @require_module_access('kitchen')
         def kitchen_view(request):
             ...
     """
+    def check(request):
+        user = getattr(request, 'user', None)
+
+        # Check if user is authenticated
+        if not user or not user.is_authenticated:
+            return redirect('accounts:login')
+
+        # Superusers always have access
+        if user.is_superuser:
+            return None
+
+        # Check if staff has module access
+        try:
+            staff = user.staff_profile
+            if module_name == 'dashboard':
+                # Dashboard requires ALL permissions
+                if staff.has_all_permissions():
+                    return None
+            else:
+                # Other modules require just that module permission
+                if staff.has_module_access(module_name):
+                    return None
+        except Staff.DoesNotExist:
+            pass
+
+        # Access denied
+        error_msg = 'Dashboard requires all module permissions' if module_name == 'dashboard' else f'Access to {module_name} module denied'
+        if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+            return JsonResponse({'status': 'error', 'message': error_msg}, status=403)
+        return HttpResponseForbidden(error_msg)
+
     def decorator(view_func):
-        @wraps(view_func)
-        def _wrapped(request, *args, **kwargs):
-            user = getattr(request, 'user', None)
-            
-            # Check if user is authenticated
-            if not user or not user.is_authenticated:
-                return redirect('accounts:login')
-            
-            # Superusers always have access
-            if user.is_superuser:
-                return view_func(request, *args, **kwargs)
-            
-            # Check if staff has module access
-            try:
-                staff = user.staff_profile
-                if module_name == 'dashboard':
-                    # Dashboard requires ALL permissions
-                    if staff.has_all_permissions():
-                        return view_func(request, *args, **kwargs)
-                else:
-                    # Other modules require just that module permission
-                    if staff.has_module_access(module_name):
-                        return view_func(request, *args, **kwargs)
-            except Staff.DoesNotExist:
-                pass
-            
-            # Access denied
-            error_msg = 'Dashboard requires all module permissions' if module_name == 'dashboard' else f'Access to {module_name} module denied'
-            if request.headers.get('x-requested-with') == 'XMLHttpRequest':
-                return JsonResponse({'status': 'error', 'message': error_msg}, status=403)
-            return HttpResponseForbidden(error_msg)
-        
-        return _wrapped
+        return _guarded(view_func, check)
+
     return decorator
@@ -0,0 +1,7 @@
+"""
+Micro and load benchmarks for the restaurant app.
+
+Each module is runnable on its own, e.g.:
+    python -m benchmarks.bench_timezone
+and prints its results as JSON so runs can be compared across commits.
+"""
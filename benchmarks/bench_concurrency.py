@@ -0,0 +1,225 @@
+"""
+Compare how many held kitchen board polls the WSGI and ASGI deployments serve at once.
+
+Usage: python -m benchmarks.bench_concurrency [--mode both|wsgi|asgi] [--clients N]
+           [--wait SECONDS] [--wsgi-workers N] [--probes N] [--output results.json]
+
+Creates a fresh test database, seeds it (see benchmarks.seed) and opens
+`--clients` long polls of the kitchen feed at the same moment
+(/kitchen/orders/api/?since=<etag>&wait=<--wait>; nothing changes, so each
+is held for the full wait). `--probes` plain feed requests follow 100ms
+later, as a board that just loaded would send them. Every request goes
+through the full middleware stack as a logged-in superuser.
+
+    wsgi  Django's WSGI handler on a pool of `--wsgi-workers` threads, each
+          serving one request at a time like a gunicorn sync worker.
+    asgi  Django's ASGI handler on one event loop, like a single uvicorn
+          worker.
+
+Both run in this process, without a server or sockets, so the numbers are
+the application's own capacity rather than the server's. For each mode it
+reports the wall time, the average number of polls held at once
+(clients * wait / wall time) and latency percentiles for polls and probes.
+"""
+
+import argparse
+import asyncio
+import io
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from benchmarks.common import environment, report, setup_django, summarize, test_database
+from benchmarks.seed import USERNAME, seed
+
+FEED = '/kitchen/orders/api/'
+PROBE_DELAY = 0.1
+
+
+def wsgi_get(application, path, query, cookie):
+    """GET `path` through a WSGI application; returns the status code."""
+    environ = {
+        'REQUEST_METHOD': 'GET',
+        'SCRIPT_NAME': '',
+        'PATH_INFO': path,
+        'QUERY_STRING': query,
+        'SERVER_NAME': 'testserver',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': 'testserver',
+        'HTTP_COOKIE': cookie,
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': io.BytesIO(b''),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    statuses = []
+    response = application(environ, lambda status, headers, exc_info=None: statuses.append(status))
+    try:
+        b''.join(response)
+    finally:
+        response.close()
+    return int(statuses[0].split()[0])
+
+
+async def asgi_get(application, path, query, cookie):
+    """GET `path` through an ASGI application; returns the status code."""
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode('ascii'),
+        'query_string': query.encode('ascii'),
+        'root_path': '',
+        'headers': [(b'host', b'testserver'), (b'cookie', cookie.encode('ascii'))],
+        'client': ('127.0.0.1', 0),
+        'server': ('testserver', 80),
+    }
+    pending = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+    statuses = []
+
+    async def receive():
+        if pending:
+            return pending.pop()
+        # The client never disconnects
+        await asyncio.Event().wait()
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            statuses.append(message['status'])
+
+    await application(scope, receive, send)
+    return statuses[0]
+
+
+class Timings:
+    """Latencies (ms) and failures of polls and probes."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {'polls': [], 'probes': []}
+        self.errors = {'polls': 0, 'probes': 0}
+
+    def record(self, kind, submitted, status):
+        with self.lock:
+            self.latencies[kind].append((time.perf_counter() - submitted) * 1000.0)
+            if status != 200:
+                self.errors[kind] += 1
+
+    def results(self, clients, wait, elapsed):
+        return {
+            'seconds': round(elapsed, 2),
+            'polls_held_at_once': round(clients * wait / elapsed, 1) if elapsed else None,
+            'polls': dict(summarize(self.latencies['polls'], elapsed), errors=self.errors['polls']),
+            'probes': dict(summarize(self.latencies['probes'], elapsed), errors=self.errors['probes']),
+        }
+
+
+def run_wsgi(cookie, poll_query, clients, probes, workers):
+    from django.core.wsgi import get_wsgi_application
+    from django.db import connections
+
+    application = get_wsgi_application()
+    timings = Timings()
+
+    def call(kind, query, submitted):
+        try:
+            status = wsgi_get(application, FEED, query, cookie)
+        except Exception:
+            status = None
+        finally:
+            connections.close_all()
+        timings.record(kind, submitted, status)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for _ in range(clients):
+            pool.submit(call, 'polls', poll_query, time.perf_counter())
+        time.sleep(PROBE_DELAY)
+        for _ in range(probes):
+            pool.submit(call, 'probes', '', time.perf_counter())
+    return timings, time.perf_counter() - started
+
+
+def run_asgi(cookie, poll_query, clients, probes):
+    from django.core.asgi import get_asgi_application
+
+    application = get_asgi_application()
+    timings = Timings()
+
+    async def call(kind, query, delay=0.0):
+        await asyncio.sleep(delay)
+        submitted = time.perf_counter()
+        try:
+            status = await asgi_get(application, FEED, query, cookie)
+        except Exception:
+            status = None
+        timings.record(kind, submitted, status)
+
+    async def main():
+        await asyncio.gather(
+            *(call('polls', poll_query) for _ in range(clients)),
+            *(call('probes', '', PROBE_DELAY) for _ in range(probes)),
+        )
+
+    started = time.perf_counter()
+    asyncio.run(main())
+    return timings, time.perf_counter() - started
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mode', choices=('both', 'wsgi', 'asgi'), default='both')
+    parser.add_argument('--clients', type=int, default=40, help='Long polls opened at once')
+    parser.add_argument('--wait', type=float, default=2.0, help='Seconds each poll is held')
+    parser.add_argument('--wsgi-workers', type=int, default=4, help='Sync workers of the WSGI deployment')
+    parser.add_argument('--probes', type=int, default=10, help='Plain feed requests sent during the polls')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='Also write the JSON results to this file')
+    args = parser.parse_args(argv)
+
+    setup_django()
+
+    from django.conf import settings
+    from django.test import Client
+    from django.test.utils import override_settings
+
+    from accounts.models import User
+
+    workers = max(1, args.wsgi_workers)
+    with override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage'), \
+            test_database():
+        seeded = seed('small', args.seed)
+        client = Client()
+        client.force_login(User.objects.get(username=USERNAME))
+        cookie = f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}'
+        etag = client.get(FEED).json()['etag']
+        poll_query = urlencode({'since': etag, 'wait': args.wait})
+
+        results = {
+            'environment': dict(environment(), clients=args.clients, wait=args.wait, wsgi_workers=workers),
+            'seed': seeded,
+        }
+        if args.mode in ('both', 'wsgi'):
+            timings, elapsed = run_wsgi(cookie, poll_query, args.clients, args.probes, workers)
+            results['wsgi'] = timings.results(args.clients, args.wait, elapsed)
+        if args.mode in ('both', 'asgi'):
+            timings, elapsed = run_asgi(cookie, poll_query, args.clients, args.probes)
+            results['asgi'] = timings.results(args.clients, args.wait, elapsed)
+
+    report('concurrency', results)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as handle:
+            report('concurrency', results, stream=handle)
+
+
+if __name__ == '__main__':
+    main()
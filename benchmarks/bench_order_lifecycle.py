@@ -0,0 +1,223 @@
+"""
+Benchmark the order lifecycle end to end through Django's test client.
+
+Usage: python -m benchmarks.bench_order_lifecycle [--scale small|medium|large]
+           [--lifecycles N] [--reads N] [--concurrency N] [--output results.json]
+
+Creates a fresh test database (test_<NAME> of the configured database, so
+SQLite locally or Postgres when DB_* / Supabase settings are set), seeds it
+(see benchmarks.seed), then drives every request through the full middleware
+stack as a logged-in superuser:
+
+    place_order -> add_item -> kitchen_poll -> add_payment -> close_order
+
+for `--lifecycles` orders, followed by `--reads` loads of the transaction
+history page and the CSV export (last 30 days). For each operation it
+reports throughput, latency percentiles and queries per request as JSON.
+Static files are served by the plain storage so no collectstatic is needed.
+"""
+
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from datetime import timedelta
+
+from benchmarks.common import QueryCounter, environment, report, setup_django, summarize, test_database
+from benchmarks.seed import SCALES, USERNAME, seed
+
+LIFECYCLE = ('place_order', 'add_item', 'kitchen_poll', 'add_payment', 'close_order')
+
+
+class Recorder:
+    """Per-operation timings, query counts and errors, shared by client threads."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.timings = {}
+        self.queries = {}
+        self.errors = {}
+
+    def call(self, name, fn, expected=(200,)):
+        with QueryCounter() as counter:
+            t0 = time.perf_counter()
+            try:
+                response = fn()
+                if getattr(response, 'streaming', False):
+                    b''.join(response.streaming_content)
+                ok = response.status_code in expected
+            except Exception:
+                response, ok = None, False
+            elapsed = (time.perf_counter() - t0) * 1000.0
+        with self.lock:
+            self.timings.setdefault(name, []).append(elapsed)
+            self.queries.setdefault(name, []).append(counter.count)
+            self.errors[name] = self.errors.get(name, 0) + (0 if ok else 1)
+        return response if ok else None
+
+    def results(self, names, concurrency):
+        results = {}
+        for name in names:
+            if name in self.timings:
+                # Throughput of this operation alone: calls per second of time spent in it
+                busy = sum(self.timings[name]) / 1000.0 / concurrency
+                results[name] = dict(
+                    summarize(self.timings[name], busy, self.queries[name]), errors=self.errors[name]
+                )
+        return results
+
+
+def run_lifecycles(recorder, user, tables, items, count, seed_value):
+    from django.test import Client
+
+    from restaurant.models import Order
+
+    client = Client()
+    client.force_login(user)
+    rng = random.Random(seed_value)
+    for n in range(count):
+        name = f'Bench {seed_value}-{n}'
+        picked = rng.sample(items, 2)
+        data = {
+            'customer_name': name,
+            'customer_phone': '9800000000',
+            'form-TOTAL_FORMS': '2',
+            'form-INITIAL_FORMS': '0',
+            'form-MIN_NUM_FORMS': '0',
+            'form-MAX_NUM_FORMS': '1000',
+        }
+        for index, item_id in enumerate(picked):
+            data[f'form-{index}-item'] = str(item_id)
+            data[f'form-{index}-quantity'] = str(rng.randint(1, 3))
+        if not recorder.call('place_order', lambda: client.post(f'/order/place/{rng.choice(tables)}/', data),
+                             expected=(302,)):
+            continue
+
+        order = Order.objects.filter(customer_name=name).values('pk', 'order_id').first()
+        if order is None:
+            continue
+        payload = json.dumps({'item_id': rng.choice(items), 'quantity': 1})
+        recorder.call('add_item', lambda: client.post(
+            f"/order/{order['order_id']}/add_item/", payload, content_type='application/json'
+        ))
+        recorder.call('kitchen_poll', lambda: client.get('/kitchen/orders/api/'))
+
+        remaining = Order.objects.get(pk=order['pk']).remaining_amount
+        recorder.call('add_payment', lambda: client.post(f"/add_payment/{order['pk']}/", {
+            'payment_method': 'cash', 'amount': str(remaining), 'transaction_id': '',
+        }))
+        recorder.call('close_order', lambda: client.post(f"/order/close/{order['pk']}/"), expected=(302,))
+
+
+def run_reads(recorder, user, count):
+    from django.test import Client
+    from django.utils import timezone
+
+    client = Client()
+    client.force_login(user)
+    today = timezone.localdate()
+    export = {'start_date': (today - timedelta(days=30)).isoformat(), 'end_date': today.isoformat()}
+    for _ in range(count):
+        recorder.call('transaction_history', lambda: client.get('/transaction_history/'))
+        recorder.call('transaction_history_csv', lambda: client.get('/transaction_history/export/csv/', export))
+
+
+def timed_threads(target, concurrency, args_for):
+    threads = [threading.Thread(target=target, args=args_for(index)) for index in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--months', type=int, help='Override the months of seeded history')
+    parser.add_argument('--orders-per-day', type=int, help='Override the seeded history orders per day')
+    parser.add_argument('--lifecycles', type=int, default=100, help='Orders taken from placement to close')
+    parser.add_argument('--reads', type=int, default=20, help='Loads of the history page and CSV export')
+    parser.add_argument('--warmup', type=int, default=3, help='Untimed lifecycles first (cold caches)')
+    parser.add_argument('--concurrency', type=int, default=1, help='Client threads (Postgres only; SQLite runs one)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--keepdb', action='store_true', help='Keep the test database between runs')
+    parser.add_argument('--output', help='Also write the JSON results to this file')
+    args = parser.parse_args(argv)
+
+    setup_django()
+
+    from django.db import connection, connections
+    from django.test.utils import override_settings
+
+    from accounts.models import User
+    from restaurant.models import MenuItem, Table
+
+    overrides = {key: value for key, value in (('months', args.months), ('orders_per_day', args.orders_per_day))
+                 if value is not None}
+    concurrency = max(1, args.concurrency)
+
+    with override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage'), \
+            test_database(keepdb=args.keepdb):
+        if args.keepdb and User.objects.filter(username=USERNAME).exists():
+            seeded = {'reused': True}
+        else:
+            t0 = time.perf_counter()
+            seeded = seed(args.scale, args.seed, **overrides)
+            seeded['seconds'] = round(time.perf_counter() - t0, 2)
+
+        if connection.vendor == 'sqlite' and concurrency > 1:
+            # The in-memory test database allows one writer at a time; threads
+            # would only measure lock errors
+            sys.stderr.write('SQLite test database: running with --concurrency 1\n')
+            concurrency = 1
+
+        user = User.objects.get(username=USERNAME)
+        tables = list(Table.objects.values_list('pk', flat=True))
+        items = list(MenuItem.objects.filter(is_available=True).values_list('pk', flat=True))
+
+        def close_connection(fn):
+            def wrapper(*fn_args):
+                try:
+                    fn(*fn_args)
+                finally:
+                    connections.close_all()
+            return wrapper
+
+        run_lifecycles(Recorder(), user, tables, items, args.warmup, -1)
+        recorder = Recorder()
+        per_thread = max(1, args.lifecycles // concurrency)
+        lifecycle_elapsed = timed_threads(
+            close_connection(run_lifecycles), concurrency,
+            lambda index: (recorder, user, tables, items, per_thread, args.seed + index),
+        )
+        read_elapsed = timed_threads(
+            close_connection(run_reads), concurrency,
+            lambda index: (recorder, user, max(1, args.reads // concurrency)),
+        )
+
+        results = {
+            'environment': dict(environment(), concurrency=concurrency),
+            'seed': seeded,
+            'lifecycle': dict(
+                recorder.results(LIFECYCLE, concurrency),
+                orders_per_sec=round(len(recorder.timings.get('close_order', ())) / lifecycle_elapsed, 2),
+                seconds=round(lifecycle_elapsed, 2),
+            ),
+            'reads': dict(
+                recorder.results(('transaction_history', 'transaction_history_csv'), concurrency),
+                seconds=round(read_elapsed, 2),
+            ),
+        }
+
+    report('order_lifecycle', results)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as handle:
+            report('order_lifecycle', results, stream=handle)
+
+
+if __name__ == '__main__':
+    main()
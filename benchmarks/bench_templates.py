@@ -0,0 +1,116 @@
+"""
+Benchmark rendering of the heaviest pages with and without template caching.
+
+Usage: python -m benchmarks.bench_templates [--scale small|medium|large]
+           [--iterations N] [--warmup N] [--output results.json]
+
+Creates a fresh test database, seeds it (see benchmarks.seed) and loads
+each page through Django's test client as a logged-in superuser:
+
+    order_detail, place_order, place_order_takeaway, place_order_delivery,
+    transaction_history, dashboard
+
+under three template setups:
+
+    uncached    filesystem and app directory loaders re-read and re-parse
+                every template on each render (what DEBUG gives), and
+                fragment caching is off
+    loader      the cached loader keeps compiled templates in the process
+    fragments   the cached loader plus {% cache %} fragments (the menu
+                option lists of order_detail, keyed on the menu catalog)
+
+For each page and setup it reports throughput, latency percentiles and
+queries per request as JSON. Static files are served by the plain storage
+so no collectstatic is needed.
+"""
+
+import argparse
+import time
+
+from benchmarks.common import environment, measure, report, setup_django, test_database
+from benchmarks.seed import SCALES, USERNAME, seed
+
+PAGES = (
+    'order_detail', 'place_order', 'place_order_takeaway', 'place_order_delivery',
+    'transaction_history', 'dashboard',
+)
+SETUPS = ('uncached', 'loader', 'fragments')
+
+
+def templates_setting(base, cached):
+    """`base` TEMPLATES with the given loaders (APP_DIRS must then be off)."""
+    loaders = ['django.template.loaders.filesystem.Loader', 'django.template.loaders.app_directories.Loader']
+    if cached:
+        loaders = [('django.template.loaders.cached.Loader', loaders)]
+    engine = dict(base[0], APP_DIRS=False)
+    engine['OPTIONS'] = dict(engine.get('OPTIONS', {}), loaders=loaders)
+    return [engine] + list(base[1:])
+
+
+def caches_setting(base, fragments):
+    """`base` CACHES with a template fragment cache that stores or discards."""
+    backend = 'django.core.cache.backends.locmem.LocMemCache' if fragments else \
+        'django.core.cache.backends.dummy.DummyCache'
+    return dict(base, template_fragments={'BACKEND': backend, 'LOCATION': 'bench-fragments'})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--iterations', type=int, default=100, help='Loads of each page per setup')
+    parser.add_argument('--warmup', type=int, default=5, help='Untimed loads first')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='Also write the JSON results to this file')
+    args = parser.parse_args(argv)
+
+    setup_django()
+
+    from django.conf import settings
+    from django.test import Client
+    from django.test.utils import override_settings
+
+    from accounts.models import User
+    from restaurant.models import Order, Table
+
+    with override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage'), \
+            test_database():
+        t0 = time.perf_counter()
+        seeded = seed(args.scale, args.seed)
+        seeded['seconds'] = round(time.perf_counter() - t0, 2)
+
+        client = Client()
+        client.force_login(User.objects.get(username=USERNAME))
+        order = Order.objects.exclude(status__in=['completed', 'cancelled']).order_by('pk').first()
+        table = Table.objects.order_by('pk').first()
+        urls = {
+            'order_detail': f'/order_details/{order.order_id}/',
+            'place_order': f'/order/place/{table.pk}/',
+            'place_order_takeaway': '/place_order_takeaway/',
+            'place_order_delivery': '/place_order_delivery/',
+            'transaction_history': '/transaction_history/',
+            'dashboard': '/',
+        }
+
+        results = {'environment': environment(), 'seed': seeded}
+        for setup in SETUPS:
+            with override_settings(
+                TEMPLATES=templates_setting(settings.TEMPLATES, cached=setup != 'uncached'),
+                CACHES=caches_setting(settings.CACHES, fragments=setup == 'fragments'),
+            ):
+                results[setup] = {}
+                for page in PAGES:
+                    url = urls[page]
+                    status = client.get(url).status_code
+                    results[setup][page] = dict(
+                        measure(lambda: client.get(url), args.iterations, args.warmup, count_queries=True),
+                        status=status,
+                    )
+
+    report('templates', results)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as handle:
+            report('templates', results, stream=handle)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""
+Benchmark TimezoneMiddleware on the per-request hot path.
+
+Usage: python -m benchmarks.bench_timezone [--iterations N]
+"""
+
+import argparse
+import itertools
+
+from benchmarks.common import measure, report, setup_django
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--iterations', type=int, default=20000)
+    args = parser.parse_args(argv)
+
+    setup_django()
+
+    from django.conf import settings
+    from django.http import HttpResponse
+    from django.test import RequestFactory
+    from restaurant.middleware import TimezoneMiddleware, get_zoneinfo
+
+    middleware = TimezoneMiddleware(lambda request: HttpResponse())
+    factory = RequestFactory()
+
+    def run_with_cookie(value):
+        request = factory.get('/')
+        if value is not None:
+            request.COOKIES['user_timezone'] = value
+        return lambda: middleware(request)
+
+    counter = itertools.count()
+
+    def churn():
+        # A fresh bogus name on every request, as an attacker rotating cookies would send
+        request = factory.get('/')
+        request.COOKIES['user_timezone'] = f'Bogus/Zone_{next(counter)}'
+        middleware(request)
+
+    oversized = run_with_cookie('A' * 4096)
+
+    results = {
+        'no_cookie': measure(run_with_cookie(None), args.iterations),
+        'default_zone_cookie': measure(run_with_cookie(settings.TIME_ZONE), args.iterations),
+        'valid_zone_cookie': measure(run_with_cookie('Asia/Kathmandu'), args.iterations),
+        'invalid_zone_cookie': measure(run_with_cookie('Not/A_Zone'), args.iterations),
+        'oversized_cookie': measure(oversized, args.iterations),
+        'invalid_zone_churn': measure(churn, args.iterations),
+        'zone_cache': get_zoneinfo.cache_info()._asdict(),
+    }
+    report('timezone_middleware', results)
+
+
+if __name__ == '__main__':
+    main()
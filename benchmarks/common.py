@@ -0,0 +1,133 @@
+"""
+Shared helpers for the benchmark scripts.
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+
+
+def setup_django():
+    """Configure Django for a standalone benchmark run."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'restaurant_project.settings')
+    import django
+    django.setup()
+
+
+def percentile(sorted_values, pct):
+    """Return the `pct` percentile (0-100) of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(timings, elapsed, queries=None):
+    """Throughput and latency stats (ms) for a list of per-call timings in ms.
+
+    `queries`, when given, is the list of per-call query counts.
+    """
+    timings = sorted(timings)
+    count = len(timings)
+    result = {
+        'iterations': count,
+        'ops_per_sec': round(count / elapsed, 2) if elapsed else None,
+        'mean_ms': round(statistics.mean(timings), 4) if timings else 0.0,
+        'p50_ms': round(percentile(timings, 50), 4),
+        'p95_ms': round(percentile(timings, 95), 4),
+        'p99_ms': round(percentile(timings, 99), 4),
+    }
+    if queries is not None:
+        result['queries_per_op'] = round(statistics.mean(queries), 2) if queries else 0.0
+        result['max_queries'] = max(queries, default=0)
+    return result
+
+
+def measure(fn, iterations=1000, warmup=50, count_queries=False):
+    """Call `fn` repeatedly and return throughput and latency stats (ms).
+
+    With `count_queries`, also report the database queries per call.
+    """
+    for _ in range(warmup):
+        fn()
+
+    timings = []
+    queries = [] if count_queries else None
+    started = time.perf_counter()
+    for _ in range(iterations):
+        if count_queries:
+            with QueryCounter() as counter:
+                t0 = time.perf_counter()
+                fn()
+                timings.append((time.perf_counter() - t0) * 1000.0)
+            queries.append(counter.count)
+        else:
+            t0 = time.perf_counter()
+            fn()
+            timings.append((time.perf_counter() - t0) * 1000.0)
+    elapsed = time.perf_counter() - started
+    return summarize(timings, elapsed, queries)
+
+
+class QueryCounter:
+    """Count queries on the default connection (works with DEBUG off)."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        from django.db import connection
+        self._wrapper = connection.execute_wrapper(self)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        return self._wrapper.__exit__(*exc_info)
+
+
+@contextmanager
+def test_database(keepdb=False):
+    """Run the block against a fresh test database (test_<NAME>), never the real one."""
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=keepdb, serialize=False)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=keepdb)
+        teardown_test_environment()
+
+
+def environment():
+    """Where a run happened, so result files can be compared across commits."""
+    from django.db import connection
+
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'database': connection.vendor,
+        'python': sys.version.split()[0],
+    }
+
+
+def report(name, results, stream=None):
+    """Print benchmark results as a JSON document."""
+    stream = stream or sys.stdout
+    json.dump({'benchmark': name, 'results': results}, stream, indent=2, default=str)
+    stream.write('\n')
@@ -0,0 +1,57 @@
+"""
+Seed a benchmark database with a realistic restaurant.
+
+Scales are presets of (categories, items per category, tables, months of
+history, history orders per day, active orders); any of them can be
+overridden. The rows come from restaurant.synthetic (the generator behind
+`manage.py seed_restaurant`), so volumes follow weekday/hour curves and menu
+popularity is skewed. Only call this against a scratch database (see
+common.test_database).
+"""
+
+SCALES = {
+    'small': {'categories': 5, 'items_per_category': 8, 'tables': 10, 'months': 2,
+              'orders_per_day': 20, 'active_orders': 10},
+    'medium': {'categories': 10, 'items_per_category': 15, 'tables': 30, 'months': 6,
+               'orders_per_day': 80, 'active_orders': 40},
+    'large': {'categories': 15, 'items_per_category': 25, 'tables': 60, 'months': 12,
+              'orders_per_day': 250, 'active_orders': 120},
+}
+
+USERNAME = 'bench_admin'
+PASSWORD = 'bench-password'
+
+
+def seed(scale='small', seed_value=42, **overrides):
+    """Create a superuser, the menu, tables, history and active orders; return a summary dict."""
+    from accounts.models import User
+    from restaurant import synthetic
+    from restaurant.models import OrderHistoryItem
+
+    params = dict(SCALES[scale], **overrides)
+    User.objects.create_superuser(
+        username=USERNAME, email=f'{USERNAME}@example.com', password=PASSWORD, role='admin'
+    )
+    plan = synthetic.build_plan(
+        days=params['months'] * 30,
+        orders_per_day=params['orders_per_day'],
+        seed=seed_value,
+        categories=params['categories'],
+        items_per_category=params['items_per_category'],
+        tables=params['tables'],
+    )
+    synthetic.prepare(plan)
+    history_orders = synthetic.generate_days(plan, plan.days)
+    active_orders = synthetic.generate_active_orders(plan, params['active_orders'])
+    synthetic.finish()
+
+    return {
+        'scale': scale,
+        'seed': seed_value,
+        'menu_items': len(plan.items),
+        'tables': len(plan.table_ids),
+        'history_orders': history_orders,
+        'history_items': OrderHistoryItem.objects.count(),
+        'active_orders': active_orders,
+        'username': USERNAME,
+    }
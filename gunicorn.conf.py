@@ -0,0 +1,57 @@
+"""
+Gunicorn settings for the web process.
+
+Usage: gunicorn restaurant_project.wsgi -c gunicorn.conf.py
+       gunicorn restaurant_project.asgi:application -c gunicorn.conf.py -k uvicorn.workers.UvicornWorker
+
+The application is preloaded and warmed up once in the master (see
+restaurant_project/startup.py) and workers are forked from it, so the
+settings' DNS checks, the pooler health check, imports and caches are not
+repeated per worker. Each worker opens its own database connection after
+the fork. Bind address and worker count follow gunicorn's usual PORT and
+WEB_CONCURRENCY environment variables.
+
+Preloading means code changes need a full restart; a HUP signal reloads
+the workers from the already loaded code.
+"""
+
+import logging
+import os
+import time
+
+_started = time.perf_counter()
+
+preload_app = True
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '60'))
+
+logger = logging.getLogger('gunicorn.error')
+
+
+def _elapsed_ms(since):
+    return (time.perf_counter() - since) * 1000.0
+
+
+def when_ready(server):
+    # The app is loaded (preload_app) and no worker is forked yet
+    from restaurant_project import startup
+
+    startup.warm_up()
+    logger.info(f"Cold start: master ready in {_elapsed_ms(_started):.0f}ms")
+
+
+def pre_fork(server, worker):
+    worker.forked_at = time.perf_counter()
+
+
+def post_fork(server, worker):
+    from restaurant_project import startup
+
+    # Only sync workers run queries on the thread that forked
+    ms = startup.setup_worker(connect=server.cfg.worker_class_str == 'sync')
+    logger.info(f"Worker {worker.pid}: database set up in {ms:.0f}ms")
+
+
+def post_worker_init(worker):
+    forked_at = getattr(worker, 'forked_at', None)
+    if forked_at is not None:
+        logger.info(f"Worker {worker.pid} ready {_elapsed_ms(forked_at):.0f}ms after fork")
@@ -6,9 +6,13 @@ This script safely migrates your Django database from local SQLite to Supabase P
 It handles:
 - Connection validation
 - Django migrations
-- Data export and import
+- Streaming, resumable table-by-table data copy (restaurant_project.db_copy)
 - Backup creation
-- Verification
+- Verification by checksums per primary-key range, drilling down to the differing rows
+
+The data is copied in chunks with COPY FROM STDIN and checkpointed in the
+target database; if a run fails, running the script again resumes where it
+stopped. Set DB_SSLMODE=disable to try it against a local PostgreSQL.
 
 Usage:
     python migrate_sqlite_to_supabase.py                    # Full migration
@@ -16,13 +20,14 @@ Usage:
     python migrate_sqlite_to_supabase.py --backup          # Create backup before migration
     python migrate_sqlite_to_supabase.py --force           # Force migration even if tables exist
     python migrate_sqlite_to_supabase.py --verify-only     # Verify data was migrated correctly
+    python migrate_sqlite_to_supabase.py --restart         # Discard checkpoints and copy from scratch
 """
 
 import os
 import sys
 import django
 import json
-import shutil
+import sqlite3
 import logging
 from datetime import datetime
 from pathlib import Path
@@ -34,11 +39,12 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'restaurant_project.settings.bas
 django.setup()
 
 from django.core.management import call_command
-from django.db import connections, DEFAULT_DB_ALIAS
-from django.core.serializers import serialize
-from django.contrib.contenttypes.models import ContentType
 import psycopg2
-from psycopg2 import sql
+
+from restaurant_project.db_copy import CHECKPOINT_TABLE, DEFAULT_CHUNK_SIZE, SQLiteToPostgresCopier, open_source
+from restaurant_project.db_verify import Verifier
+
+SQLITE_PATH = 'restaurant_project/db.sqlite3'
 
 # Setup logging
 logging.basicConfig(
@@ -54,11 +60,16 @@ logger = logging.getLogger(__name__)
 class SupabaseMigration:
     """Handles SQLite to Supabase PostgreSQL migration"""
     
-    def __init__(self, backup=False, force=False, test_only=False, verify_only=False):
+    def __init__(self, backup=False, force=False, test_only=False, verify_only=False,
+                 restart=False, sqlite_path=SQLITE_PATH, chunk_size=DEFAULT_CHUNK_SIZE, workers=None):
         self.backup = backup
         self.force = force
         self.test_only = test_only
         self.verify_only = verify_only
+        self.restart = restart
+        self.sqlite_path = Path(sqlite_path)
+        self.chunk_size = chunk_size
+        self.workers = workers
         self.backup_dir = None
         self.migration_errors = []
         self.migration_warnings = []
@@ -85,6 +96,7 @@ class SupabaseMigration:
             'DB_USER': config('DB_USER', default='postgres'),
             'DB_PASSWORD': config('DB_PASSWORD', default=''),
             'DB_PORT': config('DB_PORT', default='5432', cast=int),
+            'DB_SSLMODE': config('DB_SSLMODE', default='require'),
         }
         
         if not config_dict['DB_HOST']:
@@ -108,20 +120,28 @@ class SupabaseMigration:
             
         return True
         
+    def connection_params(self, config_dict):
+        """psycopg2.connect() arguments for the Supabase database"""
+        return {
+            'host': config_dict['DB_HOST'],
+            'database': config_dict['DB_NAME'],
+            'user': config_dict['DB_USER'],
+            'password': config_dict['DB_PASSWORD'],
+            'port': config_dict['DB_PORT'],
+            'sslmode': config_dict['DB_SSLMODE'],
+            'connect_timeout': 10,
+        }
+        
+    def connect(self, config_dict):
+        """Open a psycopg2 connection to the Supabase database"""
+        return psycopg2.connect(**self.connection_params(config_dict))
+        
     def test_supabase_connection(self, config_dict):
         """Test connection to Supabase database"""
         self.log_info("Testing Supabase connection...")
         
         try:
-            conn = psycopg2.connect(
-                host=config_dict['DB_HOST'],
-                database=config_dict['DB_NAME'],
-                user=config_dict['DB_USER'],
-                password=config_dict['DB_PASSWORD'],
-                port=config_dict['DB_PORT'],
-                sslmode='require',
-                connect_timeout=10
-            )
+            conn = self.connect(config_dict)
             conn.close()
             self.log_info("Successfully connected to Supabase!")
             return True
@@ -133,9 +153,8 @@ class SupabaseMigration:
         """Create backup of SQLite database"""
         self.log_info("Creating backup of SQLite database...")
         
-        sqlite_path = Path('restaurant_project/db.sqlite3')
-        if not sqlite_path.exists():
-            self.log_error("SQLite database not found at db.sqlite3")
+        if not self.sqlite_path.exists():
+            self.log_error(f"SQLite database not found at {self.sqlite_path}")
             return False
             
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
@@ -143,16 +162,18 @@ class SupabaseMigration:
         backup_dir.mkdir(parents=True, exist_ok=True)
         
         try:
-            # Backup database file
+            # Backup database file (page by page, consistent even if in use)
             backup_db = backup_dir / 'db.sqlite3'
-            shutil.copy2(sqlite_path, backup_db)
+            source = open_source(self.sqlite_path)
+            with sqlite3.connect(backup_db) as copy:
+                source.backup(copy)
             self.log_info(f"SQLite database backed up to {backup_db}")
             
-            # Export data as JSON
-            backup_json = backup_dir / 'data.json'
-            with open(backup_json, 'w') as f:
-                json.dump(json.loads(serialize('json', self._get_all_models())), f, indent=2)
-            self.log_info(f"Data exported to {backup_json}")
+            # Export data as JSON lines, one row at a time
+            backup_json = backup_dir / 'data.jsonl'
+            rows = self._export_jsonl(source, backup_json)
+            source.close()
+            self.log_info(f"{rows} rows exported to {backup_json}")
             
             self.backup_dir = backup_dir
             return True
@@ -160,20 +181,21 @@ class SupabaseMigration:
             self.log_error(f"Backup failed: {e}")
             return False
             
-    def _get_all_models(self):
-        """Get all model instances from database"""
-        from django.apps import apps
-        all_instances = []
-        
-        for model in apps.get_models():
-            try:
-                instances = model.objects.all()
-                if instances.exists():
-                    all_instances.extend(instances)
-            except Exception as e:
-                self.log_warning(f"Could not fetch {model.__name__}: {e}")
-                
-        return all_instances
+    def _export_jsonl(self, source, path):
+        """Stream every table into `path` as {"table": ..., "row": {...}} lines"""
+        tables = [row[0] for row in source.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+        )]
+        rows = 0
+        with open(path, 'w', encoding='utf-8') as f:
+            for table in tables:
+                cursor = source.execute(f'SELECT * FROM "{table}"')
+                columns = [column[0] for column in cursor.description]
+                for row in cursor:
+                    values = [value.hex() if isinstance(value, bytes) else value for value in row]
+                    f.write(json.dumps({'table': table, 'row': dict(zip(columns, values))}) + '\n')
+                    rows += 1
+        return rows
         
     def run_migrations_on_supabase(self):
         """Run Django migrations on Supabase database"""
@@ -191,15 +213,7 @@ class SupabaseMigration:
     def check_existing_tables(self, config_dict):
         """Check if tables already exist in Supabase"""
         try:
-            conn = psycopg2.connect(
-                host=config_dict['DB_HOST'],
-                database=config_dict['DB_NAME'],
-                user=config_dict['DB_USER'],
-                password=config_dict['DB_PASSWORD'],
-                port=config_dict['DB_PORT'],
-                sslmode='require',
-                connect_timeout=10
-            )
+            conn = self.connect(config_dict)
             cursor = conn.cursor()
             
             cursor.execute("""
@@ -216,35 +230,51 @@ class SupabaseMigration:
             self.log_warning(f"Could not check existing tables: {e}")
             return False
             
-    def migrate_data(self):
+    def has_checkpoint(self, config_dict):
+        """Check if an earlier data copy left checkpoints to resume from"""
+        try:
+            conn = self.connect(config_dict)
+            cursor = conn.cursor()
+            cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [CHECKPOINT_TABLE])
+            exists = cursor.fetchone()[0]
+            cursor.close()
+            conn.close()
+            return exists
+        except Exception as e:
+            self.log_warning(f"Could not check for checkpoints: {e}")
+            return False
+            
+    def migrate_data(self, config_dict):
         """Migrate data from SQLite to Supabase"""
         self.log_info("Starting data migration...")
         
-        try:
-            # Use Django's dumpdata and loaddata for safe migration
-            # First dump all data from SQLite
-            self.log_info("Dumping data from SQLite...")
-            dump_file = 'migration_dump.json'
-            
-            call_command('dumpdata', '--natural-foreign', '--natural-primary', 
-                        '--indent', '2', stdout=open(dump_file, 'w'))
-            
-            file_size = os.path.getsize(dump_file) / 1024 / 1024
-            self.log_info(f"Data dumped to {dump_file} ({file_size:.2f} MB)")
+        if not self.sqlite_path.exists():
+            self.log_error(f"SQLite database not found at {self.sqlite_path}")
+            return False
             
-            # Load data into Supabase
-            self.log_info("Loading data into Supabase...")
-            with open(dump_file, 'r') as f:
-                call_command('loaddata', f.name, verbosity=1)
+        try:
+            conn = self.connect(config_dict)
+            copier = SQLiteToPostgresCopier(
+                self.sqlite_path, conn, chunk_size=self.chunk_size, log=logger.info
+            )
+            try:
+                copied = copier.run(restart=self.restart)
+            finally:
+                copier.close()
+                conn.close()
+            for warning in copier.warnings:
+                self.migration_warnings.append(warning)
+            self.log_info(f"Copied {sum(copied.values())} rows in {len(copied)} tables")
+            
+            # Move history rows out of the DEFAULT partition into monthly ones
+            from restaurant.history_partitions import ensure_partitions
+            ensure_partitions()
             
             self.log_info("Data migration completed successfully!")
-            
-            # Cleanup
-            os.remove(dump_file)
-            
             return True
         except Exception as e:
             self.log_error(f"Data migration failed: {e}")
+            self.log_info("Run the script again to resume from the last copied chunk")
             return False
             
     def verify_migration(self, config_dict):
@@ -252,48 +282,53 @@ class SupabaseMigration:
         self.log_info("Verifying migration...")
         
         try:
-            # Get counts from Supabase
-            from django.contrib.auth.models import User
-            from restaurant.models import (
-                Order, MenuItem, Table, Category, OrderItem, Payment,
-                OrderHistory, OrderHistoryItem
+            verifier = Verifier(
+                self.sqlite_path, self.connection_params(config_dict),
+                workers=self.workers, log=logger.info
             )
-            from accounts.models import Staff, StaffPermission
-            
-            models_to_check = [
-                ('Django User', User),
-                ('Staff', Staff),
-                ('Category', Category),
-                ('MenuItem', MenuItem),
-                ('Table', Table),
-                ('Order', Order),
-                ('OrderItem', OrderItem),
-                ('Payment', Payment),
-                ('OrderHistory', OrderHistory),
-                ('OrderHistoryItem', OrderHistoryItem),
-            ]
+            reports = verifier.run()
             
             self.log_info("\n" + "="*50)
             self.log_info("DATA VERIFICATION")
             self.log_info("="*50)
             
             total_records = 0
-            for name, model in models_to_check:
-                count = model.objects.count()
-                total_records += count
-                status = "✓" if count > 0 else "○"
-                self.log_info(f"{status} {name:25} {count:>6} records")
+            mismatched = 0
+            for report in reports.values():
+                total_records += report.target_rows
+                if report.ok:
+                    self.log_info(f"{report.name:35} {report.target_rows:>8} records")
+                    continue
+                mismatched += 1
+                self.log_error(
+                    f"{report.name:35} {report.source_rows:>8} -> {report.target_rows:>8} records, "
+                    f"{report.differing_chunks}/{report.chunks} chunk(s) differ"
+                )
+                for difference in report.differences[:20]:
+                    self.log_error(f"    {difference.kind:8} pk={difference.pk}")
+                if len(report.differences) > 20:
+                    self.log_error(f"    ... and {len(report.differences) - 20} more")
             
             self.log_info("="*50)
             self.log_info(f"Total records migrated: {total_records}")
             self.log_info("="*50)
             
-            return total_records > 0
+            return mismatched == 0
             
         except Exception as e:
             self.log_error(f"Verification failed: {e}")
             return False
             
+    def clear_checkpoints(self, config_dict):
+        """Drop the copy checkpoints after a verified migration"""
+        conn = self.connect(config_dict)
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f'DROP TABLE IF EXISTS "{CHECKPOINT_TABLE}"')
+            conn.commit()
+        finally:
+            conn.close()
+            
     def run(self):
         """Run the migration process"""
         self.log_info("="*60)
@@ -313,8 +348,11 @@ class SupabaseMigration:
         if not self.test_supabase_connection(config_dict):
             return False
             
-        # Step 4: Check for existing tables
-        if self.check_existing_tables(config_dict) and not self.force:
+        # Step 4: Check for existing tables (an interrupted copy is resumed)
+        resuming = not self.restart and self.has_checkpoint(config_dict)
+        if resuming:
+            self.log_info("Found checkpoints from an earlier run; resuming the data copy")
+        elif self.check_existing_tables(config_dict) and not self.force:
             self.log_warning("Supabase database already has tables!")
             self.log_info("Run with --force to overwrite, or manually delete tables in Supabase")
             return False
@@ -341,13 +379,15 @@ class SupabaseMigration:
             
         # Step 7: Migrate data
         self.log_info("\nMigrating data...")
-        if not self.migrate_data():
+        if not self.migrate_data(config_dict):
             return False
             
         # Step 8: Verify
         self.log_info("\nVerifying migration...")
-        if not self.verify_migration(config_dict):
-            self.log_warning("Migration completed but verification found no data!")
+        if self.verify_migration(config_dict):
+            self.clear_checkpoints(config_dict)
+        else:
+            self.log_error("Copied data does not match SQLite; run with --restart to copy again")
             
         # Summary
         self.log_info("\n" + "="*60)
@@ -383,6 +423,14 @@ def main():
                        help='Test Supabase connection only')
     parser.add_argument('--verify-only', action='store_true',
                        help='Verify existing migration')
+    parser.add_argument('--restart', action='store_true',
+                       help='Ignore checkpoints of an interrupted copy and start over')
+    parser.add_argument('--sqlite-path', default=SQLITE_PATH,
+                       help=f'SQLite database to copy (default: {SQLITE_PATH})')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                       help=f'Rows per COPY chunk and checkpoint (default: {DEFAULT_CHUNK_SIZE})')
+    parser.add_argument('--workers', type=int,
+                       help='Processes hashing chunks during verification (default: number of CPUs)')
     
     args = parser.parse_args()
     
@@ -390,7 +438,11 @@ def main():
         backup=args.backup,
         force=args.force,
         test_only=args.test_only,
-        verify_only=args.verify_only
+        verify_only=args.verify_only,
+        restart=args.restart,
+        sqlite_path=args.sqlite_path,
+        chunk_size=args.chunk_size,
+        workers=args.workers
     )
     
     success = migration.run()
@@ -21,6 +21,9 @@ class TableAdmin(admin.ModelAdmin):
 
 class OrderAdmin(admin.ModelAdmin):
     inlines = [OrderItemInline]
+    # Running totals and the version are updated with F() expressions; a form
+    # save would write back the values loaded with the page
+    readonly_fields = ['paid_amount', 'item_count', 'version']
 
 admin.site.register(MenuItem)
 admin.site.register(Category)
@@ -0,0 +1,181 @@
+"""
+Typed columnar files for exports and archives.
+
+Rows are written as Parquet when `pyarrow` is installed and as gzipped CSV
+otherwise. Both formats carry the same logical types (int, decimal,
+datetime, bool, str) so readers get `Decimal` and aware `datetime` values
+back whichever format was used.
+"""
+
+import csv
+import gzip
+from datetime import datetime
+from decimal import Decimal
+
+PARQUET = 'parquet'
+CSV = 'csv'
+
+EXTENSIONS = {PARQUET: '.parquet', CSV: '.csv.gz'}
+
+# Marks NULL in CSV files, so NULL and '' stay distinct
+CSV_NULL = r'\N'
+
+INT = 'int'
+DECIMAL = 'decimal'
+DATETIME = 'datetime'
+BOOL = 'bool'
+STR = 'str'
+
+_INTERNAL_TYPES = {
+    'AutoField': INT,
+    'BigAutoField': INT,
+    'SmallAutoField': INT,
+    'IntegerField': INT,
+    'BigIntegerField': INT,
+    'SmallIntegerField': INT,
+    'PositiveIntegerField': INT,
+    'PositiveBigIntegerField': INT,
+    'PositiveSmallIntegerField': INT,
+    'DecimalField': DECIMAL,
+    'DateTimeField': DATETIME,
+    'BooleanField': BOOL,
+}
+
+
+def parquet_available():
+    try:
+        import pyarrow  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def resolve_format(fmt=None):
+    """Pick the requested format, falling back to CSV when pyarrow is missing."""
+    if fmt in (None, PARQUET):
+        return PARQUET if parquet_available() else CSV
+    if fmt != CSV:
+        raise ValueError(f'Unknown format: {fmt}')
+    return CSV
+
+
+def field_columns(model, names):
+    """[(column, type, field)] for field `names` on `model`.
+
+    `rel__field` names follow relations; a foreign key is stored as its raw
+    id under its attname (`table_id`). Columns are valid `values_list()` args.
+    """
+    columns = []
+    for name in names:
+        *path, last = name.split('__')
+        current = model
+        for part in path:
+            current = current._meta.get_field(part).related_model
+        field = current._meta.get_field(last)
+        column = name if path else field.attname
+        if field.is_relation:
+            field = field.target_field
+        columns.append((column, _INTERNAL_TYPES.get(field.get_internal_type(), STR), field))
+    return columns
+
+
+def _arrow_type(kind, field):
+    import pyarrow as pa
+    if kind == INT:
+        return pa.int64()
+    if kind == DECIMAL:
+        return pa.decimal128(field.max_digits, field.decimal_places)
+    if kind == DATETIME:
+        return pa.timestamp('us', tz='UTC')
+    if kind == BOOL:
+        return pa.bool_()
+    return pa.string()
+
+
+def _to_csv(value):
+    if value is None:
+        return CSV_NULL
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _from_csv(value, kind):
+    if value == CSV_NULL:
+        return None
+    if kind == INT:
+        return int(value)
+    if kind == DECIMAL:
+        return Decimal(value)
+    if kind == DATETIME:
+        return datetime.fromisoformat(value)
+    if kind == BOOL:
+        return value == 'True'
+    return value
+
+
+class TableWriter:
+    """Write rows (tuples in column order) to one Parquet or CSV file.
+
+    Use as a context manager; `path` is `path_base` plus the format's
+    extension and `rows` counts what was written.
+    """
+
+    def __init__(self, path_base, columns, fmt=None):
+        self.columns = columns
+        self.format = resolve_format(fmt)
+        self.path = f'{path_base}{EXTENSIONS[self.format]}'
+        self.rows = 0
+        self._writer = None
+        self._file = None
+
+    def __enter__(self):
+        if self.format == PARQUET:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            self._schema = pa.schema([
+                pa.field(column, _arrow_type(kind, field)) for column, kind, field in self.columns
+            ])
+            self._writer = pq.ParquetWriter(self.path, self._schema, compression='zstd')
+        else:
+            self._file = gzip.open(self.path, 'wt', newline='', encoding='utf-8')
+            self._writer = csv.writer(self._file)
+            self._writer.writerow([column for column, _, _ in self.columns])
+        return self
+
+    def write_rows(self, rows):
+        rows = list(rows)
+        if not rows:
+            return
+        if self.format == PARQUET:
+            import pyarrow as pa
+            arrays = [
+                pa.array([row[i] for row in rows], type=self._schema.field(i).type)
+                for i in range(len(self.columns))
+            ]
+            self._writer.write_table(pa.Table.from_arrays(arrays, schema=self._schema))
+        else:
+            self._writer.writerows([_to_csv(value) for value in row] for row in rows)
+        self.rows += len(rows)
+
+    def __exit__(self, *exc_info):
+        if self.format == PARQUET:
+            self._writer.close()
+        else:
+            self._file.close()
+
+
+def read_rows(path, types, batch_size=10000):
+    """Yield dict rows from a file written by `TableWriter`.
+
+    `types` maps column name to logical type (needed for CSV only).
+    """
+    if path.endswith(EXTENSIONS[PARQUET]):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+            yield from batch.to_pylist()
+        return
+    with gzip.open(path, 'rt', newline='', encoding='utf-8') as handle:
+        for row in csv.DictReader(handle):
+            yield {column: _from_csv(value, types.get(column, STR)) for column, value in row.items()}
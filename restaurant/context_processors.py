@@ -1,4 +1,4 @@
-from .models import Table
+from .table_registry import first_table_id
 import logging
 
 logger = logging.getLogger(__name__)
@@ -6,7 +6,8 @@ logger = logging.getLogger(__name__)
 def add_valid_table_id(request):
     """
     Add the first valid table ID to the template context.
-    Skips database queries for admin views to prevent template rendering issues.
+    Reads the in-process table registry, so no query runs per render.
+    Skipped for admin views to prevent template rendering issues.
     """
     # Skip database queries for admin views to avoid context pollution
     # that can cause "super object has no attribute 'dicts'" errors
@@ -14,8 +15,7 @@ def add_valid_table_id(request):
         return {'valid_table_id': None}
     
     try:
-        valid_table_id = Table.objects.first().id if Table.objects.exists() else None
-        return {'valid_table_id': valid_table_id}
+        return {'valid_table_id': first_table_id()}
     except Exception as e:
         # Log the error but don't crash - return empty context
         logger.warning(f"Error in add_valid_table_id context processor: {str(e)}")
@@ -0,0 +1,63 @@
+"""
+Write-once files on disk, used as a second cache level behind in-memory
+caches (pre-rendered public menu, QR images).
+
+Entries are named by a hash of what they were built from, so a file never
+has to be invalidated, only pruned once it is no longer used. The disk
+cache is only an optimization: if it can't be read or written, the bytes
+are built and returned anyway.
+"""
+
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+
+def cached_bytes(path, build):
+    """Return the bytes stored at `path`, building and storing them if absent."""
+    try:
+        data = path.read_bytes()
+        os.utime(path)  # keep files in use from being pruned
+        return data
+    except OSError:
+        pass
+    data = build()
+    store(path, data)
+    return data
+
+
+def store(path, data):
+    """Atomically write `data` to `path`; failures are logged, not raised."""
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+    except OSError as e:
+        logger.warning('Could not write cache file %s: %s', path, e)
+
+
+def prune(directory, keep, key=lambda path: path.name):
+    """Delete files in `directory` except those of the `keep` most recently used keys.
+
+    `key` groups files that belong together (e.g. all encodings of one body).
+    """
+    try:
+        files = [path for path in directory.iterdir() if path.is_file()]
+    except OSError:
+        return
+    last_used = {}
+    for path in files:
+        try:
+            mtime = path.stat().st_mtime
+        except OSError:
+            continue
+        last_used[key(path)] = max(last_used.get(key(path), 0), mtime)
+    kept = set(sorted(last_used, key=last_used.get, reverse=True)[:keep])
+    for path in files:
+        if key(path) not in kept:
+            try:
+                path.unlink()
+            except OSError:
+                pass
@@ -0,0 +1,209 @@
+"""
+Cold-archive tier for order history.
+
+`archive_month` exports one calendar month of OrderHistory, together with
+its items, payments and status logs, to typed Parquet (or gzipped CSV)
+files under `HISTORY_ARCHIVE_ROOT` (default: PRIVATE_ROOT/archive/order_history),
+then removes the month from the database: on Postgres the month's partition
+is detached and dropped, elsewhere the rows are deleted.
+
+Each archived month is a directory `YYYY-MM/` holding one file per table and
+a `manifest.json` with the row counts, column types and SHA-256 of every file.
+`restaurant.history_reports` reads these back, so reports over archived
+months keep working.
+"""
+
+import hashlib
+import json
+import os
+from datetime import date
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from . import history_partitions
+from .columnar import TableWriter, field_columns, read_rows, resolve_format
+from .models import OrderHistory, OrderHistoryItem, OrderHistoryPayment, OrderHistoryStatus
+
+MANIFEST = 'manifest.json'
+PENDING_MANIFEST = 'manifest.json.pending'
+
+# (model, fields, created_at lookup) per archived table; parents come first
+TABLES = {
+    'orders': (
+        OrderHistory,
+        [field.name for field in OrderHistory._meta.concrete_fields],
+        'created_at',
+    ),
+    'items': (
+        OrderHistoryItem,
+        ['id', 'order_history', 'item', 'item__name', 'quantity', 'price'],
+        'order_history__created_at',
+    ),
+    'payments': (
+        OrderHistoryPayment,
+        ['id', 'order_history', 'payment_method', 'amount', 'transaction_id', 'date_added'],
+        'order_history__created_at',
+    ),
+    'status_logs': (
+        OrderHistoryStatus,
+        ['id', 'order_history', 'previous_status', 'new_status', 'changed_by', 'timestamp'],
+        'order_history__created_at',
+    ),
+}
+
+
+class ArchiveError(Exception):
+    pass
+
+
+def archive_root():
+    root = getattr(settings, 'HISTORY_ARCHIVE_ROOT', None)
+    return Path(root) if root else Path(settings.PRIVATE_ROOT) / 'archive' / 'order_history'
+
+
+def month_dir(month):
+    return archive_root() / f'{month:%Y-%m}'
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        for block in iter(lambda: handle.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def archived_months():
+    """Months with a complete archive on disk, oldest first."""
+    root = archive_root()
+    if not root.is_dir():
+        return []
+    months = []
+    for entry in root.iterdir():
+        if (entry / MANIFEST).is_file():
+            year, month = entry.name.split('-')
+            months.append(date(int(year), int(month), 1))
+    return sorted(months)
+
+
+def pending_months():
+    """Months whose archive was written but never confirmed (interrupted runs)."""
+    root = archive_root()
+    if not root.is_dir():
+        return []
+    return sorted(entry.name for entry in root.iterdir() if (entry / PENDING_MANIFEST).is_file())
+
+
+def load_manifest(month):
+    with open(month_dir(month) / MANIFEST, encoding='utf-8') as handle:
+        return json.load(handle)
+
+
+def iter_archived_rows(month, table):
+    """Yield dict rows of `table` ('orders', 'items', ...) for an archived month."""
+    manifest = load_manifest(month)
+    info = manifest['tables'][table]
+    yield from read_rows(str(month_dir(month) / info['file']), info['columns'])
+
+
+def months_to_archive(older_than_months, using='default'):
+    """Months before the cutoff that still have history rows in the database."""
+    cutoff = history_partitions.add_months(history_partitions.month_start(timezone.now()), -older_than_months)
+    start, _ = history_partitions.month_bounds(cutoff)
+    months = OrderHistory.objects.using(using).filter(created_at__lt=start).datetimes(
+        'created_at', 'month', tzinfo=timezone.get_default_timezone()
+    )
+    return [date(m.year, m.month, 1) for m in months]
+
+
+def _export_table(directory, name, model, fields, time_field, start, end, fmt, chunk_size, using):
+    columns = field_columns(model, fields)
+    queryset = model.objects.using(using).filter(
+        **{f'{time_field}__gte': start, f'{time_field}__lt': end}
+    ).order_by('pk').values_list(*[column for column, _, _ in columns])
+
+    with TableWriter(str(directory / name), columns, fmt) as writer:
+        batch = []
+        for row in queryset.iterator(chunk_size=chunk_size):
+            batch.append(row)
+            if len(batch) >= chunk_size:
+                writer.write_rows(batch)
+                batch = []
+        writer.write_rows(batch)
+
+    return {
+        'file': os.path.basename(writer.path),
+        'rows': writer.rows,
+        'sha256': _sha256(writer.path),
+        'columns': {column: kind for column, kind, _ in columns},
+    }
+
+
+def _remove_month(month, start, end, expected_orders, drop_partition, using):
+    for model, _, time_field in TABLES.values():
+        if model is not OrderHistory:
+            model.objects.using(using).filter(**{f'{time_field}__gte': start, f'{time_field}__lt': end}).delete()
+
+    if month in history_partitions.list_partitions(using):
+        with connections[using].cursor() as cursor:
+            cursor.execute(f'SELECT count(*) FROM {history_partitions.partition_name(month)}')
+            removed = cursor.fetchone()[0]
+        history_partitions.detach_partition(month, drop=drop_partition, using=using)
+    else:
+        # Children are gone already, so a plain DELETE avoids loading every row
+        # into Django's deletion collector
+        with connections[using].cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {OrderHistory._meta.db_table} WHERE created_at >= %s AND created_at < %s',
+                [start, end],
+            )
+            removed = cursor.rowcount
+
+    if removed != expected_orders:
+        raise ArchiveError(
+            f'{month:%Y-%m}: exported {expected_orders} orders but {removed} were removed; rolled back'
+        )
+
+
+def archive_month(month, fmt=None, drop_partition=True, chunk_size=5000, using='default'):
+    """Export `month` to the archive and remove it from the database.
+
+    Export and removal run in one transaction, so a failure leaves the
+    database untouched. Returns the manifest dict.
+    """
+    directory = month_dir(month)
+    if (directory / MANIFEST).exists():
+        raise ArchiveError(f'{month:%Y-%m} is already archived in {directory}')
+    directory.mkdir(parents=True, exist_ok=True)
+
+    fmt = resolve_format(fmt)
+    start, end = history_partitions.month_bounds(month)
+    manifest = {
+        'month': f'{month:%Y-%m}',
+        'format': fmt,
+        'range': [start.isoformat(), end.isoformat()],
+        'archived_at': timezone.now().isoformat(),
+        'tables': {},
+    }
+
+    try:
+        with transaction.atomic(using=using):
+            for name, (model, fields, time_field) in TABLES.items():
+                manifest['tables'][name] = _export_table(
+                    directory, name, model, fields, time_field, start, end, fmt, chunk_size, using
+                )
+            with open(directory / PENDING_MANIFEST, 'w', encoding='utf-8') as handle:
+                json.dump(manifest, handle, indent=2)
+            _remove_month(month, start, end, manifest['tables']['orders']['rows'], drop_partition, using)
+    except Exception:
+        # The rows are still in the database; don't leave a half-written archive behind
+        if (directory / PENDING_MANIFEST).exists():
+            os.remove(directory / PENDING_MANIFEST)
+        raise
+
+    # Only a committed archive becomes visible to reports
+    os.replace(directory / PENDING_MANIFEST, directory / MANIFEST)
+    return manifest
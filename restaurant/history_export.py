@@ -0,0 +1,225 @@
+"""
+Incremental columnar export of order history for offline analysis.
+
+Three datasets are written under `HISTORY_EXPORT_ROOT` (default:
+PRIVATE_ROOT/exports/order_history), each partitioned by the order's month
+in Hive style so pandas/pyarrow/DuckDB can read them as one table:
+
+    orders/month=2026-03/part-<run>-<n>.parquet
+    items/month=2026-03/...      (one row per line, with order fields joined in)
+    payments/month=2026-03/...   (one row per payment, with order fields joined in)
+
+Files are Parquet when pyarrow is installed, gzipped CSV otherwise (see
+`restaurant.columnar`). History rows are never updated in place, so the
+export is append-only: `_watermark.json` remembers the highest
+OrderHistory id exported, and the next run only reads newer orders.
+
+Ids are handed out before a transaction commits, so an archive that commits
+late can add an id below one already exported. Each run therefore reads the
+last `RESCAN_IDS` ids below the watermark again and skips the ones listed as
+exported in the watermark.
+"""
+
+import json
+import os
+import shutil
+import threading
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import history_partitions
+from .columnar import TableWriter, field_columns, resolve_format
+from .models import OrderHistory, OrderHistoryItem, OrderHistoryPayment
+
+WATERMARK = '_watermark.json'
+
+# Ids below the watermark read again on every run, for archives committed late
+RESCAN_IDS = 1000
+# Chunks one request to the export endpoint may write; the command has no limit
+REQUEST_MAX_CHUNKS = 2
+
+ORDER_FIELDS = [
+    'id', 'order_id', 'order_type', 'status', 'payment_method', 'table', 'customer_name',
+    'total_amount', 'delivery_charge', 'completed_by', 'created_at', 'updated_at',
+]
+# Order fields joined onto every item and payment row
+JOINED_ORDER_FIELDS = ['order_history__order_id', 'order_history__order_type', 'order_history__created_at']
+
+DATASETS = {
+    'orders': (OrderHistory, ORDER_FIELDS, 'id'),
+    'items': (
+        OrderHistoryItem,
+        ['id', 'order_history'] + JOINED_ORDER_FIELDS + ['item', 'item__name', 'item__category__name', 'quantity', 'price'],
+        'order_history_id',
+    ),
+    'payments': (
+        OrderHistoryPayment,
+        ['id', 'order_history'] + JOINED_ORDER_FIELDS + ['payment_method', 'amount', 'transaction_id', 'date_added'],
+        'order_history_id',
+    ),
+}
+
+_lock = threading.Lock()
+
+
+class ExportInProgress(Exception):
+    pass
+
+
+def export_root():
+    root = getattr(settings, 'HISTORY_EXPORT_ROOT', None)
+    return Path(root) if root else Path(settings.PRIVATE_ROOT) / 'exports' / 'order_history'
+
+
+def read_watermark(root=None):
+    path = (root or export_root()) / WATERMARK
+    if not path.is_file():
+        return {'last_id': 0, 'recent_ids': [], 'exported_at': None, 'rows': {}}
+    with open(path, encoding='utf-8') as handle:
+        return json.load(handle)
+
+
+def _write_watermark(root, watermark):
+    tmp = root / f'{WATERMARK}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as handle:
+        json.dump(watermark, handle, indent=2)
+    os.replace(tmp, root / WATERMARK)
+
+
+def list_files(root=None):
+    """Relative paths of every exported data file, sorted."""
+    root = root or export_root()
+    if not root.is_dir():
+        return []
+    return sorted(
+        str(path.relative_to(root)) for path in root.rglob('part-*') if path.is_file()
+    )
+
+
+class _PartitionedWriter:
+    """Keeps one open TableWriter per month of one dataset.
+
+    Rows arrive roughly in month order (ids grow with time), so a month's
+    file is closed as soon as a chunk no longer touches it; a month that
+    shows up again gets a new part file.
+    """
+
+    def __init__(self, directory, columns, fmt, run):
+        self.directory = directory
+        self.columns = columns
+        self.format = fmt
+        self.run = run
+        self.writers = {}
+        self.parts = 0
+        self.rows = 0
+
+    def write_chunk(self, rows_by_month):
+        for month in [m for m in self.writers if m not in rows_by_month]:
+            self.writers.pop(month).__exit__(None, None, None)
+        for month, rows in rows_by_month.items():
+            writer = self.writers.get(month)
+            if writer is None:
+                path = self.directory / f'month={month:%Y-%m}'
+                path.mkdir(parents=True, exist_ok=True)
+                self.parts += 1
+                writer = TableWriter(str(path / f'part-{self.run}-{self.parts:05d}'), self.columns, self.format)
+                self.writers[month] = writer.__enter__()
+            writer.write_rows(rows)
+            self.rows += len(rows)
+
+    def close(self):
+        for writer in self.writers.values():
+            writer.__exit__(None, None, None)
+        self.writers = {}
+
+
+def export_history(fmt=None, full=False, chunk_size=5000, root=None, max_chunks=None):
+    """Append history newer than the watermark to the export datasets.
+
+    `full` discards the existing export and starts again from the first
+    order. `max_chunks` stops after that many chunks of `chunk_size` orders;
+    the summary's `complete` is then False and the next run continues.
+    Returns a summary dict (row counts per dataset, new watermark).
+    Raises ExportInProgress if another export is running in this process.
+    """
+    if not _lock.acquire(blocking=False):
+        raise ExportInProgress('An order history export is already running')
+    try:
+        root = Path(root) if root else export_root()
+        if full and root.exists():
+            shutil.rmtree(root)
+        root.mkdir(parents=True, exist_ok=True)
+
+        fmt = resolve_format(fmt)
+        watermark = read_watermark(root)
+        if watermark.get('format') not in (None, fmt):
+            raise ValueError(
+                f"Existing export in {root} is {watermark['format']}; run a full export to switch to {fmt}"
+            )
+        last_id = watermark['last_id']
+        exported = set(watermark.get('recent_ids', []))
+        # Unique per run so two exports in the same second never overwrite each other's parts
+        run = f'{timezone.now():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:6]}'
+
+        writers = {}
+        month_index = {}
+        order_index = {}
+        for name, (model, fields, order_key) in DATASETS.items():
+            columns = field_columns(model, fields)
+            writers[name] = (_PartitionedWriter(root / name, columns, fmt, run), [c for c, _, _ in columns])
+            month_index[name] = [c for c, _, _ in columns].index(
+                'created_at' if name == 'orders' else 'order_history__created_at'
+            )
+            order_index[name] = [c for c, _, _ in columns].index(order_key)
+
+        complete = False
+        chunks = 0
+        # Watermarks written before the re-scan don't list their recent ids
+        cursor = max(0, last_id - RESCAN_IDS) if 'recent_ids' in watermark else last_id
+        try:
+            while max_chunks is None or chunks < max_chunks:
+                scanned = list(
+                    OrderHistory.objects.filter(id__gt=cursor).order_by('id').values_list('id', flat=True)[:chunk_size]
+                )
+                if not scanned:
+                    complete = True
+                    break
+                cursor = scanned[-1]
+                order_ids = [order_id for order_id in scanned if order_id not in exported]
+                if not order_ids:
+                    continue
+                for name, (model, _, order_key) in DATASETS.items():
+                    writer, values = writers[name]
+                    rows = model.objects.filter(**{
+                        f'{order_key}__gte': order_ids[0], f'{order_key}__lte': order_ids[-1],
+                    }).order_by('pk').values_list(*values)
+                    by_month = {}
+                    for row in rows:
+                        if row[order_index[name]] in exported:
+                            continue
+                        month = history_partitions.month_start(row[month_index[name]])
+                        by_month.setdefault(month, []).append(row)
+                    writer.write_chunk(by_month)
+                exported.update(order_ids)
+                last_id = max(last_id, order_ids[-1])
+                chunks += 1
+        finally:
+            for writer, _ in writers.values():
+                writer.close()
+
+        rows = {name: writer.rows for name, (writer, _) in writers.items()}
+        totals = watermark.get('rows', {})
+        watermark = {
+            'last_id': last_id,
+            'recent_ids': sorted(order_id for order_id in exported if order_id > last_id - RESCAN_IDS),
+            'exported_at': timezone.now().isoformat(),
+            'format': fmt,
+            'rows': {name: totals.get(name, 0) + count for name, count in rows.items()},
+        }
+        _write_watermark(root, watermark)
+        return {'root': str(root), 'format': fmt, 'exported': rows, 'complete': complete, 'watermark': watermark}
+    finally:
+        _lock.release()
@@ -0,0 +1,167 @@
+"""
+Monthly range partitions for `restaurant_orderhistory` on Postgres.
+
+Migration 0034 turns the table into `PARTITION BY RANGE (created_at)` with
+one partition per calendar month (in `settings.TIME_ZONE`) named
+`restaurant_orderhistory_pYYYYMM`, plus a DEFAULT partition that catches
+rows for months without a partition yet. Queries filtered on `created_at`
+(see `restaurant.history_queries`) only touch the matching months.
+
+`OrderHistoryItem` and `OrderHistoryPayment` have no timestamp of their own
+and stay regular tables; they are archived together with their order's
+month by `restaurant.history_archive`.
+
+Everything here is a no-op on other databases.
+"""
+
+import re
+from datetime import date, datetime, time
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+TABLE = 'restaurant_orderhistory'
+DEFAULT_PARTITION = f'{TABLE}_default'
+
+_PARTITION_RE = re.compile(rf'^{TABLE}_p(\d{{4}})(\d{{2}})$')
+
+
+def month_start(value):
+    """First day of the month containing `value` (a date or datetime)."""
+    if isinstance(value, datetime):
+        if timezone.is_aware(value):
+            value = timezone.localtime(value, timezone.get_default_timezone())
+        value = value.date()
+    return date(value.year, value.month, 1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_bounds(month):
+    """Aware [start, end) datetimes of `month` in the default timezone."""
+    tz = timezone.get_default_timezone()
+    start = timezone.make_aware(datetime.combine(month, time.min), tz)
+    end = timezone.make_aware(datetime.combine(add_months(month, 1), time.min), tz)
+    return start, end
+
+
+def partition_name(month):
+    return f'{TABLE}_p{month:%Y%m}'
+
+
+def insert_columns(apps=None):
+    """Columns to copy between partitions (the generated search columns excluded)."""
+    if apps is None:
+        from .models import OrderHistory
+    else:
+        OrderHistory = apps.get_model('restaurant', 'OrderHistory')
+    return [field.column for field in OrderHistory._meta.concrete_fields]
+
+
+def is_partitioned(using='default'):
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [TABLE])
+        row = cursor.fetchone()
+    return bool(row) and row[0] == 'p'
+
+
+def list_partitions(using='default'):
+    """Months that currently have their own partition, oldest first."""
+    if not is_partitioned(using):
+        return []
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE parent.oid = to_regclass(%s)",
+            [TABLE],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    months = []
+    for name in names:
+        match = _PARTITION_RE.match(name)
+        if match:
+            months.append(date(int(match.group(1)), int(match.group(2)), 1))
+    return sorted(months)
+
+
+def create_partition(cursor, month, columns):
+    """Create the partition for `month`, moving any of its rows out of DEFAULT.
+
+    Postgres refuses to add a partition while the DEFAULT partition holds
+    rows for its range, so those rows are re-routed first.
+    """
+    name = partition_name(month)
+    start, end = month_bounds(month)
+    cursor.execute(
+        f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE created_at >= %s AND created_at < %s)",
+        [start, end],
+    )
+    if not cursor.fetchone()[0]:
+        cursor.execute(f"CREATE TABLE {name} PARTITION OF {TABLE} FOR VALUES FROM (%s) TO (%s)", [start, end])
+        return
+
+    column_list = ', '.join(columns)
+    cursor.execute(f"ALTER TABLE {TABLE} DETACH PARTITION {DEFAULT_PARTITION}")
+    cursor.execute(f"CREATE TABLE {name} PARTITION OF {TABLE} FOR VALUES FROM (%s) TO (%s)", [start, end])
+    cursor.execute(
+        f"INSERT INTO {name} ({column_list}) SELECT {column_list} FROM {DEFAULT_PARTITION} "
+        f"WHERE created_at >= %s AND created_at < %s",
+        [start, end],
+    )
+    cursor.execute(f"DELETE FROM {DEFAULT_PARTITION} WHERE created_at >= %s AND created_at < %s", [start, end])
+    cursor.execute(f"ALTER TABLE {TABLE} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT")
+
+
+def ensure_partitions(months_ahead=3, using='default'):
+    """Create partitions from the current month up to `months_ahead` months out.
+
+    Also splits out any older month that only lives in DEFAULT. Returns the
+    months created.
+    """
+    if not is_partitioned(using):
+        return []
+    current = month_start(timezone.now())
+    wanted = {add_months(current, offset) for offset in range(months_ahead + 1)}
+
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f"SELECT DISTINCT date_trunc('month', created_at AT TIME ZONE %s) FROM {DEFAULT_PARTITION}",
+            [settings.TIME_ZONE],
+        )
+        wanted.update(month_start(row[0]) for row in cursor.fetchall())
+
+    return create_partitions(wanted, using=using)
+
+
+def create_partitions(months, using='default'):
+    """Create partitions for those of `months` that don't have one; return them.
+
+    Bulk loaders call this before inserting history for past months, so the
+    rows land in their own partition instead of DEFAULT.
+    """
+    if not is_partitioned(using):
+        return []
+    missing = sorted({month_start(month) for month in months} - set(list_partitions(using)))
+    columns = insert_columns()
+    with transaction.atomic(using=using), connections[using].cursor() as cursor:
+        for month in missing:
+            create_partition(cursor, month, columns)
+    return missing
+
+
+def detach_partition(month, drop=True, using='default'):
+    """Detach the partition for `month` from the table and optionally drop it."""
+    name = partition_name(month)
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {TABLE} DETACH PARTITION {name}")
+        if drop:
+            cursor.execute(f"DROP TABLE {name}")
@@ -0,0 +1,120 @@
+"""
+Sales reports over order history, live and archived.
+
+Every report takes a half-open `[start, end)` range of aware datetimes. The
+part of the range still in the database is aggregated in SQL (on Postgres
+only the matching monthly partitions are scanned); months moved to the cold
+archive by `archive_order_history` are read back from their files. Callers
+never need to know which months were archived.
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from . import history_archive, history_partitions
+from .models import OrderHistory, OrderHistoryItem
+
+MONEY = DecimalField(max_digits=12, decimal_places=2)
+
+
+def _archived_months_between(start, end):
+    first = history_partitions.month_start(start)
+    last = history_partitions.month_start(end)
+    return [month for month in history_archive.archived_months() if first <= month <= last]
+
+
+def _archived_orders(month, start, end):
+    """{order_history_id: row} for archived orders created in [start, end)."""
+    return {
+        row['id']: row
+        for row in history_archive.iter_archived_rows(month, 'orders')
+        if start <= row['created_at'] < end
+    }
+
+
+def item_sales(start, end):
+    """Per-menu-item sales for history orders created in [start, end).
+
+    Returns dicts with `item_id`, `item_name`, `order_count` (order lines),
+    `orders` (distinct orders), `quantity` and `revenue`, most ordered first.
+    """
+    totals = {}
+    live = (
+        OrderHistoryItem.objects
+        .filter(order_history__created_at__gte=start, order_history__created_at__lt=end)
+        .values('item_id', 'item__name')
+        .annotate(
+            line_count=Count('id'),
+            distinct_orders=Count('order_history_id', distinct=True),
+            total_quantity=Sum('quantity'),
+            total_revenue=Sum(ExpressionWrapper(F('price') * F('quantity'), output_field=MONEY)),
+        )
+    )
+    for row in live:
+        totals[row['item_id']] = {
+            'item_id': row['item_id'],
+            'item_name': row['item__name'],
+            'order_count': row['line_count'],
+            'orders': row['distinct_orders'],
+            'quantity': row['total_quantity'] or 0,
+            'revenue': row['total_revenue'] or Decimal('0'),
+        }
+
+    for month in _archived_months_between(start, end):
+        orders = _archived_orders(month, start, end)
+        if not orders:
+            continue
+        order_ids = defaultdict(set)
+        for line in history_archive.iter_archived_rows(month, 'items'):
+            if line['order_history_id'] not in orders:
+                continue
+            entry = totals.setdefault(line['item_id'], {
+                'item_id': line['item_id'],
+                'item_name': line['item__name'],
+                'order_count': 0,
+                'orders': 0,
+                'quantity': 0,
+                'revenue': Decimal('0'),
+            })
+            entry['order_count'] += 1
+            entry['quantity'] += line['quantity']
+            entry['revenue'] += line['price'] * line['quantity']
+            order_ids[line['item_id']].add(line['order_history_id'])
+        # An order belongs to exactly one month, so distinct counts simply add up
+        for item_id, ids in order_ids.items():
+            totals[item_id]['orders'] += len(ids)
+
+    return sorted(totals.values(), key=lambda entry: (-entry['order_count'], entry['item_id']))
+
+
+def daily_sales(start, end, tzinfo=None):
+    """Orders and revenue per local day for history created in [start, end).
+
+    Revenue includes the delivery charge. Returns dicts with `date`,
+    `orders` and `revenue`, oldest day first.
+    """
+    tzinfo = tzinfo or timezone.get_current_timezone()
+    days = defaultdict(lambda: {'orders': 0, 'revenue': Decimal('0')})
+
+    live = (
+        OrderHistory.objects
+        .filter(created_at__gte=start, created_at__lt=end)
+        .annotate(day=TruncDate('created_at', tzinfo=tzinfo))
+        .values('day')
+        .annotate(order_count=Count('id'), revenue_total=Sum(F('total_amount') + F('delivery_charge')))
+    )
+    for row in live:
+        days[row['day']]['orders'] += row['order_count']
+        days[row['day']]['revenue'] += row['revenue_total'] or Decimal('0')
+
+    for month in _archived_months_between(start, end):
+        for row in _archived_orders(month, start, end).values():
+            day = timezone.localtime(row['created_at'], tzinfo).date()
+            days[day]['orders'] += 1
+            days[day]['revenue'] += (row['total_amount'] or 0) + (row['delivery_charge'] or 0)
+
+    return [{'date': day, **values} for day, values in sorted(days.items())]
@@ -0,0 +1,357 @@
+"""
+Search over OrderHistory by order ID, customer name and phone number.
+
+The search structures are created by migration 0033 and are not Django
+model fields, so inserts from anywhere (including `bulk_create`) keep them
+current without any Python-side bookkeeping:
+
+* Postgres: generated `search_vector` (tsvector over order ID, name and
+  phone digits) and `phone_digits` columns, a GIN index on the vector, a
+  `varchar_pattern_ops` prefix index on `order_id` and a pg_trgm index on
+  `phone_digits` for substring and typo-tolerant phone lookups.
+* SQLite: an FTS5 table (`restaurant_orderhistory_fts`, trigram tokenizer)
+  maintained by insert/update/delete triggers.
+
+`match_filter` is what the transaction history listing uses; `search`
+returns ranked results for the search API. If the index is missing on a
+database (e.g. SQLite older than 3.34 or built without FTS5) both fall
+back to `icontains`.
+
+On SQLite, a migration that alters OrderHistory rebuilds the table and
+drops the triggers. Until they are back the FTS table goes stale, so it is
+only used while all three triggers exist; a post_migrate handler
+(`restore_index`) re-creates them and re-indexes, and
+`manage.py rebuild_history_search` does the same by hand. Whether they
+exist is remembered for `SQLITE_RECHECK` seconds per process.
+"""
+
+import difflib
+import re
+import time
+
+from django.db import connections, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import OrderHistory
+
+FTS_TABLE = 'restaurant_orderhistory_fts'
+FTS_TRIGGERS = (f'{FTS_TABLE}_ai', f'{FTS_TABLE}_ad', f'{FTS_TABLE}_au')
+
+# FTS5's trigram tokenizer first shipped in SQLite 3.34
+SQLITE_TRIGRAM_VERSION = (3, 34)
+# The SQLite trigram tokenizer cannot match terms shorter than this
+MIN_TERM_LENGTH = 3
+# Seconds a SQLite index check is trusted; a table rebuild in another
+# process drops the triggers behind this one's back
+SQLITE_RECHECK = 60
+# Phone queries with at least this many digits also get typo-tolerant matches
+FUZZY_MIN_DIGITS = 7
+FUZZY_WINDOW = 4
+FUZZY_MIN_RATIO = 0.75
+
+_PHONE_QUERY_RE = re.compile(r'^[\d\s()+./-]+$')
+_NON_DIGITS_RE = re.compile(r'\D')
+_NON_WORD_RE = re.compile(r'[^\w]+', re.UNICODE)
+
+# alias -> (available, time.monotonic() of the check)
+_availability = {}
+
+
+def _sqlite_digits(column):
+    # SQLite has no regexp_replace; strip the punctuation phone numbers use
+    expression = f"coalesce({column}, '')"
+    for char in (' ', '-', '+', '(', ')', '.', '/'):
+        expression = f"replace({expression}, '{char}', '')"
+    return expression
+
+
+SQLITE_INDEX_SQL = [
+    f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(order_id, customer_name, phone_digits, tokenize='trigram')",
+    f"CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON restaurant_orderhistory BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, order_id, customer_name, phone_digits) "
+    f"VALUES (new.id, new.order_id, new.customer_name, {_sqlite_digits('new.customer_phone')}); END",
+    f"CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON restaurant_orderhistory BEGIN "
+    f"DELETE FROM {FTS_TABLE} WHERE rowid = old.id; END",
+    f"CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE OF order_id, customer_name, customer_phone "
+    f"ON restaurant_orderhistory BEGIN "
+    f"DELETE FROM {FTS_TABLE} WHERE rowid = old.id; "
+    f"INSERT INTO {FTS_TABLE}(rowid, order_id, customer_name, phone_digits) "
+    f"VALUES (new.id, new.order_id, new.customer_name, {_sqlite_digits('new.customer_phone')}); END",
+    f"INSERT INTO {FTS_TABLE}(rowid, order_id, customer_name, phone_digits) "
+    f"SELECT id, order_id, customer_name, {_sqlite_digits('customer_phone')} FROM restaurant_orderhistory",
+]
+
+SQLITE_DROP_SQL = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+
+def normalize_phone(value):
+    """Strip everything but digits from a phone number."""
+    return _NON_DIGITS_RE.sub('', value or '')
+
+
+def parse_query(q):
+    """Split a search string into (terms, digits).
+
+    `digits` is set when the whole query looks like a phone number or an
+    order ID (digits plus phone punctuation); it is '' otherwise.
+    """
+    q = (q or '').strip()
+    if not q:
+        return [], ''
+    if _PHONE_QUERY_RE.match(q):
+        return [], normalize_phone(q)
+    terms = [term for term in _NON_WORD_RE.split(q) if term]
+    return terms, ''
+
+
+def _sqlite_index_state(connection):
+    """(FTS table exists, all of its triggers exist) on a SQLite connection."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT type, name FROM sqlite_master WHERE (type = 'table' AND name = %s) "
+            "OR (type = 'trigger' AND tbl_name = 'restaurant_orderhistory')",
+            [FTS_TABLE],
+        )
+        rows = cursor.fetchall()
+    triggers = {name for kind, name in rows if kind == 'trigger'}
+    return any(kind == 'table' for kind, _ in rows), triggers.issuperset(FTS_TRIGGERS)
+
+
+def sqlite_index_supported(connection):
+    """Whether this SQLite build can hold the index (trigram tokenizer and FTS5)."""
+    if connection.Database.sqlite_version_info < SQLITE_TRIGRAM_VERSION:
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        return bool(cursor.fetchone()[0])
+
+
+def search_index_available(using='default'):
+    """Whether migration 0033's search structures exist (and, on SQLite, are kept current)."""
+    connection = connections[using]
+    cached = _availability.get(using)
+    # Postgres generated columns cannot be dropped behind our back
+    if cached is not None and (
+        connection.vendor != 'sqlite' or time.monotonic() - cached[1] < SQLITE_RECHECK
+    ):
+        return cached[0]
+    if connection.vendor == 'sqlite':
+        available = all(_sqlite_index_state(connection))
+    elif connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM information_schema.columns "
+                "WHERE table_name = 'restaurant_orderhistory' AND column_name = 'search_vector'"
+            )
+            available = cursor.fetchone() is not None
+    else:
+        available = False
+    _availability[using] = (available, time.monotonic())
+    return available
+
+
+def forget_index_state(using=None):
+    """Check for the index again on the next search (one alias, or all)."""
+    if using is None:
+        _availability.clear()
+    else:
+        _availability.pop(using, None)
+
+
+def rebuild_index(using='default'):
+    """Recreate the SQLite FTS table and triggers from scratch.
+
+    Returns the number of rows indexed, or None when there is nothing to
+    rebuild (Postgres generated columns cannot drift, and SQLite builds
+    without the trigram tokenizer only search with `icontains`).
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite' or not sqlite_index_supported(connection):
+        return None
+    try:
+        with transaction.atomic(using=using), connection.cursor() as cursor:
+            for sql in SQLITE_DROP_SQL + SQLITE_INDEX_SQL:
+                cursor.execute(sql)
+            cursor.execute(f'SELECT count(*) FROM {FTS_TABLE}')
+            indexed = cursor.fetchone()[0]
+    finally:
+        forget_index_state(using)
+    return indexed
+
+
+def restore_index(using='default'):
+    """Rebuild the SQLite FTS index if its table exists but triggers are missing.
+
+    Returns the number of rows indexed, or None when nothing was needed (no
+    index to restore, or it is intact).
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return None
+    # Runs after migrations, which may have added or dropped the index
+    forget_index_state(using)
+    has_table, has_triggers = _sqlite_index_state(connection)
+    if not has_table or has_triggers:
+        return None
+    return rebuild_index(using)
+
+
+def _icontains_filter(value):
+    return Q(order_id__icontains=value) | Q(customer_name__icontains=value) | Q(customer_phone__icontains=value)
+
+
+def _fts_phrase(value):
+    return '"%s"' % value.replace('"', '""')
+
+
+def _pg_tsquery(terms):
+    return ' & '.join(f'{term}:*' for term in terms)
+
+
+def _pg_match(terms, digits):
+    """SQL condition and params matching rows on Postgres."""
+    if digits:
+        return "(order_id LIKE %s OR phone_digits LIKE %s)", [f'{digits}%', f'%{digits}%']
+    return "search_vector @@ to_tsquery('simple', %s)", [_pg_tsquery(terms)]
+
+
+def _sqlite_match(terms, digits):
+    """FTS5 MATCH expression for the indexable part of a query, or None."""
+    if digits:
+        if len(digits) < MIN_TERM_LENGTH:
+            return None
+        return '{order_id phone_digits} : ' + _fts_phrase(digits)
+    long_terms = [term for term in terms if len(term) >= MIN_TERM_LENGTH]
+    if not long_terms:
+        return None
+    return ' AND '.join(_fts_phrase(term) for term in long_terms)
+
+
+def match_filter(q, using='default'):
+    """Return a Q object selecting history rows that match search string `q`."""
+    terms, digits = parse_query(q)
+    if not terms and not digits:
+        return Q()
+    if not search_index_available(using):
+        return _icontains_filter(q.strip())
+
+    if connections[using].vendor == 'postgresql':
+        condition, params = _pg_match(terms, digits)
+        return Q(pk__in=RawSQL(f'SELECT id FROM restaurant_orderhistory WHERE {condition}', params))
+
+    expression = _sqlite_match(terms, digits)
+    result = Q()
+    if expression:
+        result &= Q(pk__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [expression]))
+    # Terms too short for the trigram index are matched the slow way
+    short_terms = [digits] if digits and not expression else [
+        term for term in terms if len(term) < MIN_TERM_LENGTH
+    ]
+    for term in short_terms:
+        result &= _icontains_filter(term)
+    return result
+
+
+def _pg_ranked(terms, digits, limit, fuzzy, using):
+    condition, params = _pg_match(terms, digits)
+    if digits:
+        score = (
+            "CASE WHEN order_id = %s THEN 10 WHEN order_id LIKE %s THEN 5 ELSE 0 END"
+            " + similarity(phone_digits, %s) * 3"
+        )
+        score_params = [digits, f'{digits}%', digits]
+        if fuzzy and len(digits) >= FUZZY_MIN_DIGITS:
+            # pg_trgm similarity operator; `%%` because params are interpolated
+            condition = f'({condition} OR phone_digits %% %s)'
+            params = params + [digits]
+    else:
+        score = "ts_rank(search_vector, to_tsquery('simple', %s))"
+        score_params = [_pg_tsquery(terms)]
+
+    sql = (
+        f'SELECT id, {score} AS rank FROM restaurant_orderhistory '
+        f'WHERE {condition} ORDER BY rank DESC, created_at DESC LIMIT %s'
+    )
+    with connections[using].cursor() as cursor:
+        cursor.execute(sql, score_params + params + [limit])
+        return [(row[0], float(row[1])) for row in cursor.fetchall()]
+
+
+def _sqlite_fts_rows(expression, limit, using):
+    sql = (
+        f'SELECT rowid, order_id, phone_digits, bm25({FTS_TABLE}, 10.0, 1.0, 5.0) AS score '
+        f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s ORDER BY score LIMIT %s'
+    )
+    with connections[using].cursor() as cursor:
+        cursor.execute(sql, [expression, limit])
+        return cursor.fetchall()
+
+
+def _sqlite_ranked(terms, digits, limit, fuzzy, using):
+    expression = _sqlite_match(terms, digits)
+    if expression is None:
+        return None
+
+    ranked = {}
+    for pk, order_id, phone_digits, score in _sqlite_fts_rows(expression, limit, using):
+        # bm25() is lower-is-better; flip it so every backend ranks descending
+        rank = -score
+        if digits and order_id == digits:
+            rank += 10
+        elif digits and order_id.startswith(digits):
+            rank += 5
+        ranked[pk] = rank
+
+    if fuzzy and digits and len(digits) >= FUZZY_MIN_DIGITS and len(ranked) < limit:
+        # One mistyped digit still leaves some FUZZY_WINDOW-digit run intact:
+        # fetch rows sharing any such run, then keep the close matches.
+        windows = {digits[i:i + FUZZY_WINDOW] for i in range(len(digits) - FUZZY_WINDOW + 1)}
+        expression = '{phone_digits} : (' + ' OR '.join(_fts_phrase(w) for w in sorted(windows)) + ')'
+        for pk, _, phone_digits, _ in _sqlite_fts_rows(expression, limit * 5, using):
+            if pk in ranked:
+                continue
+            ratio = difflib.SequenceMatcher(None, digits, phone_digits).ratio()
+            if ratio >= FUZZY_MIN_RATIO:
+                ranked[pk] = ratio - 1
+
+    return sorted(ranked.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+
+def search(q, limit=20, fuzzy=True, using='default'):
+    """Return up to `limit` OrderHistory rows matching `q`, best match first.
+
+    Each row gets a `search_rank` attribute (higher is better; only
+    comparable within one result list).
+    """
+    terms, digits = parse_query(q)
+    if not terms and not digits:
+        return []
+
+    ranked = None
+    if search_index_available(using):
+        if connections[using].vendor == 'postgresql':
+            ranked = _pg_ranked(terms, digits, limit, fuzzy, using)
+        else:
+            ranked = _sqlite_ranked(terms, digits, limit, fuzzy, using)
+
+    queryset = OrderHistory.objects.using(using).select_related('table')
+    if ranked is None:
+        rows = list(queryset.filter(match_filter(q, using)).order_by('-created_at')[:limit])
+        for row in rows:
+            row.search_rank = 0.0
+        return rows
+
+    by_pk = queryset.in_bulk([pk for pk, _ in ranked])
+    rows = []
+    for pk, rank in ranked:
+        row = by_pk.get(pk)
+        if row is not None:
+            row.search_rank = rank
+            rows.append(row)
+    return rows
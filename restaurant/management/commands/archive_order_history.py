@@ -0,0 +1,83 @@
+"""
+Django management command to move old order history into the cold archive.
+Usage: python manage.py archive_order_history [--older-than-months 12] [--format parquet|csv] [--dry-run]
+
+Months older than the cutoff are exported (orders, items, payments, status
+logs) under PRIVATE_ROOT/archive/order_history/YYYY-MM/ and removed from the
+database; on Postgres the month's partition is detached. Also creates the
+upcoming monthly partitions, so run it from cron once a month.
+"""
+
+from django.core.management.base import BaseCommand
+
+from restaurant import history_archive, history_partitions
+from restaurant.columnar import CSV, PARQUET, resolve_format
+
+
+class Command(BaseCommand):
+    help = 'Archive order history older than N months to Parquet/CSV files and drop it from the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than-months',
+            type=int,
+            default=12,
+            help='Archive months that ended more than this many months ago. Default: 12'
+        )
+        parser.add_argument(
+            '--format',
+            choices=[PARQUET, CSV],
+            default=None,
+            help='Archive file format. Default: parquet if pyarrow is installed, else csv'
+        )
+        parser.add_argument(
+            '--keep-detached',
+            action='store_true',
+            help='Postgres: keep detached partitions as standalone tables instead of dropping them'
+        )
+        parser.add_argument(
+            '--months-ahead',
+            type=int,
+            default=3,
+            help='Postgres: create partitions this many months ahead. Default: 3'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only list the months that would be archived'
+        )
+
+    def handle(self, *args, **options):
+        months = history_archive.months_to_archive(options['older_than_months'])
+        fmt = resolve_format(options['format'])
+
+        if options['format'] == PARQUET and fmt != PARQUET:
+            self.stdout.write(self.style.WARNING('⚠ pyarrow is not installed, writing gzipped CSV instead.'))
+
+        for name in history_archive.pending_months():
+            self.stdout.write(self.style.WARNING(
+                f'⚠ {name} has an unconfirmed archive (manifest.json.pending); check it before re-running.'
+            ))
+
+        if options['dry_run']:
+            if not months:
+                self.stdout.write('Nothing to archive.')
+            for month in months:
+                self.stdout.write(f'Would archive {month:%Y-%m} to {history_archive.month_dir(month)}')
+            return
+
+        for month in history_partitions.ensure_partitions(options['months_ahead']):
+            self.stdout.write(f'Created partition {history_partitions.partition_name(month)}')
+
+        if not months:
+            self.stdout.write(self.style.SUCCESS('✓ Nothing to archive.'))
+            return
+
+        for month in months:
+            try:
+                manifest = history_archive.archive_month(month, fmt=fmt, drop_partition=not options['keep_detached'])
+            except history_archive.ArchiveError as e:
+                self.stdout.write(self.style.ERROR(f'✗ {e}'))
+                continue
+            counts = ', '.join(f"{info['rows']} {name}" for name, info in manifest['tables'].items())
+            self.stdout.write(self.style.SUCCESS(f'✓ Archived {month:%Y-%m}: {counts}'))
@@ -0,0 +1,76 @@
+"""
+Django management command to create resized variants of existing menu images.
+Usage: python manage.py backfill_thumbnails [--workers 4] [--force]
+
+Images uploaded before the thumbnail pipeline existed (or whose variants
+were deleted) get their WebP/JPEG variants written in a process pool.
+Images that already have a manifest are skipped unless --force.
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from restaurant import thumbnails
+from restaurant.models import MenuItem
+
+
+def _generate(name, force):
+    # Runs in a worker process; errors are reported back instead of raised
+    try:
+        manifest = thumbnails.generate(name, force=force)
+        return name, len(manifest['variants']), None
+    except Exception as e:
+        return name, 0, str(e)
+
+
+class Command(BaseCommand):
+    help = 'Create resized WebP/JPEG variants for every MenuItem image'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Worker processes. Default: number of CPUs'
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Regenerate variants even if they already exist'
+        )
+
+    def handle(self, *args, **options):
+        names = sorted(set(
+            MenuItem.objects.exclude(image='').exclude(image__isnull=True).values_list('image', flat=True)
+        ))
+        if not names:
+            self.stdout.write(self.style.SUCCESS('✓ No menu images to process.'))
+            return
+
+        self.stdout.write(f"Processing {len(names)} images with {options['workers']} workers...")
+        # Forked workers must not share the parent's database connections
+        connections.close_all()
+
+        started = time.perf_counter()
+        done = failed = 0
+        with ProcessPoolExecutor(max_workers=max(1, options['workers'])) as pool:
+            futures = [pool.submit(_generate, name, options['force']) for name in names]
+            for future in as_completed(futures):
+                name, variants, error = future.result()
+                if error:
+                    failed += 1
+                    self.stdout.write(self.style.ERROR(f'✗ {name}: {error}'))
+                else:
+                    done += 1
+                    self.stdout.write(f'  {name}: {variants} sizes')
+
+        elapsed = time.perf_counter() - started
+        if done:
+            thumbnails.published()
+        self.stdout.write(self.style.SUCCESS(f'✓ Processed {done} images in {elapsed:.1f}s'))
+        if failed:
+            self.stdout.write(self.style.WARNING(f'⚠ {failed} images could not be processed'))
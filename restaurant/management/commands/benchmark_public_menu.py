@@ -0,0 +1,160 @@
+"""
+Django management command to load-test the anonymous public menu.
+Usage: python manage.py benchmark_public_menu [--requests 2000] [--concurrency 8] [--url http://127.0.0.1:8000]
+
+Without --url the requests go through Django's full middleware stack
+in-process (django.test.Client), so the numbers show the cost of the view
+itself. With --url they are real HTTP requests against a running server.
+Each scenario reports requests/sec, latency percentiles and body size; the
+"uncached rebuild" scenario approximates what every scan cost before the
+menu was pre-rendered (menu queries + template render).
+"""
+
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+
+from restaurant import menu_catalog, public_menu
+
+
+class Command(BaseCommand):
+    help = 'Measure requests/sec of the pre-rendered public menu (plain, gzip, brotli, 304)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=2000,
+            help='Requests per scenario. Default: 2000'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=8,
+            help='Concurrent client threads. Default: 8'
+        )
+        parser.add_argument(
+            '--url',
+            default=None,
+            help='Base URL of a running server (e.g. http://127.0.0.1:8000); default: in-process'
+        )
+        parser.add_argument(
+            '--host',
+            default='localhost',
+            help='Host header for in-process requests. Default: localhost'
+        )
+
+    def handle(self, *args, **options):
+        menu = public_menu.get_public_menu()
+        html_etag = menu.representations[public_menu.HTML].etag_for(public_menu.IDENTITY)
+
+        scenarios = [
+            ('html, no compression', reverse('restaurant:public_menu_page'), {}),
+            ('html, gzip', reverse('restaurant:public_menu_page'), {'Accept-Encoding': 'gzip'}),
+        ]
+        if public_menu.brotli_available():
+            scenarios.append(('html, brotli', reverse('restaurant:public_menu_page'), {'Accept-Encoding': 'br, gzip'}))
+        else:
+            self.stdout.write(self.style.WARNING('⚠ brotli is not installed; skipping the brotli scenario.'))
+        scenarios += [
+            ('html, conditional 304', reverse('restaurant:public_menu_page'),
+             {'Accept-Encoding': 'gzip', 'If-None-Match': html_etag}),
+            ('json, gzip', reverse('restaurant:public_menu_json'), {'Accept-Encoding': 'gzip'}),
+        ]
+
+        target = options['url'] or 'in-process'
+        self.stdout.write(
+            f"Public menu v{menu.version} | {options['requests']} requests x {options['concurrency']} threads | {target}\n"
+        )
+        header = f"{'scenario':<26}{'req/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'bytes':>9}{'errors':>8}"
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+
+        for name, path, headers in scenarios:
+            self.report(name, self.run_scenario(path, headers, options))
+
+        if not options['url']:
+            # Baseline: what each scan cost without the pre-rendered copy
+            count = min(options['requests'], 200)
+            latencies = []
+            started = time.perf_counter()
+            for _ in range(count):
+                t0 = time.perf_counter()
+                public_menu.PublicMenu(menu_catalog._load_catalog())
+                latencies.append(time.perf_counter() - t0)
+            elapsed = time.perf_counter() - started
+            self.report('uncached rebuild (1 thread)', (count, elapsed, latencies, 0, 0))
+
+        self.stdout.write(self.style.SUCCESS('\n✓ Benchmark complete.'))
+
+    def run_scenario(self, path, headers, options):
+        total = options['requests']
+        threads = max(1, options['concurrency'])
+        latencies = []
+        results = {'errors': 0, 'bytes': 0}
+        lock = threading.Lock()
+
+        def worker(count):
+            local, errors, size = [], 0, 0
+            if options['url']:
+                url = options['url'].rstrip('/') + path
+                for _ in range(count):
+                    request = urllib.request.Request(url, headers=headers)
+                    t0 = time.perf_counter()
+                    try:
+                        with urllib.request.urlopen(request) as response:
+                            size = len(response.read())
+                    except urllib.error.HTTPError as e:
+                        if e.code != 304:
+                            errors += 1
+                        size = 0
+                    except OSError:
+                        errors += 1
+                    local.append(time.perf_counter() - t0)
+            else:
+                client = Client(HTTP_HOST=options['host'])
+                extra = {'HTTP_' + key.upper().replace('-', '_'): value for key, value in headers.items()}
+                for _ in range(count):
+                    t0 = time.perf_counter()
+                    response = client.get(path, **extra)
+                    local.append(time.perf_counter() - t0)
+                    if response.status_code not in (200, 304):
+                        errors += 1
+                    size = len(response.content)
+                connection.close()
+            with lock:
+                latencies.extend(local)
+                results['errors'] += errors
+                results['bytes'] = size
+
+        per_thread = [total // threads + (1 if i < total % threads else 0) for i in range(threads)]
+        workers = [threading.Thread(target=worker, args=(count,)) for count in per_thread if count]
+        started = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        return total, elapsed, latencies, results['bytes'], results['errors']
+
+    def report(self, name, result):
+        count, elapsed, latencies, size, errors = result
+        latencies = sorted(latencies)
+
+        def percentile(p):
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+        rate = count / elapsed if elapsed else 0.0
+        line = (
+            f'{name:<26}{rate:>10.0f}{percentile(0.50):>9.2f}{percentile(0.95):>9.2f}'
+            f'{percentile(0.99):>9.2f}{size:>9}{errors:>8}'
+        )
+        self.stdout.write(self.style.ERROR(line) if errors else line)
@@ -1,14 +1,17 @@
 """
 Django management command to cluster menu items by demand using K-Means.
 Usage: python manage.py cluster_menu_items
+
+Items are clustered on MenuItem.order_count, the number of archived orders
+containing them (kept by restaurant.menu_counters); only the tiers are written.
 """
 
 from django.core.management.base import BaseCommand
 from django.utils import timezone
-from django.db.models import Count
 import numpy as np
 from sklearn.cluster import KMeans
-from restaurant.models import MenuItem, OrderHistoryItem
+from restaurant import menu_ranking
+from restaurant.models import MenuItem
 
 
 class Command(BaseCommand):
@@ -33,12 +36,12 @@ class Command(BaseCommand):
 
         self.stdout.write(self.style.SUCCESS('Starting K-Means clustering...'))
 
-        # Step 1: Get order counts for all items from OrderHistory (completed orders only)
+        # Step 1: Get the stored order counts of items that have been ordered
         try:
             item_order_counts = (
-                OrderHistoryItem.objects
-                .values('item__id', 'item__name')
-                .annotate(order_count=Count('id'))
+                MenuItem.objects
+                .filter(order_count__gt=0)
+                .values('id', 'name', 'order_count')
                 .order_by('-order_count')
             )
 
@@ -55,7 +58,7 @@ class Command(BaseCommand):
                 self.stdout.write(f'\nFound {len(items_data)} items with order history:')
                 for item in items_data:
                     self.stdout.write(
-                        f"  - {item['item__name']}: {item['order_count']} orders"
+                        f"  - {item['name']}: {item['order_count']} orders"
                     )
 
             # Step 2: Prepare data for K-Means
@@ -93,16 +96,15 @@ class Command(BaseCommand):
             for rank, cluster_id in enumerate(cluster_order):
                 cluster_to_tier[cluster_id] = tier_names[min(rank, len(tier_names) - 1)]
 
-            # Step 5: Update MenuItem with tier and order count
+            # Step 5: Update MenuItem tiers (order_count is maintained by restaurant.menu_counters)
             updated_count = 0
             for item_data, cluster_label in zip(items_data, cluster_labels):
-                menu_item = MenuItem.objects.get(id=item_data['item__id'])
+                menu_item = MenuItem.objects.get(id=item_data['id'])
                 tier = cluster_to_tier[cluster_label]
                 
                 menu_item.demand_tier = tier
-                menu_item.order_count = item_data['order_count']
                 menu_item.last_tier_update = timezone.now()
-                menu_item.save()
+                menu_item.save(update_fields=['demand_tier', 'last_tier_update'])
                 updated_count += 1
 
                 if verbose:
@@ -110,6 +112,11 @@ class Command(BaseCommand):
                         f"  {menu_item.name}: {item_data['order_count']} orders → {tier.upper()}"
                     )
 
+            # Rebuild the popularity ranks from the new tiers and counts
+            ranked = menu_ranking.refresh_rankings()
+            if verbose:
+                self.stdout.write(f'Refreshed menu ranking for {ranked} items.')
+
             # Step 6: Display summary by tier
             self.stdout.write(self.style.SUCCESS('\n✓ Clustering complete!'))
             self.stdout.write(f'\nUpdated {updated_count} menu items.\n')
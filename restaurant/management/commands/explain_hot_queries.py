@@ -0,0 +1,122 @@
+"""
+Django management command to print query plans for the hot OrderHistory queries.
+Usage: python manage.py explain_hot_queries [--analyze] [--days 30] [--search 9841]
+
+The querysets are built with restaurant.history_queries, i.e. exactly what
+transaction_history and the CSV/PDF exports run, so a plan that falls back to
+a full table scan here is the plan production gets too. On a partitioned
+Postgres history table it also reports how many monthly partitions each
+plan touches, to confirm date filters are pruned.
+"""
+
+import re
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from restaurant import history_partitions
+from restaurant.history_queries import filter_order_history
+
+_PARTITION_RE = re.compile(r'\b(restaurant_orderhistory_(?:p\d{6}|default))\b')
+
+
+class Command(BaseCommand):
+    help = 'Print EXPLAIN output for the transaction history and export queries'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--analyze',
+            action='store_true',
+            help='Run EXPLAIN ANALYZE (Postgres only; executes the queries)'
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=30,
+            help='Width of the date-range filter used in the plans. Default: 30'
+        )
+        parser.add_argument(
+            '--search',
+            default='9841',
+            help='Search term used for the search-box plan. Default: 9841'
+        )
+        parser.add_argument(
+            '--page-size',
+            type=int,
+            default=10,
+            help='Row limit applied to the paged listing plans. Default: 10'
+        )
+
+    def get_scenarios(self, options):
+        today = timezone.localdate()
+        date_range = {
+            'start_date': (today - timedelta(days=options['days'])).isoformat(),
+            'end_date': today.isoformat(),
+        }
+        page = options['page_size']
+        return [
+            ('history page (no filters)', filter_order_history({})[:page]),
+            ('history page, date range', filter_order_history(date_range)[:page]),
+            ('history page, type + date range',
+             filter_order_history({**date_range, 'order_type': 'takeaway'})[:page]),
+            ('history page, status + date range',
+             filter_order_history({**date_range, 'status': 'completed'})[:page]),
+            ('history page, search', filter_order_history({'q': options['search']})[:page]),
+            ('CSV/PDF export, date range', filter_order_history(date_range)),
+        ]
+
+    def handle(self, *args, **options):
+        vendor = connection.vendor
+        explain_options = {}
+        if options['analyze']:
+            if vendor == 'postgresql':
+                explain_options = {'analyze': True, 'buffers': True}
+            else:
+                self.stdout.write(self.style.WARNING(f'⚠ --analyze is only supported on Postgres, ignoring on {vendor}.'))
+
+        self.stdout.write(f'Database: {vendor} ({connection.settings_dict.get("NAME")})')
+        partition_count = None
+        if history_partitions.is_partitioned():
+            # Every month partition plus DEFAULT
+            partition_count = len(history_partitions.list_partitions()) + 1
+            self.stdout.write(f'restaurant_orderhistory is partitioned into {partition_count} partitions')
+
+        full_scans = []
+        unpruned = []
+        for label, queryset in self.get_scenarios(options):
+            plan = queryset.explain(**explain_options)
+            self.stdout.write('')
+            self.stdout.write(self.style.MIGRATE_HEADING(label))
+            self.stdout.write(str(queryset.query))
+            self.stdout.write(plan)
+            if self.is_full_scan(vendor, plan):
+                full_scans.append(label)
+            if partition_count:
+                scanned = set(_PARTITION_RE.findall(plan))
+                self.stdout.write(f'Partitions scanned: {len(scanned)} of {partition_count}')
+                if 'date range' in label and len(scanned) >= partition_count > 1:
+                    unpruned.append(label)
+
+        self.stdout.write('')
+        if unpruned:
+            self.stdout.write(self.style.WARNING(f'⚠ No partition pruning in: {", ".join(unpruned)}'))
+        if full_scans:
+            self.stdout.write(self.style.WARNING(
+                f'⚠ Full scans of restaurant_orderhistory in: {", ".join(full_scans)}'
+            ))
+            self.stdout.write('  Small tables are often scanned on purpose; re-check with production-sized data.')
+        else:
+            self.stdout.write(self.style.SUCCESS('✓ No full scans of restaurant_orderhistory.'))
+
+    @staticmethod
+    def is_full_scan(vendor, plan):
+        if vendor == 'postgresql':
+            return 'Seq Scan on restaurant_orderhistory' in plan
+        if vendor == 'sqlite':
+            return any(
+                line.strip().endswith('SCAN restaurant_orderhistory')
+                for line in plan.splitlines()
+            )
+        return False
@@ -0,0 +1,71 @@
+"""
+Django management command to print QR codes for every table.
+Usage: python manage.py generate_table_qr_sheet --base-url https://example.com [--output table_qr_codes.pdf] [--workers 4]
+
+Writes an A4 PDF with one labelled code per table, each pointing at the
+public menu for that table number. Codes are cached under QR_CACHE_DIR, so
+re-printing after adding a table only generates the new one.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from restaurant import qr_codes, table_registry
+
+
+class Command(BaseCommand):
+    help = 'Generate a print-ready PDF sheet of per-table QR codes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--base-url',
+            required=True,
+            help='Public site URL the codes point to, e.g. https://restaurant.example.com'
+        )
+        parser.add_argument(
+            '--output',
+            default='table_qr_codes.pdf',
+            help='PDF file to write. Default: table_qr_codes.pdf'
+        )
+        parser.add_argument(
+            '--ec',
+            choices=sorted(qr_codes.ERROR_CORRECTION),
+            default='M',
+            help='Error-correction level. Default: M'
+        )
+        parser.add_argument(
+            '--columns',
+            type=int,
+            default=3,
+            help='Codes per row. Default: 3'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='Processes used to generate uncached codes. Default: chosen from the table count'
+        )
+
+    def handle(self, *args, **options):
+        tables = table_registry.get_tables()
+        if not tables:
+            self.stdout.write(self.style.WARNING('⚠ No tables found.'))
+            return
+
+        menu_url = options['base_url'].rstrip('/') + reverse('restaurant:public_menu_page')
+        started = time.perf_counter()
+        try:
+            pdf = qr_codes.table_sheet_pdf(
+                menu_url, tables, ec=options['ec'], columns=options['columns'], workers=options['workers'],
+            )
+        except ImportError:
+            raise CommandError('QR sheets require the `reportlab` package. Install with: pip install reportlab')
+
+        with open(options['output'], 'wb') as handle:
+            handle.write(pdf)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ Wrote {len(tables)} table QR codes to {options['output']} in {elapsed:.2f}s"
+        ))
@@ -0,0 +1,71 @@
+"""
+Django management command to move menu images uploaded before MEDIA_ROOT was set.
+Usage: python manage.py move_media_uploads [--from DIR] [--dry-run]
+
+Until MEDIA_ROOT was configured, uploads were saved relative to the working
+directory of the server process (e.g. ./menu_images/). The database stores
+names relative to the media root, so moving each file to the same name under
+MEDIA_ROOT keeps every MenuItem.image valid. Files already in MEDIA_ROOT are
+left alone; run it once after upgrading, from or with --from pointing at the
+directory the server used to run in.
+"""
+
+import os
+import shutil
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from restaurant.models import MenuItem
+
+
+class Command(BaseCommand):
+    help = 'Move menu images from the old working-directory media root into MEDIA_ROOT'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--from',
+            dest='source',
+            default=os.getcwd(),
+            help='Directory the uploads were saved under. Default: the current directory'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only list the files that would be moved'
+        )
+
+    def handle(self, *args, **options):
+        source = Path(options['source']).resolve()
+        target = Path(settings.MEDIA_ROOT).resolve()
+        if source == target:
+            self.stdout.write(self.style.WARNING(f'⚠ {source} already is MEDIA_ROOT; nothing to move'))
+            return
+
+        names = (
+            MenuItem.objects.exclude(image='').exclude(image__isnull=True)
+            .values_list('image', flat=True).distinct()
+        )
+        moved = present = missing = 0
+        for name in names:
+            destination = target / name
+            if destination.exists():
+                present += 1
+                continue
+            origin = source / name
+            if not origin.is_file():
+                missing += 1
+                self.stdout.write(self.style.WARNING(f'⚠ {name}: not found in {source} or MEDIA_ROOT'))
+                continue
+            if options['dry_run']:
+                self.stdout.write(f'Would move {origin} to {destination}')
+            else:
+                destination.parent.mkdir(parents=True, exist_ok=True)
+                shutil.move(str(origin), str(destination))
+            moved += 1
+
+        verb = 'Would move' if options['dry_run'] else 'Moved'
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {verb} {moved} file(s) into {target}; {present} already there, {missing} missing'
+        ))
@@ -0,0 +1,34 @@
+"""
+Django management command to rebuild the OrderHistory search index.
+Usage: python manage.py rebuild_history_search
+
+Only needed on SQLite, after a migration that alters OrderHistory: Django
+rebuilds the table there, which drops the triggers that keep the FTS5
+index in sync. `migrate` restores them by itself (see
+restaurant.signals.restore_history_search); this forces a full re-index.
+On Postgres the search columns are generated and never drift.
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from restaurant.history_search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Recreate the SQLite full-text index used by transaction history search'
+
+    def handle(self, *args, **options):
+        indexed = rebuild_index()
+        if indexed is None and connection.vendor == 'sqlite':
+            self.stdout.write(self.style.WARNING(
+                f'⚠ SQLite {connection.Database.sqlite_version} has no FTS5 trigram tokenizer (3.34+); '
+                'history search uses plain substring matching.'
+            ))
+            return
+        if indexed is None:
+            self.stdout.write(self.style.SUCCESS(
+                f'✓ Nothing to rebuild on {connection.vendor}; search columns are maintained by the database.'
+            ))
+            return
+        self.stdout.write(self.style.SUCCESS(f'✓ Indexed {indexed} history row(s).'))
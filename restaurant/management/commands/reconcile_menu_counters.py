@@ -0,0 +1,63 @@
+"""
+Django management command to verify and repair MenuItem.order_count.
+Usage: python manage.py reconcile_menu_counters [--dry-run] [--verbose] [--skip-archive]
+
+order_count is maintained incrementally when orders are archived; run this
+periodically (e.g. nightly from cron) to correct any drift from history
+edited by hand, bulk imports or failed archivals.
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from restaurant import menu_ranking
+from restaurant.menu_counters import find_drift, repair
+
+
+class Command(BaseCommand):
+    help = 'Compare MenuItem.order_count with the orders in history and repair any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report drifted items, do not repair them'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of items repaired per UPDATE. Default: 500'
+        )
+        parser.add_argument(
+            '--skip-archive',
+            action='store_true',
+            help='Count only history still in the database, not archived months'
+        )
+        parser.add_argument(
+            '--verbose',
+            action='store_true',
+            help='Print every drifted item'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('Checking menu item order counts against order history...')
+
+        drifted = find_drift(include_archive=not options['skip_archive'])
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS('✓ All menu item order counts are consistent.'))
+            return
+
+        self.stdout.write(self.style.WARNING(f'⚠ {len(drifted)} menu item(s) have drifted order counts.'))
+        if options['verbose']:
+            for row in drifted:
+                self.stdout.write(f"  {row['name']} (#{row['pk']}): {row['order_count']} -> {row['expected_order_count']}")
+
+        if options['dry_run']:
+            self.stdout.write('Dry run: no changes made.')
+            return
+
+        with transaction.atomic():
+            updated = repair(drifted, batch_size=options['batch_size'])
+        menu_ranking.mark_dirty()
+        self.stdout.write(self.style.SUCCESS(f'✓ Repaired {updated} menu item(s).'))
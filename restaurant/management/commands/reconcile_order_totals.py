@@ -0,0 +1,62 @@
+"""
+Django management command to verify and repair the running totals on Order.
+Usage: python manage.py reconcile_order_totals [--dry-run] [--verbose]
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from restaurant.models import Order
+from restaurant.order_totals import find_drift, repair
+
+
+class Command(BaseCommand):
+    help = 'Compare Order.paid_amount, item_count and total_amount with their rows and repair any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report drifted orders, do not repair them'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of orders repaired per UPDATE. Default: 500'
+        )
+        parser.add_argument(
+            '--verbose',
+            action='store_true',
+            help='Print every drifted order'
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        verbose = options['verbose']
+
+        total_orders = Order.objects.count()
+        self.stdout.write(f'Checking running totals on {total_orders} active orders...')
+
+        drifted = find_drift()
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS('✓ All order totals are consistent.'))
+            return
+
+        self.stdout.write(self.style.WARNING(f'⚠ {len(drifted)} order(s) have drifted totals.'))
+        if verbose:
+            for row in drifted:
+                self.stdout.write(
+                    f"  Order {row['order_id']}: "
+                    f"paid {row['paid_amount']} -> {row['expected_paid_amount']}, "
+                    f"items {row['item_count']} -> {row['expected_item_count']}, "
+                    f"total {row['total_amount']} -> {row['expected_total_amount']}"
+                )
+
+        if dry_run:
+            self.stdout.write('Dry run: no changes made.')
+            return
+
+        with transaction.atomic():
+            updated = repair((row['pk'] for row in drifted), batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'✓ Repaired {updated} order(s).'))
@@ -0,0 +1,44 @@
+"""
+Django management command to rebuild the precomputed menu popularity ranking.
+Usage: python manage.py refresh_menu_ranking [--top 10]
+
+Normally the ranking refreshes itself after tiering and after orders are
+archived; run this after bulk imports or from a scheduler.
+"""
+
+from django.core.management.base import BaseCommand
+
+from restaurant import menu_catalog, menu_ranking
+
+
+class Command(BaseCommand):
+    help = 'Rebuild MenuItemRank (overall, per-category, per-tier and recent-velocity ranks)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top',
+            type=int,
+            default=10,
+            help='Number of top items to print afterwards. Default: 10'
+        )
+
+    def handle(self, *args, **options):
+        count = menu_ranking.refresh_rankings()
+        if not count:
+            self.stdout.write(self.style.WARNING('⚠ No menu items to rank.'))
+            return
+        self.stdout.write(self.style.SUCCESS(f'✓ Ranked {count} menu items.'))
+
+        ranking = menu_ranking.get_ranking()
+        catalog = menu_catalog.get_catalog()
+        top = options['top']
+        if top <= 0:
+            return
+        self.stdout.write(f"\n{'rank':>5}  {'item':<30}{'orders':>8}{'qty':>8}{'velocity':>10}{'trend':>7}  tier")
+        for entry in ranking.overall[:top]:
+            item = catalog.by_id.get(entry.item_id)
+            name = item.name if item else f'#{entry.item_id}'
+            self.stdout.write(
+                f'{entry.overall_rank:>5}  {name[:29]:<30}{entry.order_count:>8}{entry.total_quantity:>8}'
+                f'{entry.velocity:>10.2f}{entry.velocity_rank:>7}  {entry.demand_tier}'
+            )
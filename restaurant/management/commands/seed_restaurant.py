@@ -0,0 +1,165 @@
+"""
+Django management command to generate large, realistic synthetic datasets.
+Usage: python manage.py seed_restaurant [--days 365] [--orders-per-day 300] [--seed 42] [--workers 4]
+
+Writes `--days` days of order history (orders, items, payments, status logs)
+plus today's open orders, with bulk_create in batches. Order volume follows
+weekday and hour-of-day curves and a yearly wave; a few dishes sell most
+(Zipf popularity with exponent --skew). The same --seed always produces the
+same rows, whatever --workers is. A menu, tables and accounts.User staff
+are created first if missing.
+
+For example, --days 365 --orders-per-day 3000 gives about 1.1M orders and
+10M rows. On Postgres the days are split across worker processes; SQLite
+allows one writer at a time, so there everything runs in this process.
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+
+from restaurant import synthetic
+
+# Days handed to a worker at a time; small enough to balance the pool
+DAYS_PER_TASK = 7
+
+
+def _weights(value):
+    return tuple(float(part) for part in value.split(','))
+
+
+def _generate(plan, days, batch_size):
+    # Runs in a worker process
+    try:
+        return synthetic.generate_days(plan, days, batch_size), None
+    except Exception as e:
+        return 0, str(e)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Generate millions of synthetic orders, history, items, payments and status logs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=365, help='Days of history before today. Default: 365')
+        parser.add_argument('--orders-per-day', type=int, default=300, help='Average orders per day. Default: 300')
+        parser.add_argument('--active-orders', type=int, default=40, help='Open orders for today. Default: 40')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed. Default: 42')
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Worker processes (Postgres only). Default: number of CPUs'
+        )
+        parser.add_argument('--batch-size', type=int, default=2000, help='Rows per INSERT. Default: 2000')
+        parser.add_argument(
+            '--skew',
+            type=float,
+            default=1.1,
+            help='Zipf exponent of menu popularity; 0 means uniform. Default: 1.1'
+        )
+        parser.add_argument(
+            '--weekday-weights',
+            type=_weights,
+            default=synthetic.WEEKDAY_WEIGHTS,
+            help='7 comma-separated relative volumes, Monday first. Default: busier weekends'
+        )
+        parser.add_argument(
+            '--hour-weights',
+            type=_weights,
+            default=synthetic.HOUR_WEIGHTS,
+            help='24 comma-separated relative volumes from 00:00. Default: lunch and dinner peaks'
+        )
+        parser.add_argument(
+            '--yearly-amplitude',
+            type=float,
+            default=0.15,
+            help='Size of the yearly wave in volume (0.15 = +/-15%%). Default: 0.15'
+        )
+        parser.add_argument('--cancel-rate', type=float, default=0.03, help='Share of cancelled orders. Default: 0.03')
+        parser.add_argument('--categories', type=int, default=8, help='Categories if no menu exists. Default: 8')
+        parser.add_argument(
+            '--items-per-category',
+            type=int,
+            default=12,
+            help='Dishes per category if no menu exists. Default: 12'
+        )
+        parser.add_argument('--tables', type=int, default=30, help='Tables to make sure exist. Default: 30')
+        parser.add_argument('--staff', type=int, default=5, help='Staff users signing off orders. Default: 5')
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Allow running with DEBUG off (i.e. possibly against production)'
+        )
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options['force']:
+            raise CommandError('DEBUG is off; refusing to fill what may be a production database. Use --force.')
+
+        try:
+            plan = synthetic.build_plan(
+                days=options['days'],
+                orders_per_day=options['orders_per_day'],
+                seed=options['seed'],
+                skew=options['skew'],
+                yearly_amplitude=options['yearly_amplitude'],
+                weekday_weights=options['weekday_weights'],
+                hour_weights=options['hour_weights'],
+                cancel_rate=options['cancel_rate'],
+                categories=options['categories'],
+                items_per_category=options['items_per_category'],
+                tables=options['tables'],
+                staff=options['staff'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        workers = max(1, options['workers'])
+        if connection.vendor == 'sqlite' and workers > 1:
+            self.stdout.write(self.style.WARNING('⚠ SQLite allows one writer at a time; using 1 worker.'))
+            workers = 1
+        self.stdout.write(
+            f"Generating {plan.order_count} orders over {len(plan.days)} days "
+            f"({len(plan.items)} menu items, seed {plan.seed}, {workers} worker(s))..."
+        )
+
+        started = time.perf_counter()
+        synthetic.prepare(plan)
+        tasks = [plan.days[i:i + DAYS_PER_TASK] for i in range(0, len(plan.days), DAYS_PER_TASK)]
+        written = 0
+        if workers == 1:
+            for days in tasks:
+                written += synthetic.generate_days(plan, days, options['batch_size'])
+                self.stdout.write(f'  {days[-1][0]}: {written} orders')
+        else:
+            # Forked workers must not share the parent's database connections
+            connections.close_all()
+            failed = []
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = {pool.submit(_generate, plan, days, options['batch_size']): days for days in tasks}
+                for future in as_completed(futures):
+                    count, error = future.result()
+                    days = futures[future]
+                    if error:
+                        failed.append(days)
+                        self.stdout.write(self.style.ERROR(f'✗ {days[0][0]} .. {days[-1][0]}: {error}'))
+                    else:
+                        written += count
+                        self.stdout.write(f'  {days[0][0]} .. {days[-1][0]}: {written} orders')
+            if failed:
+                raise CommandError(f'{len(failed)} batch(es) of days failed; fix the error and re-run on an empty history')
+
+        active = synthetic.generate_active_orders(plan, options['active_orders'], options['batch_size'])
+        self.stdout.write('Resetting sequences and rebuilding menu counters...')
+        synthetic.finish()
+
+        elapsed = time.perf_counter() - started
+        rate = written / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Wrote {written} history orders and {active} open orders in {elapsed:.1f}s ({rate:.0f} orders/s).'
+        ))
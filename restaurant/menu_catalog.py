@@ -0,0 +1,173 @@
+"""
+Versioned, pre-serialized snapshot of the menu.
+
+The order entry screens, the order detail page, the staff menu and the
+public menu all show the same categories and items. Instead of querying and
+re-serializing them on every page load, each process keeps one immutable
+`MenuCatalog`: plain entries for templates, the order-entry JSON string and
+the full catalog as JSON bytes with an ETag for `/menu/catalog.json`.
+
+Saving or deleting a `MenuItem` or `Category` bumps the catalog version (see
+`restaurant.signals`). The version lives in the default cache, so with a
+shared cache every worker rebuilds on its next request; with the per-process
+LocMem cache other workers catch up after `MENU_CATALOG_TTL` seconds.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Category, MenuItem
+
+DEFAULT_TTL = 300
+VERSION_KEY = 'restaurant:menu_catalog:version'
+
+# MenuItem fields that change with order volume, not with the menu itself
+STATS_FIELDS = frozenset({'order_count', 'demand_tier', 'last_tier_update'})
+
+MenuEntry = namedtuple('MenuEntry', [
+    'id', 'name', 'description', 'price', 'category_id', 'category_name',
+    'is_available', 'preparation_area', 'image_name', 'image_url',
+])
+CategoryEntry = namedtuple('CategoryEntry', ['id', 'name', 'is_active', 'items'])
+
+_lock = threading.Lock()
+_catalog = None
+
+
+def _version():
+    return cache.get(VERSION_KEY, 0)
+
+
+class MenuCatalog:
+    """Immutable view of every category and menu item, ordered by primary key."""
+
+    def __init__(self, categories, version):
+        self.categories = tuple(categories)
+        self.items = tuple(item for category in self.categories for item in category.items)
+        self.by_id = {item.id: item for item in self.items}
+        self.version = version
+        self.loaded_at = time.monotonic()
+
+        # What can be ordered right now: available items in active categories
+        self.orderable_items = tuple(
+            item for category in self.active_categories() for item in category.items if item.is_available
+        )
+        self.order_items_json = json.dumps([
+            {
+                'id': item.id,
+                'name': item.name,
+                'price': float(item.price),
+                'category_id': item.category_id,
+                'category__name': item.category_name,
+            }
+            for item in self.orderable_items
+        ])
+        self.json_bytes = json.dumps({
+            'version': version,
+            'categories': [
+                {'id': category.id, 'name': category.name, 'is_active': category.is_active}
+                for category in self.categories
+            ],
+            'items': [
+                {
+                    'id': item.id,
+                    'name': item.name,
+                    'description': item.description,
+                    'price': float(item.price),
+                    'category_id': item.category_id,
+                    'is_available': item.is_available,
+                    'preparation_area': item.preparation_area,
+                    'image_url': item.image_url,
+                }
+                for item in self.items
+            ],
+        }, separators=(',', ':')).encode('utf-8')
+        # Content hash rather than the version number, so every worker agrees on it
+        self.etag = hashlib.sha256(self.json_bytes).hexdigest()[:32]
+
+    def is_stale(self):
+        ttl = getattr(settings, 'MENU_CATALOG_TTL', DEFAULT_TTL)
+        if ttl is not None and time.monotonic() - self.loaded_at > ttl:
+            return True
+        return _version() != self.version
+
+    def active_categories(self):
+        return [category for category in self.categories if category.is_active]
+
+    def available_items(self):
+        """Available items in any category (what order_details offers)."""
+        return [item for item in self.items if item.is_available]
+
+    def public_categories(self):
+        """Active categories with only their available items, for diners."""
+        return [
+            category._replace(items=tuple(item for item in category.items if item.is_available))
+            for category in self.active_categories()
+        ]
+
+
+def _load_catalog():
+    version = _version()
+    items_by_category = {}
+    for item in MenuItem.objects.select_related('category').order_by('id'):
+        items_by_category.setdefault(item.category_id, []).append(MenuEntry(
+            id=item.id,
+            name=item.name,
+            description=item.description,
+            price=item.price,
+            category_id=item.category_id,
+            category_name=item.category.name,
+            is_available=item.is_available,
+            preparation_area=item.preparation_area,
+            image_name=item.image.name if item.image else '',
+            image_url=item.image.url if item.image else '',
+        ))
+    categories = [
+        CategoryEntry(category.id, category.name, category.is_active, tuple(items_by_category.get(category.id, ())))
+        for category in Category.objects.order_by('id')
+    ]
+    return MenuCatalog(categories, version)
+
+
+def get_catalog():
+    """Return the current menu catalog, rebuilding it if missing or stale."""
+    global _catalog
+    catalog = _catalog
+    if catalog is None or catalog.is_stale():
+        with _lock:
+            catalog = _catalog
+            if catalog is None or catalog.is_stale():
+                catalog = _load_catalog()
+                _catalog = catalog
+    return catalog
+
+
+def _bump_version():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 1, None)
+
+
+def invalidate_menu_catalog():
+    """Drop the local catalog now and bump the shared version on commit.
+
+    Bumping only after commit keeps other workers from rebuilding from
+    rows the writing transaction has not committed yet.
+    """
+    global _catalog
+    _catalog = None
+
+    def _drop():
+        global _catalog
+        _catalog = None
+        _bump_version()
+
+    transaction.on_commit(_drop)
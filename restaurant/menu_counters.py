@@ -0,0 +1,97 @@
+"""
+Running `MenuItem.order_count`: the number of archived orders containing each item.
+
+Archival code (`Order.move_to_history`, order cancellation) writes the
+history item rows with `bulk_create` and then calls `record_archived_items`
+with them, since bulk inserts send no signals. Each item is counted once per
+order, and the increments are applied with `F()` expressions, one UPDATE per
+distinct increment, so concurrent archivals never overwrite each other.
+
+`find_drift` / `repair` recompute the counts from history (live rows plus
+months moved to the cold archive); they back the `reconcile_menu_counters`
+management command.
+"""
+
+from collections import Counter, defaultdict
+
+from django.db.models import Count, F
+
+from . import history_archive
+from .models import MenuItem, OrderHistoryItem
+
+
+def record_archived_items(history_items):
+    """Add one to `order_count` per (order, item) among `history_items`.
+
+    Returns the number of (order, item) pairs counted.
+    """
+    pairs = {(row.order_history_id, row.item_id) for row in history_items if row.item_id is not None}
+    increments = Counter(item_id for _, item_id in pairs)
+    items_by_increment = defaultdict(list)
+    for item_id, amount in increments.items():
+        items_by_increment[amount].append(item_id)
+    for amount, item_ids in items_by_increment.items():
+        MenuItem.objects.filter(pk__in=item_ids).update(order_count=F('order_count') + amount)
+    return len(pairs)
+
+
+def copy_order_items(order, order_history):
+    """Copy an order's item lines into `order_history` with one INSERT and count them."""
+    rows = OrderHistoryItem.objects.bulk_create([
+        OrderHistoryItem(
+            order_history=order_history,
+            item_id=order_item.item_id,
+            quantity=order_item.quantity,
+            price=order_item.price,
+        )
+        for order_item in order.items.all()
+    ])
+    record_archived_items(rows)
+    return rows
+
+
+def expected_counts(include_archive=True):
+    """{item_id: number of distinct history orders containing it}."""
+    counts = Counter(dict(
+        OrderHistoryItem.objects.order_by().values('item_id')
+        .annotate(orders=Count('order_history_id', distinct=True))
+        .values_list('item_id', 'orders')
+    ))
+    if include_archive:
+        for month in history_archive.archived_months():
+            # An order belongs to exactly one month, so distinct counts simply add up
+            pairs = {
+                (line['order_history_id'], line['item_id'])
+                for line in history_archive.iter_archived_rows(month, 'items')
+            }
+            counts.update(item_id for _, item_id in pairs)
+    return counts
+
+
+def find_drift(include_archive=True):
+    """Return menu items whose stored `order_count` differs from history.
+
+    Each result is a dict with `pk`, `name`, `order_count` and
+    `expected_order_count`.
+    """
+    expected = expected_counts(include_archive)
+    return [
+        {'pk': pk, 'name': name, 'order_count': stored, 'expected_order_count': expected.get(pk, 0)}
+        for pk, name, stored in MenuItem.objects.order_by('pk').values_list('pk', 'name', 'order_count')
+        if stored != expected.get(pk, 0)
+    ]
+
+
+def repair(drifted, batch_size=500):
+    """Store the expected counts of `drifted` (from find_drift), one UPDATE per value and batch.
+
+    Returns the number of rows updated.
+    """
+    items_by_count = defaultdict(list)
+    for row in drifted:
+        items_by_count[row['expected_order_count']].append(row['pk'])
+    updated = 0
+    for count, pks in items_by_count.items():
+        for start in range(0, len(pks), batch_size):
+            updated += MenuItem.objects.filter(pk__in=pks[start:start + batch_size]).update(order_count=count)
+    return updated
@@ -0,0 +1,249 @@
+"""
+Precomputed popularity ranking of menu items.
+
+`refresh_rankings` rebuilds the `MenuItemRank` table in a few aggregate
+queries: rank overall, within the item's category and within its demand
+tier (by `order_count`), plus a recent-velocity score (quantity sold over
+the last `VELOCITY_WINDOW_DAYS`, halved every `VELOCITY_HALF_LIFE_DAYS`).
+It runs after tiering (`cluster_menu_items`, the dashboard's "apply"), on
+the first read after orders were archived (at most once per
+`MENU_RANKING_REFRESH_INTERVAL` seconds) and from
+`manage.py refresh_menu_ranking`.
+
+Readers use `get_ranking()`, an in-process snapshot with the lists already
+sorted, so order entry screens and the dashboard never sort in SQL.
+"""
+
+import json
+import math
+import threading
+import time
+from collections import defaultdict, namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import MenuItem, MenuItemRank, OrderHistoryItem
+
+DEFAULT_TTL = 300
+DEFAULT_REFRESH_INTERVAL = 60
+VELOCITY_WINDOW_DAYS = 28
+VELOCITY_HALF_LIFE_DAYS = 7
+TIERS = ('high', 'medium', 'low')
+
+VERSION_KEY = 'restaurant:menu_ranking:version'
+REFRESH_GUARD_KEY = 'restaurant:menu_ranking:refreshed'
+DIRTY_KEY = 'restaurant:menu_ranking:dirty'
+
+RankEntry = namedtuple('RankEntry', [
+    'item_id', 'overall_rank', 'category_rank', 'tier_rank', 'velocity', 'velocity_rank',
+    'order_count', 'total_quantity', 'demand_tier',
+])
+
+_lock = threading.Lock()
+_ranking = None
+
+
+def _version():
+    return cache.get(VERSION_KEY, 0)
+
+
+def _bump_version():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 1, None)
+
+
+def _ranks(entries, key):
+    """{item_id: 1-based position} after sorting `entries` by `key`."""
+    return {entry['item_id']: position for position, entry in enumerate(sorted(entries, key=key), 1)}
+
+
+def _velocities(now):
+    since = now - timedelta(days=VELOCITY_WINDOW_DAYS)
+    daily = (
+        OrderHistoryItem.objects
+        .filter(order_history__created_at__gte=since)
+        .exclude(order_history__status='cancelled')
+        .annotate(day=TruncDate('order_history__created_at'))
+        .values('item_id', 'day')
+        .annotate(sold=Sum('quantity'))
+    )
+    today = timezone.localdate(now)
+    velocities = defaultdict(float)
+    for row in daily:
+        age = max(0, (today - row['day']).days)
+        velocities[row['item_id']] += (row['sold'] or 0) * math.pow(0.5, age / VELOCITY_HALF_LIFE_DAYS)
+    return velocities
+
+
+def refresh_rankings():
+    """Rebuild MenuItemRank from MenuItem counters and recent history. Returns the row count."""
+    now = timezone.now()
+    quantities = dict(
+        OrderHistoryItem.objects.values('item_id').annotate(total=Sum('quantity')).values_list('item_id', 'total')
+    )
+    velocities = _velocities(now)
+    entries = [
+        {
+            'item_id': item_id,
+            'name': name,
+            'category_id': category_id,
+            'demand_tier': demand_tier,
+            'order_count': order_count,
+            'velocity': round(velocities.get(item_id, 0.0), 4),
+        }
+        for item_id, name, category_id, demand_tier, order_count in
+        MenuItem.objects.values_list('id', 'name', 'category_id', 'demand_tier', 'order_count')
+    ]
+
+    def by_popularity(entry):
+        return (-entry['order_count'], -entry['velocity'], entry['name'], entry['item_id'])
+
+    overall = _ranks(entries, by_popularity)
+    by_velocity = _ranks(entries, lambda e: (-e['velocity'], -e['order_count'], e['name'], e['item_id']))
+    category_ranks, tier_ranks = {}, {}
+    groups = defaultdict(list)
+    tiers = defaultdict(list)
+    for entry in entries:
+        groups[entry['category_id']].append(entry)
+        tiers[entry['demand_tier']].append(entry)
+    for members in groups.values():
+        category_ranks.update(_ranks(members, by_popularity))
+    for members in tiers.values():
+        tier_ranks.update(_ranks(members, by_popularity))
+
+    rows = [
+        MenuItemRank(
+            item_id=entry['item_id'],
+            overall_rank=overall[entry['item_id']],
+            category_rank=category_ranks[entry['item_id']],
+            tier_rank=tier_ranks[entry['item_id']],
+            velocity=entry['velocity'],
+            velocity_rank=by_velocity[entry['item_id']],
+            order_count=entry['order_count'],
+            total_quantity=quantities.get(entry['item_id']) or 0,
+            demand_tier=entry['demand_tier'],
+            refreshed_at=now,
+        )
+        for entry in entries
+    ]
+    with transaction.atomic():
+        MenuItemRank.objects.all().delete()
+        MenuItemRank.objects.bulk_create(rows)
+        invalidate_menu_ranking()
+    return len(rows)
+
+
+def mark_dirty():
+    """Note that history changed; the next reader refreshes (see refresh_if_due)."""
+    cache.set(DIRTY_KEY, True, None)
+
+
+def refresh_if_due():
+    """Refresh if history changed and no refresh ran in the last MENU_RANKING_REFRESH_INTERVAL seconds.
+
+    A burst of archived orders therefore costs one refresh, not one each.
+    """
+    if not cache.get(DIRTY_KEY):
+        return False
+    interval = getattr(settings, 'MENU_RANKING_REFRESH_INTERVAL', DEFAULT_REFRESH_INTERVAL)
+    if not cache.add(REFRESH_GUARD_KEY, True, interval):
+        return False
+    cache.delete(DIRTY_KEY)
+    refresh_rankings()
+    return True
+
+
+class MenuRanking:
+    """Immutable snapshot of MenuItemRank with pre-sorted lists."""
+
+    def __init__(self, entries, version):
+        self.by_item = {entry.item_id: entry for entry in entries}
+        self.overall = sorted(entries, key=lambda entry: entry.overall_rank)
+        self.by_tier = {tier: [] for tier in TIERS}
+        for entry in sorted(entries, key=lambda entry: entry.tier_rank):
+            self.by_tier.setdefault(entry.demand_tier, []).append(entry)
+        self.trending = sorted(entries, key=lambda entry: entry.velocity_rank)
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self._order_json = {}
+
+    def is_stale(self):
+        ttl = getattr(settings, 'MENU_RANKING_TTL', DEFAULT_TTL)
+        if ttl is not None and time.monotonic() - self.loaded_at > ttl:
+            return True
+        return _version() != self.version
+
+    def sort_key(self, item_id):
+        entry = self.by_item.get(item_id)
+        # Items without a rank yet (added since the last refresh) go last
+        return entry.overall_rank if entry else len(self.by_item) + 1
+
+    def top(self, tier, limit, available_ids=None):
+        """Best-ranked entries of a demand tier, optionally only among `available_ids`."""
+        result = []
+        for entry in self.by_tier.get(tier, ()):
+            if available_ids is None or entry.item_id in available_ids:
+                result.append(entry)
+                if len(result) == limit:
+                    break
+        return result
+
+    def order_items_json(self, catalog):
+        """The catalog's order-entry JSON with the most popular items first."""
+        key = catalog.etag
+        cached = self._order_json.get(key)
+        if cached is None:
+            items = json.loads(catalog.order_items_json)
+            items.sort(key=lambda item: self.sort_key(item['id']))  # stable: ties keep catalog order
+            for item in items:
+                entry = self.by_item.get(item['id'])
+                item['rank'] = entry.overall_rank if entry else None
+            cached = json.dumps(items)
+            self._order_json = {key: cached}
+        return cached
+
+
+def _load_ranking():
+    version = _version()
+    rows = list(MenuItemRank.objects.values_list(*RankEntry._fields))
+    if not rows and MenuItem.objects.exists():
+        # First use: build the index once instead of serving everything unranked
+        refresh_rankings()
+        version = _version()
+        rows = list(MenuItemRank.objects.values_list(*RankEntry._fields))
+    return MenuRanking([RankEntry(*row) for row in rows], version)
+
+
+def get_ranking():
+    """Return the current ranking snapshot, reloading it if missing or stale."""
+    global _ranking
+    refresh_if_due()
+    ranking = _ranking
+    if ranking is None or ranking.is_stale():
+        with _lock:
+            ranking = _ranking
+            if ranking is None or ranking.is_stale():
+                ranking = _load_ranking()
+                _ranking = ranking
+    return ranking
+
+
+def invalidate_menu_ranking():
+    """Drop the local ranking now and bump the shared version on commit."""
+    global _ranking
+    _ranking = None
+
+    def _drop():
+        global _ranking
+        _ranking = None
+        _bump_version()
+
+    transaction.on_commit(_drop)
@@ -1,17 +1,91 @@
+import asyncio
+import re
+from functools import lru_cache
+
+from asgiref.sync import sync_to_async
 from django.utils import timezone
 from django.conf import settings
-from zoneinfo import ZoneInfo
+from django.utils.deprecation import MiddlewareMixin
+from whitenoise.middleware import WhiteNoiseMiddleware
+from zoneinfo import ZoneInfo, available_timezones
+
+try:
+    from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+except ImportError:  # asgiref < 3.6, as Django 3.2 allows
+    from asyncio import iscoroutinefunction
+
+    def markcoroutinefunction(func):
+        # What Django 3.2's MiddlewareMixin does for its async instances
+        func._is_coroutine = asyncio.coroutines._is_coroutine
+        return func
+
+
+# IANA zone names are short ASCII paths like "Asia/Kathmandu" or "Etc/GMT+5".
+# Anything else coming from the cookie is rejected before touching tzdata.
+TIMEZONE_NAME_MAX_LENGTH = 64
+TIMEZONE_CACHE_SIZE = 128
+_TIMEZONE_NAME_RE = re.compile(r'^[A-Za-z0-9_+\-]+(/[A-Za-z0-9_+\-]+)*$')
+
+
+def is_plausible_timezone_name(tzname):
+    """Cheap syntactic check for a timezone name (no filesystem access)."""
+    if not tzname or len(tzname) > TIMEZONE_NAME_MAX_LENGTH:
+        return False
+    return _TIMEZONE_NAME_RE.match(tzname) is not None
+
+
+@lru_cache(maxsize=None)
+def known_timezone_names():
+    """Names of every zone in the installed tzdata, scanned once per process."""
+    try:
+        return frozenset(available_timezones())
+    except Exception:
+        return frozenset()
 
 
-class TimezoneMiddleware:
+@lru_cache(maxsize=TIMEZONE_CACHE_SIZE)
+def get_zoneinfo(tzname):
+    """Return a cached ZoneInfo for an already validated `tzname`, or None."""
+    try:
+        return ZoneInfo(tzname)
+    except Exception:
+        return None
+
+
+def resolve_timezone(tzname):
+    """Return a ZoneInfo for `tzname`, or None if the name is not a known zone.
+
+    Unknown names are rejected against the tzdata listing before the LRU is
+    consulted, so cookie churn never evicts real zones or reads tzdata files.
+    """
+    if not is_plausible_timezone_name(tzname):
+        return None
+    known = known_timezone_names()
+    # An empty set means tzdata could not be listed; let ZoneInfo decide then
+    if known and tzname not in known:
+        return None
+    return get_zoneinfo(tzname)
+
+
+class TimezoneMiddleware(MiddlewareMixin):
     """Activate timezone per request based on a cookie or authenticated user preference.
 
     Priority: user.profile timezone (if present) > cookie `user_timezone` > default
     """
     def __init__(self, get_response):
-        self.get_response = get_response
+        super().__init__(get_response)
+        self._default = (None, None)
 
-    def __call__(self, request):
+    def _default_zone(self):
+        # Remember the resolved project zone; re-resolve only if TIME_ZONE changes
+        tzname, zone = self._default
+        if tzname != settings.TIME_ZONE:
+            tzname = settings.TIME_ZONE
+            zone = resolve_timezone(tzname)
+            self._default = (tzname, zone)
+        return tzname, zone
+
+    def process_request(self, request):
         tzname = None
 
         # If authenticated user has a timezone attribute (optional), prefer it
@@ -23,27 +97,22 @@ class TimezoneMiddleware:
         if not tzname:
             tzname = request.COOKIES.get('user_timezone')
 
-        if tzname:
-            try:
-                timezone.activate(ZoneInfo(tzname))
-            except Exception:
-                # invalid tzname -> fall back to project TIME_ZONE
-                try:
-                    timezone.activate(ZoneInfo(settings.TIME_ZONE))
-                except Exception:
-                    timezone.deactivate()
-        else:
-            # no tz provided -> activate project default timezone
-            try:
-                timezone.activate(ZoneInfo(settings.TIME_ZONE))
-            except Exception:
-                timezone.deactivate()
+        default_tzname, default_zone = self._default_zone()
+        zone = None
+        # Fast path: the cookie names the project default, skip the lookup
+        if tzname and tzname != default_tzname:
+            zone = resolve_timezone(tzname)
+        if zone is None:
+            # no tz provided or invalid tzname -> project TIME_ZONE
+            zone = default_zone
 
-        response = self.get_response(request)
-        return response
+        if zone is not None:
+            timezone.activate(zone)
+        else:
+            timezone.deactivate()
 
 
-class LoginRequiredMiddleware:
+class LoginRequiredMiddleware(MiddlewareMixin):
     """Redirect unauthenticated users to the login page for protected views.
 
     Behavior:
@@ -52,10 +121,7 @@ class LoginRequiredMiddleware:
       a `next` parameter.
     - If the request is an AJAX request, return a 401 JSON response instead of redirecting.
     """
-    def __init__(self, get_response):
-        self.get_response = get_response
-
-    def __call__(self, request):
+    def process_request(self, request):
         from django.conf import settings
         from django.http import JsonResponse
 
@@ -69,6 +135,8 @@ class LoginRequiredMiddleware:
             'admin',
             (getattr(settings, 'STATIC_URL', '') or '').lstrip('/'),
             (getattr(settings, 'MEDIA_URL', '') or '').lstrip('/'),
+            # Public menu for diners (table QR codes)
+            'menu/public',
         ]
 
         # Normalize empty strings
@@ -80,9 +148,11 @@ class LoginRequiredMiddleware:
                     return True
             return False
 
-        # If not authenticated and not an allowed path, block/redirect
-        if not getattr(request, 'user', None) or not request.user.is_authenticated:
-            if not is_allowed(path):
+        # If not authenticated and not an allowed path, block/redirect.
+        # The path is checked first so public pages never load the session
+        # (which would add `Vary: Cookie` and defeat shared caches).
+        if not is_allowed(path):
+            if not getattr(request, 'user', None) or not request.user.is_authenticated:
                 # AJAX/XHR requests should get JSON 401
                 is_xhr = request.headers.get('x-requested-with') == 'XMLHttpRequest' or 'application/json' in (request.headers.get('accept') or '')
                 if is_xhr:
@@ -91,29 +161,81 @@ class LoginRequiredMiddleware:
                 return_url = f"{login_url}?next={request.path}"
                 from django.shortcuts import redirect
                 return redirect(return_url)
+        return None
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    """WhiteNoise that also runs natively under ASGI.
+
+    WhiteNoise's middleware is sync-only. Django would then run it, and the
+    rest of every request beneath it, on the one thread it keeps for sync
+    code, so async views could never overlap. Here static files are looked up
+    in WhiteNoise's in-memory table and everything else is awaited directly.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        if iscoroutinefunction(get_response):
+            # Let Django see this instance as async (as MiddlewareMixin does)
+            markcoroutinefunction(self)
 
-        return self.get_response(request)
+    def __call__(self, request):
+        if iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            # Development only: looks for the file on disk
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve, thread_sensitive=False)(static_file, request)
+        return await self.get_response(request)
 
-class DatabaseHealthMiddleware:
+
+class DatabaseHealthMiddleware(MiddlewareMixin):
     """Handle database connection errors gracefully.
     
     Catches database connection errors and provides a user-friendly error page
     instead of a 500 error, helping with debugging connectivity issues.
     """
-    def __init__(self, get_response):
-        self.get_response = get_response
+    DB_ERROR_KEYWORDS = (
+        'could not translate host name', 'name or service not known',
+        'connection refused', 'connection timeout',
+        'server closed the connection',
+    )
 
     def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
         try:
             return self.get_response(request)
         except Exception as e:
-            # Check if it's a database connectivity error
-            error_str = str(e).lower()
-            if any(keyword in error_str for keyword in ['could not translate host name', 'name or service not known', 
-                                                         'connection refused', 'connection timeout', 
-                                                         'server closed the connection']):
-                return self.handle_db_error(request, e)
-            raise
+            response = self.db_error_response(request, e)
+            if response is None:
+                raise
+            return response
+
+    async def __acall__(self, request):
+        try:
+            return await self.get_response(request)
+        except Exception as e:
+            response = self.db_error_response(request, e)
+            if response is None:
+                raise
+            return response
+
+    def db_error_response(self, request, exception):
+        """Error page for a database connectivity error, or None for any other exception."""
+        # Check if it's a database connectivity error
+        error_str = str(exception).lower()
+        if any(keyword in error_str for keyword in self.DB_ERROR_KEYWORDS):
+            return self.handle_db_error(request, exception)
+        return None
 
     def handle_db_error(self, request, exception):
         """Handle database connectivity errors"""
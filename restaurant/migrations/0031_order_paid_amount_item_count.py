@@ -0,0 +1,45 @@
+# Generated by Django 3.2.25 on 2026-10-19 02:29
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_order_totals(apps, schema_editor):
+    Order = apps.get_model('restaurant', 'Order')
+    Payment = apps.get_model('restaurant', 'Payment')
+    OrderItem = apps.get_model('restaurant', 'OrderItem')
+    money = DecimalField(max_digits=12, decimal_places=2)
+    paid = Payment.objects.filter(order=OuterRef('pk')).order_by().values('order').annotate(
+        total=Sum('amount')
+    ).values('total')
+    items = OrderItem.objects.filter(order=OuterRef('pk')).order_by().values('order').annotate(
+        total=Count('id')
+    ).values('total')
+    Order.objects.update(
+        paid_amount=Coalesce(Subquery(paid, output_field=money), Value(Decimal('0')), output_field=money),
+        item_count=Coalesce(Subquery(items, output_field=models.IntegerField()), Value(0)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant', '0030_alter_orderhistory_payment_method_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0, help_text='Number of item lines on this order'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='paid_amount',
+            field=models.DecimalField(decimal_places=2, default=0, help_text='Sum of all payments recorded against this order', max_digits=10),
+        ),
+        migrations.RunPython(backfill_order_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 3.2.25 on 2026-10-19 02:32
+
+from django.db import migrations, models
+
+# Django renders `icontains` on Postgres as `UPPER(col::text) LIKE UPPER(%s)`,
+# so the trigram indexes are built on that same expression.
+TRIGRAM_COLUMNS = (
+    ('orderhist_order_id_trgm', 'order_id'),
+    ('orderhist_customer_trgm', 'customer_name'),
+    ('orderhist_phone_trgm', 'customer_phone'),
+)
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, column in TRIGRAM_COLUMNS:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON restaurant_orderhistory '
+            f'USING gin ((UPPER({column}::text)) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _ in TRIGRAM_COLUMNS:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant', '0031_order_paid_amount_item_count'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='orderhistory',
+            index=models.Index(fields=['created_at'], name='orderhist_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orderhistory',
+            index=models.Index(fields=['order_type', 'created_at'], name='orderhist_type_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orderhistory',
+            index=models.Index(fields=['status', 'created_at'], name='orderhist_status_created_idx'),
+        ),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
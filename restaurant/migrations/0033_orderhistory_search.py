@@ -0,0 +1,101 @@
+# Search structures for restaurant.history_search. They live outside the
+# Django model (generated columns on Postgres, an FTS5 table plus triggers
+# on SQLite), so every insert path keeps them current, bulk_create included.
+
+from django.db import migrations
+
+FTS_TABLE = 'restaurant_orderhistory_fts'
+# FTS5's trigram tokenizer first shipped in SQLite 3.34
+SQLITE_TRIGRAM_VERSION = (3, 34)
+
+POSTGRES_FORWARDS = [
+    "ALTER TABLE restaurant_orderhistory ADD COLUMN IF NOT EXISTS phone_digits text "
+    "GENERATED ALWAYS AS (regexp_replace(coalesce(customer_phone, ''), '[^0-9]', '', 'g')) STORED",
+    "ALTER TABLE restaurant_orderhistory ADD COLUMN IF NOT EXISTS search_vector tsvector "
+    "GENERATED ALWAYS AS (to_tsvector('simple'::regconfig, "
+    "coalesce(order_id, '') || ' ' || coalesce(customer_name, '') || ' ' || "
+    "regexp_replace(coalesce(customer_phone, ''), '[^0-9]', '', 'g'))) STORED",
+    "CREATE INDEX IF NOT EXISTS orderhist_search_vector_idx ON restaurant_orderhistory USING gin (search_vector)",
+    "CREATE INDEX IF NOT EXISTS orderhist_order_id_prefix_idx ON restaurant_orderhistory (order_id varchar_pattern_ops)",
+    "CREATE INDEX IF NOT EXISTS orderhist_phone_digits_trgm ON restaurant_orderhistory USING gin (phone_digits gin_trgm_ops)",
+]
+
+POSTGRES_BACKWARDS = [
+    "DROP INDEX IF EXISTS orderhist_phone_digits_trgm",
+    "DROP INDEX IF EXISTS orderhist_order_id_prefix_idx",
+    "DROP INDEX IF EXISTS orderhist_search_vector_idx",
+    "ALTER TABLE restaurant_orderhistory DROP COLUMN IF EXISTS search_vector",
+    "ALTER TABLE restaurant_orderhistory DROP COLUMN IF EXISTS phone_digits",
+]
+
+
+def _sqlite_digits(column):
+    # SQLite has no regexp_replace; strip the punctuation phone numbers use
+    expression = f"coalesce({column}, '')"
+    for char in (' ', '-', '+', '(', ')', '.', '/'):
+        expression = f"replace({expression}, '{char}', '')"
+    return expression
+
+
+SQLITE_FORWARDS = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+    f"USING fts5(order_id, customer_name, phone_digits, tokenize='trigram')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON restaurant_orderhistory BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, order_id, customer_name, phone_digits) "
+    f"VALUES (new.id, new.order_id, new.customer_name, {_sqlite_digits('new.customer_phone')}); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON restaurant_orderhistory BEGIN "
+    f"DELETE FROM {FTS_TABLE} WHERE rowid = old.id; END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF order_id, customer_name, customer_phone "
+    f"ON restaurant_orderhistory BEGIN "
+    f"DELETE FROM {FTS_TABLE} WHERE rowid = old.id; "
+    f"INSERT INTO {FTS_TABLE}(rowid, order_id, customer_name, phone_digits) "
+    f"VALUES (new.id, new.order_id, new.customer_name, {_sqlite_digits('new.customer_phone')}); END",
+    f"INSERT INTO {FTS_TABLE}(rowid, order_id, customer_name, phone_digits) "
+    f"SELECT id, order_id, customer_name, {_sqlite_digits('customer_phone')} FROM restaurant_orderhistory",
+]
+
+SQLITE_BACKWARDS = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+
+def _run(schema_editor, statements):
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        _run(schema_editor, POSTGRES_FORWARDS)
+    elif vendor == 'sqlite':
+        if schema_editor.connection.Database.sqlite_version_info < SQLITE_TRIGRAM_VERSION:
+            # history_search falls back to icontains without the FTS table
+            return
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+            if not cursor.fetchone()[0]:
+                return
+        _run(schema_editor, SQLITE_FORWARDS)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        _run(schema_editor, POSTGRES_BACKWARDS)
+    elif vendor == 'sqlite':
+        _run(schema_editor, SQLITE_BACKWARDS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant', '0032_orderhistory_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,154 @@
+# Generated by Django 3.2.25 on 2026-10-19 02:40
+
+from datetime import date, datetime, time
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+# The helpers below are frozen copies of restaurant.history_partitions as of
+# this migration, so later changes to that module cannot change what it does.
+TABLE = 'restaurant_orderhistory'
+DEFAULT_PARTITION = f'{TABLE}_default'
+
+# Partitions are created ahead of time so new history rows land in their own
+# month rather than DEFAULT (archive_order_history keeps this window filled).
+MONTHS_AHEAD = 3
+
+
+def month_start(value):
+    """First day of the month containing `value` (a date or datetime)."""
+    if isinstance(value, datetime):
+        if django.utils.timezone.is_aware(value):
+            value = django.utils.timezone.localtime(value, django.utils.timezone.get_default_timezone())
+        value = value.date()
+    return date(value.year, value.month, 1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_bounds(month):
+    """Aware [start, end) datetimes of `month` in the default timezone."""
+    tz = django.utils.timezone.get_default_timezone()
+    start = django.utils.timezone.make_aware(datetime.combine(month, time.min), tz)
+    end = django.utils.timezone.make_aware(datetime.combine(add_months(month, 1), time.min), tz)
+    return start, end
+
+
+def partition_name(month):
+    return f'{TABLE}_p{month:%Y%m}'
+
+
+def insert_columns(apps):
+    """Columns to copy between tables (the historical model's concrete fields)."""
+    OrderHistory = apps.get_model('restaurant', 'OrderHistory')
+    return [field.column for field in OrderHistory._meta.concrete_fields]
+
+
+def _rebuild_history_table(apps, schema_editor, partitioned):
+    """Recreate restaurant_orderhistory (partitioned or plain) and copy its rows over.
+
+    Indexes and outgoing foreign keys are read from the catalog first and
+    recreated afterwards, so the result carries every index added by earlier
+    migrations (including the Postgres-only search ones).
+    """
+    old = f'{TABLE}_old'
+    columns = ', '.join(insert_columns(apps))
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT indexname, indexdef FROM pg_indexes WHERE schemaname = current_schema() AND tablename = %s",
+            [TABLE],
+        )
+        indexes = cursor.fetchall()
+        cursor.execute(
+            "SELECT conname, contype, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = to_regclass(%s) AND contype IN ('p', 'f')",
+            [TABLE],
+        )
+        constraints = cursor.fetchall()
+        primary_keys = {name for name, kind, _ in constraints if kind == 'p'}
+
+        months = []
+        if partitioned:
+            cursor.execute(f"SELECT min(created_at) FROM {TABLE}")
+            oldest = cursor.fetchone()[0]
+            current = month_start(django.utils.timezone.now())
+            month = month_start(oldest) if oldest else current
+            while month <= add_months(current, MONTHS_AHEAD):
+                months.append(month)
+                month = add_months(month, 1)
+
+        cursor.execute(f"ALTER TABLE {TABLE} RENAME TO {old}")
+        cursor.execute(
+            f"CREATE TABLE {TABLE} (LIKE {old} INCLUDING DEFAULTS INCLUDING GENERATED "
+            f"INCLUDING IDENTITY INCLUDING CONSTRAINTS)"
+            + (" PARTITION BY RANGE (created_at)" if partitioned else "")
+        )
+        for month in months:
+            start, end = month_bounds(month)
+            cursor.execute(
+                f"CREATE TABLE {partition_name(month)} PARTITION OF {TABLE} FOR VALUES FROM (%s) TO (%s)",
+                [start, end],
+            )
+        if partitioned:
+            cursor.execute(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {TABLE} DEFAULT")
+
+        cursor.execute(f"INSERT INTO {TABLE} ({columns}) SELECT {columns} FROM {old}")
+
+        # Keep the id sequence alive when the old table is dropped
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [old])
+        sequence = cursor.fetchone()[0]
+        if sequence:
+            cursor.execute(f"ALTER SEQUENCE {sequence} OWNED BY {TABLE}.id")
+        cursor.execute(f"DROP TABLE {old}")
+
+        # A primary key on a partitioned table must include the partition key
+        pk_columns = 'id, created_at' if partitioned else 'id'
+        cursor.execute(f"ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_pkey PRIMARY KEY ({pk_columns})")
+        for name, kind, definition in constraints:
+            if kind == 'f':
+                cursor.execute(f"ALTER TABLE {TABLE} ADD CONSTRAINT {name} {definition}")
+        for name, definition in indexes:
+            if name not in primary_keys:
+                cursor.execute(definition.replace(' ON ONLY ', ' ON '))
+
+
+def partition_order_history(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    _rebuild_history_table(apps, schema_editor, partitioned=True)
+
+
+def unpartition_order_history(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    _rebuild_history_table(apps, schema_editor, partitioned=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant', '0033_orderhistory_search'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='orderhistoryitem',
+            name='order_history',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='items', to='restaurant.orderhistory'),
+        ),
+        migrations.AlterField(
+            model_name='orderhistorypayment',
+            name='order_history',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='payments', to='restaurant.orderhistory'),
+        ),
+        migrations.AlterField(
+            model_name='orderhistorystatus',
+            name='order_history',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='status_logs', to='restaurant.orderhistory'),
+        ),
+        migrations.RunPython(partition_order_history, unpartition_order_history),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.2.25 on 2026-10-19 02:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant', '0034_partition_order_history'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MenuItemRank',
+            fields=[
+                ('item', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rank', serialize=False, to='restaurant.menuitem')),
+                ('overall_rank', models.PositiveIntegerField()),
+                ('category_rank', models.PositiveIntegerField()),
+                ('tier_rank', models.PositiveIntegerField(help_text="Rank within the item's demand tier")),
+                ('velocity', models.FloatField(default=0, help_text='Recent sales, decayed by age')),
+                ('velocity_rank', models.PositiveIntegerField()),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('total_quantity', models.PositiveIntegerField(default=0)),
+                ('demand_tier', models.CharField(max_length=10)),
+                ('refreshed_at', models.DateTimeField()),
+            ],
+        ),
+    ]
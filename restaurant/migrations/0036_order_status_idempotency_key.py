@@ -0,0 +1,27 @@
+# Generated by Django 3.2.25 on 2026-10-19 03:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant', '0035_menuitemrank'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderhistorystatus',
+            name='idempotency_key',
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='orderstatuslog',
+            name='idempotency_key',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='orderstatuslog',
+            constraint=models.UniqueConstraint(fields=('order', 'idempotency_key'), name='orderstatuslog_order_idempotency_key'),
+        ),
+    ]
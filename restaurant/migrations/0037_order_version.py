@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-19 03:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant', '0036_order_status_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='version',
+            field=models.PositiveIntegerField(default=0, help_text='Status version; clients send it back to detect stale updates'),
+        ),
+    ]
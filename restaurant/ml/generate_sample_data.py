@@ -1,6 +1,9 @@
 """
 Generate sample orders for testing ML forecasting.
 Run: python manage.py shell < restaurant/ml/generate_sample_data.py
+
+For large, realistic datasets (history, seasonality, popularity skew) use
+`python manage.py seed_restaurant` instead.
 """
 
 import os
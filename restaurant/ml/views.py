@@ -1,16 +1,21 @@
 """
 Views and API endpoints for ML forecasting.
+
+The API views are async: the series are read from the database through
+sync_to_async, and model fitting (CPU-bound, no database access) runs in a
+worker thread, so under ASGI a fit does not stall other requests.
 """
 
+from asgiref.sync import sync_to_async
 from django.shortcuts import render
-from django.http import JsonResponse
-from django.views.decorators.http import require_http_methods
-from django.contrib.auth.decorators import login_required
+from django.http import HttpResponseNotAllowed, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 import json
 import logging
 from datetime import datetime
 
+from accounts.decorators import login_required
+
 from restaurant.ml import (
     ARIMAForecast,
     auto_arima_fit,
@@ -36,8 +41,7 @@ def forecast_dashboard(request):
 
 
 @login_required
-@require_http_methods(["POST"])
-def generate_forecast(request):
+async def generate_forecast(request):
     """
     API endpoint to generate forecast.
     
@@ -51,6 +55,8 @@ def generate_forecast(request):
         'days_back': 90
     }
     """
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
     try:
         data = json.loads(request.body)
         
@@ -62,7 +68,7 @@ def generate_forecast(request):
         days_back = int(data.get('days_back', 90))
         
         # Get time series data
-        ts_data = get_order_timeseries(
+        ts_data = await sync_to_async(get_order_timeseries)(
             aggregation=aggregation,
             metric=metric,
             order_type=order_type,
@@ -81,23 +87,33 @@ def generate_forecast(request):
                 'error': msg,
             }, status=400)
         
-        # Fit model
-        if use_auto_arima:
-            try:
-                model = auto_arima_fit(ts_data, name=f'forecast_{metric}_{order_type}')
-                if model is None:
-                    logger.warning("auto_arima returned None, falling back to regular ARIMA")
-                    # Fall back to regular ARIMA
-                    model = ARIMAForecast(name=f'forecast_{metric}_{order_type}')
-                    fit_result = model.fit(ts_data)
-                    if not fit_result['success']:
-                        return JsonResponse({
-                            'success': False,
-                            'error': f'Model fitting failed: {fit_result.get("error", "Unknown error")}',
-                        }, status=500)
-            except Exception as e:
-                logger.warning(f"auto_arima failed with error: {e}, falling back to regular ARIMA")
-                # Fall back to regular ARIMA on any error
+        return await sync_to_async(_fit_forecast, thread_sensitive=False)(
+            ts_data, metric, order_type, periods, use_auto_arima
+        )
+    
+    except json.JSONDecodeError:
+        return JsonResponse({
+            'success': False,
+            'error': 'Invalid JSON',
+        }, status=400)
+    
+    except Exception as e:
+        logger.error(f"Error in generate_forecast: {e}", exc_info=True)
+        return JsonResponse({
+            'success': False,
+            'error': str(e),
+        }, status=500)
+
+
+def _fit_forecast(ts_data, metric, order_type, periods, use_auto_arima):
+    """Fit a model to `ts_data` and return the generate_forecast response."""
+    # Fit model
+    if use_auto_arima:
+        try:
+            model = auto_arima_fit(ts_data, name=f'forecast_{metric}_{order_type}')
+            if model is None:
+                logger.warning("auto_arima returned None, falling back to regular ARIMA")
+                # Fall back to regular ARIMA
                 model = ARIMAForecast(name=f'forecast_{metric}_{order_type}')
                 fit_result = model.fit(ts_data)
                 if not fit_result['success']:
@@ -105,50 +121,46 @@ def generate_forecast(request):
                         'success': False,
                         'error': f'Model fitting failed: {fit_result.get("error", "Unknown error")}',
                     }, status=500)
-        else:
+        except Exception as e:
+            logger.warning(f"auto_arima failed with error: {e}, falling back to regular ARIMA")
+            # Fall back to regular ARIMA on any error
             model = ARIMAForecast(name=f'forecast_{metric}_{order_type}')
             fit_result = model.fit(ts_data)
             if not fit_result['success']:
                 return JsonResponse({
                     'success': False,
-                    'error': fit_result.get('error', 'Model fit failed'),
+                    'error': f'Model fitting failed: {fit_result.get("error", "Unknown error")}',
                 }, status=500)
-        
-        # Generate forecast
-        forecast_dict = model.forecast(periods=periods, include_conf_int=True)
-        
-        # Get diagnostics
-        diagnostics = model.get_diagnostics()
-        
-        # Calculate statistics
-        stats = get_forecast_statistics(forecast_dict)
-        
-        return JsonResponse({
-            'success': True,
-            'forecast': prepare_forecast_for_json(forecast_dict),
-            'diagnostics': diagnostics,
-            'statistics': stats,
-            'trained_at': model.last_trained.isoformat() if model.last_trained else None,
-            'data_points': len(ts_data),
-        })
+    else:
+        model = ARIMAForecast(name=f'forecast_{metric}_{order_type}')
+        fit_result = model.fit(ts_data)
+        if not fit_result['success']:
+            return JsonResponse({
+                'success': False,
+                'error': fit_result.get('error', 'Model fit failed'),
+            }, status=500)
     
-    except json.JSONDecodeError:
-        return JsonResponse({
-            'success': False,
-            'error': 'Invalid JSON',
-        }, status=400)
+    # Generate forecast
+    forecast_dict = model.forecast(periods=periods, include_conf_int=True)
     
-    except Exception as e:
-        logger.error(f"Error in generate_forecast: {e}", exc_info=True)
-        return JsonResponse({
-            'success': False,
-            'error': str(e),
-        }, status=500)
+    # Get diagnostics
+    diagnostics = model.get_diagnostics()
+    
+    # Calculate statistics
+    stats = get_forecast_statistics(forecast_dict)
+    
+    return JsonResponse({
+        'success': True,
+        'forecast': prepare_forecast_for_json(forecast_dict),
+        'diagnostics': diagnostics,
+        'statistics': stats,
+        'trained_at': model.last_trained.isoformat() if model.last_trained else None,
+        'data_points': len(ts_data),
+    })
 
 
 @login_required
-@require_http_methods(["POST"])
-def multi_forecast(request):
+async def multi_forecast(request):
     """
     Generate multiple forecasts (by order type, etc.).
     
@@ -160,6 +172,8 @@ def multi_forecast(request):
         'use_auto_arima': true
     }
     """
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
     try:
         data = json.loads(request.body)
         
@@ -169,42 +183,9 @@ def multi_forecast(request):
         use_auto_arima = data.get('use_auto_arima', True)
         
         # Get all time series
-        ts_dict = get_multi_series_forecast_data(aggregation=aggregation, days_back=days_back)
+        ts_dict = await sync_to_async(get_multi_series_forecast_data)(aggregation=aggregation, days_back=days_back)
         
-        results = {}
-        for name, ts_data in ts_dict.items():
-            is_valid, msg = validate_timeseries(ts_data)
-            
-            if not is_valid:
-                results[name] = {'success': False, 'error': msg}
-                continue
-            
-            try:
-                if use_auto_arima:
-                    model = auto_arima_fit(ts_data, name=f'multi_{name}')
-                    if model is None:
-                        results[name] = {'success': False, 'error': 'auto_arima failed'}
-                        continue
-                else:
-                    model = ARIMAForecast(name=f'multi_{name}')
-                    fit_result = model.fit(ts_data)
-                    if not fit_result['success']:
-                        results[name] = {'success': False, 'error': fit_result.get('error')}
-                        continue
-                
-                forecast = model.forecast(periods=periods, include_conf_int=True)
-                stats = get_forecast_statistics(forecast)
-                
-                results[name] = {
-                    'success': True,
-                    'forecast': prepare_forecast_for_json(forecast),
-                    'statistics': stats,
-                    'data_points': len(ts_data),
-                }
-            
-            except Exception as e:
-                logger.error(f"Error forecasting {name}: {e}")
-                results[name] = {'success': False, 'error': str(e)}
+        results = await sync_to_async(_fit_series, thread_sensitive=False)(ts_dict, periods, use_auto_arima)
         
         return JsonResponse({
             'success': True,
@@ -220,12 +201,52 @@ def multi_forecast(request):
         }, status=500)
 
 
+def _fit_series(ts_dict, periods, use_auto_arima):
+    """Fit and forecast each series of `ts_dict`; {name: result} for multi_forecast."""
+    results = {}
+    for name, ts_data in ts_dict.items():
+        is_valid, msg = validate_timeseries(ts_data)
+        
+        if not is_valid:
+            results[name] = {'success': False, 'error': msg}
+            continue
+        
+        try:
+            if use_auto_arima:
+                model = auto_arima_fit(ts_data, name=f'multi_{name}')
+                if model is None:
+                    results[name] = {'success': False, 'error': 'auto_arima failed'}
+                    continue
+            else:
+                model = ARIMAForecast(name=f'multi_{name}')
+                fit_result = model.fit(ts_data)
+                if not fit_result['success']:
+                    results[name] = {'success': False, 'error': fit_result.get('error')}
+                    continue
+            
+            forecast = model.forecast(periods=periods, include_conf_int=True)
+            stats = get_forecast_statistics(forecast)
+            
+            results[name] = {
+                'success': True,
+                'forecast': prepare_forecast_for_json(forecast),
+                'statistics': stats,
+                'data_points': len(ts_data),
+            }
+        
+        except Exception as e:
+            logger.error(f"Error forecasting {name}: {e}")
+            results[name] = {'success': False, 'error': str(e)}
+    return results
+
+
 @login_required
-@require_http_methods(["GET"])
-def forecast_status(request):
+async def forecast_status(request):
     """
     Get current forecasting status and model info.
     """
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
     return JsonResponse({
         'status': 'ready',
         'models_available': {
@@ -52,6 +52,22 @@ class MenuItem(models.Model):
     def __str__(self):
         return self.name
 
+class MenuItemRank(models.Model):
+    """Precomputed popularity ranks of one menu item (rebuilt by restaurant.menu_ranking)."""
+    item = models.OneToOneField(MenuItem, on_delete=models.CASCADE, primary_key=True, related_name='rank')
+    overall_rank = models.PositiveIntegerField()
+    category_rank = models.PositiveIntegerField()
+    tier_rank = models.PositiveIntegerField(help_text="Rank within the item's demand tier")
+    velocity = models.FloatField(default=0, help_text="Recent sales, decayed by age")
+    velocity_rank = models.PositiveIntegerField()
+    order_count = models.PositiveIntegerField(default=0)
+    total_quantity = models.PositiveIntegerField(default=0)
+    demand_tier = models.CharField(max_length=10)
+    refreshed_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"#{self.overall_rank} {self.item_id}"
+
 class Table(models.Model):
     number = models.PositiveIntegerField(unique=True)
     capacity = models.PositiveIntegerField(default=4)  # Provide a default value
@@ -97,6 +113,22 @@ class Order(models.Model):
     status = models.CharField(max_length=20, choices=ORDER_STATUS_CHOICES, default='pending')
     total_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     payment_status = models.CharField(max_length=10, default='unpaid')
+    # Running totals maintained by restaurant.order_totals whenever payments/items change
+    paid_amount = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        default=0,
+        help_text="Sum of all payments recorded against this order"
+    )
+    item_count = models.PositiveIntegerField(
+        default=0,
+        help_text="Number of item lines on this order"
+    )
+    # Bumped by restaurant.order_status on every status change
+    version = models.PositiveIntegerField(
+        default=0,
+        help_text="Status version; clients send it back to detect stale updates"
+    )
     special_notes = models.TextField(blank=True, null=True)
     table = models.ForeignKey('Table', on_delete=models.SET_NULL, null=True, blank=True)
     completed_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='completed_orders')
@@ -107,85 +139,32 @@ class Order(models.Model):
     def __str__(self):
         return f"Order {self.order_id} - {self.customer_name}"
 
+    @property
+    def amount_due(self):
+        """Total the customer owes, including the delivery charge for deliveries."""
+        if self.order_type == 'delivery':
+            return (self.total_amount or 0) + (self.delivery_charge or 0)
+        return self.total_amount or 0
+
+    @property
+    def remaining_amount(self):
+        return self.amount_due - (self.paid_amount or 0)
+
+    @property
+    def is_settled(self):
+        """True when recorded payments cover the amount due."""
+        return (self.paid_amount or 0) >= self.amount_due
+
     def move_to_history(self):
         """
         Moves a completed and paid order to order history.
         Returns the created OrderHistory instance if successful, None otherwise.
         """
         if self.status == 'completed' and self.payment_status == 'paid':
+            from .order_status import archive_orders
+
             try:
-                # Only copy delivery_charge if it's a delivery order
-                delivery_charge_to_copy = self.delivery_charge if self.order_type == 'delivery' else 0
-                
-                # First, create the OrderHistory instance
-                order_history = OrderHistory.objects.create(
-                    order_id=self.order_id,
-                    customer_name=self.customer_name,
-                    customer_phone=self.customer_phone,
-                    order_type=self.order_type,
-                    status=self.status,
-                    total_amount=self.total_amount,
-                    delivery_charge=delivery_charge_to_copy,
-                    special_notes=self.special_notes or '',  # Provide empty string if None
-                    table=self.table,
-                    delivery_address=self.delivery_address,
-                    delivery_landmark=self.delivery_landmark,
-                    delivery_building=self.delivery_building,
-                    delivery_unit=self.delivery_unit,
-                    completed_by=self.completed_by,
-                    created_at=self.created_at,
-                    updated_at=self.updated_at
-                )
-                
-                # Copy order items
-                for order_item in self.items.all():
-                    try:
-                        OrderHistoryItem.objects.create(
-                            order_history=order_history,
-                            item=order_item.item,
-                            quantity=order_item.quantity,
-                            price=order_item.price
-                        )
-                    except Exception as e:
-                        print(f"Error copying order item: {e}")
-                
-                # Copy payment information
-                for payment in self.payments.all():
-                    try:
-                        OrderHistoryPayment.objects.create(
-                            order_history=order_history,
-                            payment_method=payment.payment_method,
-                            amount=payment.amount,
-                            transaction_id=payment.transaction_id
-                        )
-                    except Exception as e:
-                        print(f"Error copying payment: {e}")
-                
-                # Only delete the original order after successfully copying everything
-                # Copy status change logs into OrderHistoryStatus before deleting the order
-                try:
-                    from .models import OrderStatusLog, OrderHistoryStatus
-                except Exception:
-                    OrderStatusLog = None
-                    OrderHistoryStatus = None
-
-                if OrderStatusLog and OrderHistoryStatus:
-                    for log in self.status_logs.all():
-                        try:
-                            OrderHistoryStatus.objects.create(
-                                order_history=order_history,
-                                previous_status=log.previous_status,
-                                new_status=log.new_status,
-                                changed_by=log.changed_by,
-                                timestamp=log.timestamp
-                            )
-                        except Exception as e:
-                            print(f"Error copying status log: {e}")
-
-                # Delete the original order (and cascade-delete its logs)
-                self.delete()
-                
-                return order_history
+                return archive_orders([self]).get(self.pk)
             except Exception as e:
                 print(f"Error moving order to history: {e}")
                 return None
@@ -249,6 +228,16 @@ class OrderHistory(models.Model):
     )
     completed_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='completed_order_histories')
 
+    class Meta:
+        # Back the transaction history filters (see restaurant.history_queries).
+        # Trigram indexes for the search box are Postgres-only and live in
+        # migration 0032.
+        indexes = [
+            models.Index(fields=['created_at'], name='orderhist_created_idx'),
+            models.Index(fields=['order_type', 'created_at'], name='orderhist_type_created_idx'),
+            models.Index(fields=['status', 'created_at'], name='orderhist_status_created_idx'),
+        ]
+
     def __str__(self):
         return f"Order History {self.order_id}"
 
@@ -317,7 +306,10 @@ class OrderHistory(models.Model):
             return None
 
 class OrderHistoryPayment(models.Model):
-    order_history = models.ForeignKey(OrderHistory, on_delete=models.CASCADE, related_name='payments')
+    # db_constraint=False: on Postgres restaurant_orderhistory is partitioned by
+    # created_at (see restaurant.history_partitions), so `id` alone cannot back a
+    # foreign key constraint. Django still applies on_delete.
+    order_history = models.ForeignKey(OrderHistory, on_delete=models.CASCADE, related_name='payments', db_constraint=False)
     payment_method = models.CharField(max_length=50, choices=Payment.PAYMENT_METHOD_CHOICES)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     transaction_id = models.CharField(max_length=255, blank=True, null=True)
@@ -328,7 +320,8 @@ class OrderHistoryPayment(models.Model):
 
 
 class OrderHistoryItem(models.Model):
-    order_history = models.ForeignKey(OrderHistory, on_delete=models.CASCADE, related_name='items')
+    # No DB constraint; see OrderHistoryPayment.order_history
+    order_history = models.ForeignKey(OrderHistory, on_delete=models.CASCADE, related_name='items', db_constraint=False)
     item = models.ForeignKey(MenuItem, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
@@ -344,16 +337,25 @@ class OrderStatusLog(models.Model):
     new_status = models.CharField(max_length=50, blank=True, null=True)
     changed_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
     timestamp = models.DateTimeField(auto_now_add=True)
+    # Sent by clients that may retry; see restaurant.order_status
+    idempotency_key = models.CharField(max_length=64, blank=True, null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['order', 'idempotency_key'], name='orderstatuslog_order_idempotency_key'),
+        ]
 
     def __str__(self):
         return f"{self.order.order_id}: {self.previous_status} -> {self.new_status} @ {self.timestamp}"
 
 class OrderHistoryStatus(models.Model):
-    order_history = models.ForeignKey(OrderHistory, related_name='status_logs', on_delete=models.CASCADE)
+    # No DB constraint; see OrderHistoryPayment.order_history
+    order_history = models.ForeignKey(OrderHistory, related_name='status_logs', on_delete=models.CASCADE, db_constraint=False)
     previous_status = models.CharField(max_length=50, blank=True, null=True)
     new_status = models.CharField(max_length=50, blank=True, null=True)
     changed_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
     timestamp = models.DateTimeField()
+    idempotency_key = models.CharField(max_length=64, blank=True, null=True, db_index=True)
 
     def __str__(self):
         return f"{self.order_history.order_id}: {self.previous_status} -> {self.new_status} @ {self.timestamp}"
\ No newline at end of file
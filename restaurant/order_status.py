@@ -0,0 +1,391 @@
+"""
+Order status state machine.
+
+Every status change of a live order goes through `transition`, which locks
+the order row (`SELECT ... FOR UPDATE`), validates the move against
+`TRANSITIONS`, writes an `OrderStatusLog` row and, when the order is
+completed or cancelled, archives it (`archive_orders`) in the same
+transaction. Two terminals completing the same order are serialized: the
+second one finds the order gone (or already completed) instead of archiving
+it twice.
+
+`transition_many` does the same for a batch from the kitchen board (e.g.
+"Mark all ready"): one locking SELECT, one bulk UPDATE and one
+`archive_orders` call for the whole batch. Every order carries a `version`
+that is bumped on each change; a client that sends back a stale version gets
+a 'conflict' instead of overwriting someone else's change.
+
+Callers may pass an idempotency key (e.g. the `Idempotency-Key` header a
+tablet resends on retry). It is stored on the status log tagged with the
+order (`scoped_key`), and a second request for the same order with the same
+key returns the first outcome without changing anything, even after the
+order has moved to history. The same key sent for another order is a new
+request.
+"""
+
+from collections import namedtuple
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import menu_counters, menu_ranking, order_totals
+from .models import (
+    Order, OrderHistory, OrderHistoryItem, OrderHistoryPayment, OrderHistoryStatus, OrderItem, OrderStatusLog, Payment,
+)
+
+# UI-friendly names posted by the order list and the kitchen board
+STATUS_ALIASES = {
+    'cooking': 'preparing',
+    'cook': 'preparing',
+    'complete': 'completed',
+}
+
+FINAL_STATUSES = ('completed', 'cancelled')
+
+# Statuses each order type goes through; any non-final status may move to
+# any other of its type (so staff can correct a mis-tap), final ones never
+STATUSES_BY_TYPE = {
+    'table': ('pending', 'preparing', 'ready', 'served', 'completed', 'cancelled'),
+    'takeaway': ('pending', 'preparing', 'ready_to_pickup', 'completed', 'cancelled'),
+    'delivery': ('pending', 'preparing', 'ready', 'on_the_way', 'completed', 'cancelled'),
+    None: tuple(dict(Order.ORDER_STATUS_CHOICES)),
+}
+
+TRANSITIONS = {
+    order_type: {
+        current: frozenset(statuses) - {current} if current not in FINAL_STATUSES else frozenset()
+        for current in statuses
+    }
+    for order_type, statuses in STATUSES_BY_TYPE.items()
+}
+
+# Largest batch `transition_many` accepts
+MAX_BATCH = 200
+
+TransitionResult = namedtuple(
+    'TransitionResult', 'order_pk order_id status previous version changed archived replayed'
+)
+
+
+class TransitionError(Exception):
+    """A status change that is not allowed; `code` says why.
+
+    Codes: 'not_found', 'invalid' (not a status of this order type),
+    'final' (the order is already completed or cancelled), 'unsettled'
+    (completing an order whose payments do not cover the amount due),
+    'paid' (cancelling an order that has settled payments) and 'conflict'
+    (the client's version is stale).
+    """
+
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+
+def normalize_status(status, order_type=None):
+    """Map aliases to model statuses; a generic 'ready' means 'ready_to_pickup' for takeaways."""
+    status = (status or '').strip()
+    status = STATUS_ALIASES.get(status, status)
+    if status == 'ready' and order_type == 'takeaway':
+        return 'ready_to_pickup'
+    return status
+
+
+def allowed_statuses(order_type, current):
+    """Statuses an order of `order_type` may move to from `current`."""
+    statuses = STATUSES_BY_TYPE.get(order_type, STATUSES_BY_TYPE[None])
+    table = TRANSITIONS.get(order_type, TRANSITIONS[None])
+    if current in table:
+        return table[current]
+    # A status outside the type's flow (e.g. 'served' on a takeaway)
+    return frozenset() if current in FINAL_STATUSES else frozenset(statuses) - {current}
+
+
+def scoped_key(order_pk, idempotency_key):
+    """The key as stored for `order_pk`: clients only keep keys unique per order."""
+    if not idempotency_key:
+        return None
+    return f'{idempotency_key[:48]}:{order_pk}'
+
+
+def _replay(order_pk, idempotency_key):
+    """The result of an earlier request for this order with `idempotency_key`, if there was one."""
+    key = scoped_key(order_pk, idempotency_key)
+    if key is None:
+        return None
+    log = OrderStatusLog.objects.filter(
+        order_id=order_pk, idempotency_key=key
+    ).select_related('order').first()
+    if log is not None:
+        return TransitionResult(order_pk, log.order.order_id, log.new_status, log.previous_status,
+                                log.order.version, changed=False, archived=False, replayed=True)
+    # Archived: the order row is gone, but the key still names its pk
+    history_log = OrderHistoryStatus.objects.filter(
+        idempotency_key=key
+    ).select_related('order_history').first()
+    if history_log is not None:
+        return TransitionResult(order_pk, history_log.order_history.order_id, history_log.new_status,
+                                history_log.previous_status, None, changed=False, archived=True, replayed=True)
+    return None
+
+
+def _apply(order, status, user, version=None):
+    """Validate moving the locked `order` to `status` and apply it in memory.
+
+    Returns the previous status, or None when the order already has
+    `status` (nothing to do).
+    """
+    new_status = normalize_status(status, order.order_type)
+    if version is not None and int(version) != order.version:
+        raise TransitionError('conflict', 'Order was changed elsewhere; refresh and try again.')
+    previous = order.status
+    if new_status == previous:
+        return None
+    if previous in FINAL_STATUSES:
+        raise TransitionError('final', f'Order is already {previous}.')
+    if new_status not in allowed_statuses(order.order_type, previous):
+        raise TransitionError('invalid', 'Invalid status for this order type')
+    if new_status == 'completed':
+        if not order.is_settled:
+            raise TransitionError(
+                'unsettled',
+                f'Payments not settled. Remaining amount: Rs.{order.remaining_amount}.'
+            )
+        order.payment_status = 'paid'
+        order.completed_by = user
+    elif new_status == 'cancelled':
+        if order.paid_amount > 0:
+            raise TransitionError(
+                'paid',
+                f'Cannot cancel order with settled payments (Rs.{order.paid_amount}). '
+                f'Please clear the settled amount first.'
+            )
+        # History records who closed the order either way
+        order.completed_by = user
+    order.status = new_status
+    order.version += 1
+    order.updated_at = timezone.now()
+    return previous
+
+
+def _unchanged(order):
+    return TransitionResult(order.pk, order.order_id, order.status, order.status, order.version,
+                            changed=False, archived=False, replayed=False)
+
+
+def transition(order_pk, status, user=None, idempotency_key=None, archive=True, version=None, reason=None):
+    """Move the order with `order_pk` to `status` and return a TransitionResult.
+
+    Completing requires settled payments; it sets `payment_status` to paid
+    and records `user` as `completed_by`. Cancelling requires that nothing
+    has been paid yet; `reason` is kept as the history's cancellation
+    reason. Unless `archive` is False, a completed or cancelled order is
+    moved to history. If `version` is given it must match the order's
+    current version. Moving an order to the status it already has is a
+    no-op. Raises TransitionError when the change is not allowed.
+    """
+    with transaction.atomic():
+        order = Order.objects.select_for_update().filter(pk=order_pk).first()
+        # Checked after the lock: a retry waiting on it sees the first request's log
+        replayed = _replay(order_pk, idempotency_key)
+        if replayed is not None:
+            return replayed
+        if order is None:
+            raise TransitionError('not_found', 'Order not found; it may already have been completed.')
+
+        previous = _apply(order, status, user, version)
+        if previous is None:
+            return _unchanged(order)
+        order.save(update_fields=['status', 'payment_status', 'completed_by', 'version', 'updated_at'])
+        OrderStatusLog.objects.create(
+            order=order,
+            previous_status=previous,
+            new_status=order.status,
+            changed_by=user,
+            idempotency_key=scoped_key(order.pk, idempotency_key),
+        )
+
+        archived = False
+        if order.status in FINAL_STATUSES and archive:
+            archived = bool(archive_orders([order], cancellation_reason=reason))
+        return TransitionResult(order.pk, order.order_id, order.status, previous, order.version,
+                                changed=True, archived=archived, replayed=False)
+
+
+def transition_many(changes, user=None, idempotency_key=None, reason=None):
+    """Apply `(order_pk, status, version)` changes in one transaction.
+
+    The orders are locked with one SELECT ... FOR UPDATE, the accepted
+    changes written with one bulk UPDATE plus one INSERT of status logs, and
+    the completed and cancelled orders archived together by `archive_orders`
+    (`reason` becomes the cancellation reason of the cancelled ones). `version`
+    may be None to skip the staleness check. Each change succeeds or fails
+    on its own; returns `(order_pk, TransitionResult or TransitionError)`
+    pairs in input order.
+    """
+    if len(changes) > MAX_BATCH:
+        raise ValueError(f'At most {MAX_BATCH} changes per batch')
+    changes = [(int(order_pk), status, version) for order_pk, status, version in changes]
+    pks = {order_pk for order_pk, _, _ in changes}
+
+    with transaction.atomic():
+        orders = {order.pk: order for order in Order.objects.select_for_update().filter(pk__in=pks)}
+        # One key per order, so an archived order's log still says which change it was
+        keys = {order_pk: scoped_key(order_pk, idempotency_key) for order_pk in pks} if idempotency_key else {}
+        replays = {}
+        if keys:
+            replays = {
+                log.order_id: log
+                for log in OrderStatusLog.objects.filter(order_id__in=pks, idempotency_key__in=keys.values())
+            }
+            by_key = {key: order_pk for order_pk, key in keys.items()}
+            replays.update(
+                (by_key[log.idempotency_key], log)
+                for log in OrderHistoryStatus.objects.filter(
+                    idempotency_key__in=keys.values()
+                ).select_related('order_history')
+            )
+
+        results = []
+        seen = set()
+        changed = []
+        logs = []
+        for order_pk, status, version in changes:
+            order = orders.get(order_pk)
+            if order_pk in seen:
+                results.append((order_pk, TransitionError('invalid', 'Order appears more than once in the batch')))
+                continue
+            seen.add(order_pk)
+            if order_pk in replays:
+                log = replays[order_pk]
+                archived = isinstance(log, OrderHistoryStatus)
+                results.append((order_pk, TransitionResult(
+                    order_pk, log.order_history.order_id if archived else order.order_id, log.new_status,
+                    log.previous_status, None if archived else order.version,
+                    changed=False, archived=archived, replayed=True,
+                )))
+                continue
+            if order is None:
+                results.append((order_pk, TransitionError('not_found', 'Order not found')))
+                continue
+            try:
+                previous = _apply(order, status, user, version)
+            except TransitionError as e:
+                results.append((order_pk, e))
+                continue
+            if previous is None:
+                results.append((order_pk, _unchanged(order)))
+                continue
+            changed.append(order)
+            logs.append(OrderStatusLog(
+                order=order,
+                previous_status=previous,
+                new_status=order.status,
+                changed_by=user,
+                idempotency_key=keys.get(order_pk),
+            ))
+            results.append((order_pk, TransitionResult(
+                order.pk, order.order_id, order.status, previous, order.version,
+                changed=True, archived=False, replayed=False,
+            )))
+
+        if changed:
+            Order.objects.bulk_update(
+                changed, ['status', 'payment_status', 'completed_by', 'version', 'updated_at'], batch_size=MAX_BATCH
+            )
+            OrderStatusLog.objects.bulk_create(logs)
+            archived = archive_orders(
+                [order for order in changed if order.status in FINAL_STATUSES], cancellation_reason=reason
+            )
+            results = [
+                (order_pk, result._replace(archived=True) if order_pk in archived and result.changed else result)
+                for order_pk, result in results
+            ]
+        return results
+
+
+def _history_row(order, cancellation_reason=None):
+    return OrderHistory(
+        order_id=order.order_id,
+        # Blank rather than NULL: these history columns are NOT NULL
+        customer_name=order.customer_name or '',
+        customer_phone=order.customer_phone or '',
+        order_type=order.order_type,
+        status=order.status,
+        total_amount=order.total_amount,
+        # Only delivery orders keep their delivery charge
+        delivery_charge=order.delivery_charge if order.order_type == 'delivery' else 0,
+        special_notes=order.special_notes or '',
+        table_id=order.table_id,
+        delivery_address=order.delivery_address,
+        delivery_landmark=order.delivery_landmark,
+        delivery_building=order.delivery_building,
+        delivery_unit=order.delivery_unit,
+        cancellation_reason=cancellation_reason if order.status == 'cancelled' else None,
+        completed_by_id=order.completed_by_id,
+        created_at=order.created_at,
+        updated_at=order.updated_at,
+    )
+
+
+def archive_orders(orders, cancellation_reason=None):
+    """Move completed and paid, or cancelled, `orders` to history and delete them.
+
+    Items, payments and status logs of all the orders are copied with one
+    INSERT each and the orders deleted with one DELETE, all in one
+    transaction. `cancellation_reason` is stored on the cancelled ones.
+    Returns {order_pk: OrderHistory}; any other orders are left alone.
+    """
+    orders = [
+        order for order in orders
+        if order.status == 'cancelled' or (order.status == 'completed' and order.payment_status == 'paid')
+    ]
+    if not orders:
+        return {}
+
+    with transaction.atomic():
+        rows = [_history_row(order, cancellation_reason) for order in orders]
+        if connection.features.can_return_rows_from_bulk_insert:
+            OrderHistory.objects.bulk_create(rows)
+            # bulk_create sends no post_save; see signals.refresh_menu_ranking
+            transaction.on_commit(menu_ranking.mark_dirty)
+        else:
+            # Without RETURNING (SQLite) the new ids are only known row by row
+            for row in rows:
+                row.save(force_insert=True)
+        histories = {order.pk: row for order, row in zip(orders, rows)}
+        pks = list(histories)
+
+        items = OrderHistoryItem.objects.bulk_create([
+            OrderHistoryItem(
+                order_history=histories[item.order_id], item_id=item.item_id, quantity=item.quantity, price=item.price,
+            )
+            for item in OrderItem.objects.filter(order_id__in=pks).order_by('pk')
+        ])
+        menu_counters.record_archived_items(items)
+        OrderHistoryPayment.objects.bulk_create([
+            OrderHistoryPayment(
+                order_history=histories[payment.order_id],
+                payment_method=payment.payment_method,
+                amount=payment.amount,
+                transaction_id=payment.transaction_id,
+            )
+            for payment in Payment.objects.filter(order_id__in=pks).order_by('pk')
+        ])
+        # Idempotency keys go along, so a retried request still finds its outcome
+        OrderHistoryStatus.objects.bulk_create([
+            OrderHistoryStatus(
+                order_history=histories[log.order_id],
+                previous_status=log.previous_status,
+                new_status=log.new_status,
+                changed_by_id=log.changed_by_id,
+                timestamp=log.timestamp,
+                idempotency_key=log.idempotency_key,
+            )
+            for log in OrderStatusLog.objects.filter(order_id__in=pks).order_by('pk')
+        ])
+        # Cascades to the items, payments and logs, one DELETE per table; the
+        # running totals of orders being deleted need no per-row updates
+        with order_totals.suspended():
+            Order.objects.filter(pk__in=pks).delete()
+    return histories
@@ -0,0 +1,124 @@
+"""
+Running totals kept on `Order`: `paid_amount` and `item_count`.
+
+Signal handlers in `restaurant.signals` call `apply_payment_delta` and
+`apply_item_count_delta` whenever a `Payment` or `OrderItem` row is created,
+changed or deleted, and `restaurant.pricing` does the same for bulk inserts
+(which do not send signals). The deltas are applied with `F()` expressions,
+so concurrent writers never overwrite each other's increments.
+
+Deleting whole orders (archival) removes their items and payments along with
+them; `suspended()` tells the delete handlers to skip the updates to an order
+row that is about to go.
+
+`find_drift` / `repair` recompute the columns from the underlying rows; they
+back the `reconcile_order_totals` management command.
+"""
+
+import threading
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, IntegerField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import Order, OrderItem, Payment
+
+MONEY = DecimalField(max_digits=12, decimal_places=2)
+
+_state = threading.local()
+
+
+@contextmanager
+def suspended():
+    """Skip the delete handlers' total updates in this thread while the block runs."""
+    depth = getattr(_state, 'suspended', 0)
+    _state.suspended = depth + 1
+    try:
+        yield
+    finally:
+        _state.suspended = depth
+
+
+def is_suspended():
+    return bool(getattr(_state, 'suspended', 0))
+
+
+def apply_payment_delta(order_id, delta):
+    """Add `delta` (may be negative) to the order's `paid_amount`."""
+    if order_id is None or not delta:
+        return
+    Order.objects.filter(pk=order_id).update(paid_amount=F('paid_amount') + Decimal(delta))
+
+
+def apply_item_count_delta(order_id, delta):
+    """Add `delta` (may be negative) to the order's `item_count`."""
+    if order_id is None or not delta:
+        return
+    Order.objects.filter(pk=order_id).update(item_count=F('item_count') + delta)
+
+
+def paid_amount_expression():
+    """Expression computing an order's paid amount from its payment rows."""
+    subquery = Payment.objects.filter(order=OuterRef('pk')).order_by().values('order').annotate(
+        total=Sum('amount')
+    ).values('total')
+    return Coalesce(Subquery(subquery, output_field=MONEY), Value(Decimal('0')), output_field=MONEY)
+
+
+def item_count_expression():
+    """Expression computing an order's item line count from its item rows."""
+    subquery = OrderItem.objects.filter(order=OuterRef('pk')).order_by().values('order').annotate(
+        total=Count('id')
+    ).values('total')
+    return Coalesce(Subquery(subquery, output_field=IntegerField()), Value(0))
+
+
+def total_amount_expression():
+    """Expression computing an order's total as SUM(price * quantity) over its items."""
+    line_total = ExpressionWrapper(F('price') * F('quantity'), output_field=MONEY)
+    subquery = OrderItem.objects.filter(order=OuterRef('pk')).order_by().values('order').annotate(
+        total=Sum(line_total)
+    ).values('total')
+    return Coalesce(Subquery(subquery, output_field=MONEY), Value(Decimal('0')), output_field=MONEY)
+
+
+def find_drift(queryset=None):
+    """Return orders whose stored totals differ from their rows.
+
+    Each result is a dict with the stored and expected values, computed by
+    the database in a single query.
+    """
+    queryset = Order.objects.all() if queryset is None else queryset
+    annotated = queryset.annotate(
+        expected_paid_amount=paid_amount_expression(),
+        expected_item_count=item_count_expression(),
+        expected_total_amount=total_amount_expression(),
+    ).filter(
+        ~Q(paid_amount=F('expected_paid_amount'))
+        | ~Q(item_count=F('expected_item_count'))
+        | ~Q(total_amount=F('expected_total_amount'))
+    )
+    return list(annotated.order_by('pk').values(
+        'pk', 'order_id',
+        'paid_amount', 'expected_paid_amount',
+        'item_count', 'expected_item_count',
+        'total_amount', 'expected_total_amount',
+    ))
+
+
+def repair(order_pks, batch_size=500):
+    """Recompute stored totals for `order_pks` with one UPDATE per batch.
+
+    Returns the number of rows updated.
+    """
+    order_pks = list(order_pks)
+    updated = 0
+    for start in range(0, len(order_pks), batch_size):
+        batch = order_pks[start:start + batch_size]
+        updated += Order.objects.filter(pk__in=batch).update(
+            paid_amount=paid_amount_expression(),
+            item_count=item_count_expression(),
+            total_amount=total_amount_expression(),
+        )
+    return updated
@@ -0,0 +1,208 @@
+"""
+Keyset (seek) pagination helpers.
+
+Django's `Paginator` runs a `COUNT(*)` and an `OFFSET` scan for every page,
+which gets slower the deeper you page. Keyset pagination instead remembers
+the sort key of the last row shown and asks for rows strictly after it, so
+every page costs the same index seek.
+
+Cursors are opaque URL-safe strings; clients should pass them back as-is.
+`approximate_count` replaces the full `COUNT(*)` with a capped count or the
+Postgres planner estimate.
+"""
+
+import base64
+import datetime
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import Q
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+class _CursorEncoder(DjangoJSONEncoder):
+    """JSON encoder that keeps full microsecond precision for datetimes.
+
+    DjangoJSONEncoder truncates to milliseconds, which would make the seek
+    condition skip or repeat rows created within the same millisecond.
+    """
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(values, direction=NEXT):
+    """Encode sort-key values and a direction into an opaque cursor string."""
+    payload = json.dumps({'d': direction, 'v': list(values)}, cls=_CursorEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decode a cursor into (direction, raw values). Returns None if malformed."""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+        direction = payload['d']
+        values = payload['v']
+    except Exception:
+        return None
+    if direction not in (NEXT, PREVIOUS) or not isinstance(values, list):
+        return None
+    return direction, values
+
+
+class KeysetPage:
+    """One page of results plus cursors for the neighbouring pages."""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None, per_page=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.per_page = per_page
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def _split_ordering(ordering):
+    return [(f[1:], True) if f.startswith('-') else (f, False) for f in ordering]
+
+
+def _row_key(obj, fields):
+    return [getattr(obj, name) for name, _ in fields]
+
+
+def _seek_filter(fields, values, forward):
+    """Build the `(a, b) > (x, y)`-style condition for mixed sort directions."""
+    condition = Q()
+    for i, (name, descending) in enumerate(fields):
+        # Moving forward along a descending key means smaller values
+        lookup = 'lt' if descending == forward else 'gt'
+        clause = Q(**{f'{name}__{lookup}': values[i]})
+        for j, (prev_name, _) in enumerate(fields[:i]):
+            clause &= Q(**{prev_name: values[j]})
+        condition |= clause
+    return condition
+
+
+def keyset_paginate(queryset, ordering, cursor=None, per_page=25):
+    """Return a `KeysetPage` of `queryset` ordered by `ordering`.
+
+    `ordering` must end with a unique field (normally `id`) so that every row
+    has a distinct key. Invalid or stale cursors fall back to the first page.
+    """
+    fields = _split_ordering(ordering)
+    model = queryset.model
+    decoded = decode_cursor(cursor)
+
+    direction = NEXT
+    values = None
+    if decoded and len(decoded[1]) == len(fields):
+        try:
+            values = [model._meta.get_field(name).to_python(raw) for (name, _), raw in zip(fields, decoded[1])]
+            direction = decoded[0]
+        except Exception:
+            values = None
+
+    forward = direction == NEXT
+    qs = queryset
+    if values is not None:
+        qs = qs.filter(_seek_filter(fields, values, forward))
+
+    if forward:
+        qs = qs.order_by(*ordering)
+    else:
+        qs = qs.order_by(*[name if desc else f'-{name}' for name, desc in fields])
+
+    rows = list(qs[:per_page + 1])
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if not forward:
+        rows.reverse()
+
+    next_cursor = previous_cursor = None
+    if rows:
+        if has_more or not forward:
+            next_cursor = encode_cursor(_row_key(rows[-1], fields), NEXT)
+        if values is not None and (forward or has_more):
+            previous_cursor = encode_cursor(_row_key(rows[0], fields), PREVIOUS)
+    return KeysetPage(rows, next_cursor, previous_cursor, per_page)
+
+
+class CountEstimate:
+    """A row count that may be exact, a planner estimate, or a lower bound."""
+
+    EXACT = 'exact'
+    ESTIMATE = 'estimate'
+    CAPPED = 'capped'
+
+    def __init__(self, value, kind=EXACT):
+        self.value = value
+        self.kind = kind
+
+    @property
+    def is_exact(self):
+        return self.kind == self.EXACT
+
+    def __int__(self):
+        return self.value
+
+    def __str__(self):
+        if self.kind == self.ESTIMATE:
+            return f'~{self.value:,}'
+        if self.kind == self.CAPPED:
+            return f'{self.value:,}+'
+        return f'{self.value:,}'
+
+
+def _planner_estimate(queryset):
+    """Postgres' `pg_class.reltuples` for the queryset's table, or None."""
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+            [queryset.model._meta.db_table],
+        )
+        row = cursor.fetchone()
+    # reltuples is -1 (or 0) until the table has been vacuumed/analyzed
+    return row[0] if row and row[0] and row[0] > 0 else None
+
+
+def approximate_count(queryset, cap=10000):
+    """Count `queryset` without scanning more than `cap` + 1 rows.
+
+    Unfiltered querysets on Postgres use the planner's table estimate.
+    Otherwise the count is exact up to `cap`, and reported as "cap+" beyond it.
+    """
+    if not queryset.query.where:
+        estimate = _planner_estimate(queryset)
+        if estimate is not None and estimate > cap:
+            return CountEstimate(estimate, CountEstimate.ESTIMATE)
+    counted = queryset.order_by().values('pk')[:cap + 1].count()
+    if counted > cap:
+        return CountEstimate(cap, CountEstimate.CAPPED)
+    return CountEstimate(counted)
@@ -0,0 +1,104 @@
+"""
+Order pricing service.
+
+All writes that change an order's items go through here so that
+`Order.total_amount` is always recomputed the same way: by the database, in
+one `UPDATE ... SET total_amount = (SELECT SUM(price * quantity) ...)`,
+while the order row is locked. Two terminals editing the same order are
+therefore serialized and can never leave a stale total behind.
+"""
+
+from django.db import transaction
+
+from .models import MenuItem, Order, OrderItem
+from .order_totals import apply_item_count_delta, total_amount_expression
+
+
+def lock_order(order):
+    """Take a row lock on `order` for the rest of the current transaction.
+
+    Returns False if the order no longer exists (e.g. it was just archived).
+    """
+    return bool(list(Order.objects.select_for_update().filter(pk=order.pk).values_list('pk', flat=True)))
+
+
+def recalculate_total(order):
+    """Recompute `order.total_amount` in the database and return the new value.
+
+    The instance is updated in place so callers can keep using it without a
+    full `order.save()` (which would overwrite concurrent changes).
+    """
+    with transaction.atomic():
+        Order.objects.filter(pk=order.pk).update(total_amount=total_amount_expression())
+        order.total_amount = Order.objects.filter(pk=order.pk).values_list('total_amount', flat=True).get()
+    return order.total_amount
+
+
+def menu_prices(item_ids):
+    """Fetch {menu_item_id: price} for `item_ids` in a single query."""
+    return dict(MenuItem.objects.filter(id__in=set(item_ids)).values_list('id', 'price'))
+
+
+def add_items(order, lines):
+    """Add `(menu_item_id, quantity)` lines to `order` at current menu prices.
+
+    Prices are read in one query and the rows are inserted with one
+    `bulk_create`; the total is recomputed afterwards. Returns the new total.
+    """
+    lines = [(int(item_id), int(quantity)) for item_id, quantity in lines]
+    with transaction.atomic():
+        lock_order(order)
+        prices = menu_prices(item_id for item_id, _ in lines)
+        created = OrderItem.objects.bulk_create([
+            OrderItem(order=order, item_id=item_id, quantity=quantity, price=prices[item_id])
+            for item_id, quantity in lines
+            if item_id in prices
+        ])
+        # bulk_create sends no post_save signals, so count the new lines here
+        apply_item_count_delta(order.pk, len(created))
+        order.item_count = (order.item_count or 0) + len(created)
+        return recalculate_total(order)
+
+
+def set_item(order, menu_item, quantity):
+    """Add `menu_item` to `order`, or set its quantity if already present.
+
+    Returns `(order_item, new_total)`.
+    """
+    with transaction.atomic():
+        lock_order(order)
+        order_item, created = OrderItem.objects.get_or_create(
+            order=order,
+            item=menu_item,
+            defaults={'quantity': quantity, 'price': menu_item.price},
+        )
+        if not created:
+            order_item.quantity = quantity
+            order_item.save(update_fields=['quantity'])
+        return order_item, recalculate_total(order)
+
+
+def update_item_quantity(order, order_item, quantity):
+    """Change the quantity of one of `order`'s items and return the new total."""
+    with transaction.atomic():
+        lock_order(order)
+        OrderItem.objects.filter(pk=order_item.pk, order=order).update(quantity=quantity)
+        order_item.quantity = quantity
+        return recalculate_total(order)
+
+
+def update_quantities(order, quantities):
+    """Apply `{order_item_id: quantity}` to `order` and return the new total."""
+    with transaction.atomic():
+        lock_order(order)
+        for item_id, quantity in quantities.items():
+            OrderItem.objects.filter(pk=item_id, order=order).update(quantity=quantity)
+        return recalculate_total(order)
+
+
+def remove_item(order, order_item):
+    """Delete one of `order`'s items and return the new total."""
+    with transaction.atomic():
+        lock_order(order)
+        OrderItem.objects.filter(pk=order_item.pk, order=order).delete()
+        return recalculate_total(order)
@@ -0,0 +1,177 @@
+"""
+Pre-rendered public menu for diners scanning a table QR code.
+
+A full dining room scanning at once should not turn into a burst of
+queries and template renders. For each menu catalog version (see
+`restaurant.menu_catalog`) the public page is rendered once, as HTML and
+as JSON, and every body is compressed ahead of time with gzip and, when the
+optional `brotli` package is installed, brotli. Requests then only pick a
+ready-made byte string.
+
+Bodies are kept in memory and written to `PUBLIC_MENU_CACHE_DIR` (default:
+MEDIA_ROOT/cache/public_menu), named by their content hash, so a freshly
+started worker reuses the compressed files instead of compressing again.
+"""
+
+import gzip
+import hashlib
+import json
+import threading
+from pathlib import Path
+
+from django.conf import settings
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from . import file_cache, menu_catalog, thumbnails
+
+try:
+    import brotli
+except ImportError:  # optional; gzip is always available
+    brotli = None
+
+HTML = 'html'
+JSON = 'json'
+TEMPLATE = 'restaurant/public_menu_page.html'
+
+CONTENT_TYPES = {
+    HTML: 'text/html; charset=utf-8',
+    JSON: 'application/json',
+}
+
+IDENTITY = 'identity'
+GZIP = 'gzip'
+BROTLI = 'br'
+
+# Bodies of the most recent versions kept on disk; older files are pruned
+DISK_VERSIONS_KEPT = 10
+
+_lock = threading.Lock()
+_current = None
+
+
+def brotli_available():
+    return brotli is not None
+
+
+def cache_dir():
+    root = getattr(settings, 'PUBLIC_MENU_CACHE_DIR', None)
+    return Path(root) if root else Path(settings.MEDIA_ROOT) / 'cache' / 'public_menu'
+
+
+def _compressors():
+    compressors = {GZIP: lambda body: gzip.compress(body, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        compressors[BROTLI] = lambda body: brotli.compress(body, quality=11)
+    return compressors
+
+
+class Representation:
+    """One response body (HTML or JSON) in every available content encoding."""
+
+    def __init__(self, kind, body):
+        self.kind = kind
+        self.content_type = CONTENT_TYPES[kind]
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+        self.bodies = {IDENTITY: file_cache.cached_bytes(cache_dir() / f'{self.etag}.{kind}', lambda: body)}
+        for encoding, compress in _compressors().items():
+            self.bodies[encoding] = file_cache.cached_bytes(
+                cache_dir() / f'{self.etag}.{kind}.{encoding}', lambda compress=compress: compress(body)
+            )
+
+    def etag_for(self, encoding):
+        # Each encoding is a different byte sequence, so it needs its own strong ETag
+        return f'"{self.etag}"' if encoding == IDENTITY else f'"{self.etag}-{encoding}"'
+
+    def matches(self, if_none_match):
+        """Whether an If-None-Match header names any encoding of this body."""
+        if not if_none_match:
+            return False
+        for tag in if_none_match.split(','):
+            tag = tag.strip()
+            if tag == '*':
+                return True
+            tag = tag.removeprefix('W/').strip('"')
+            if tag.split('-', 1)[0] == self.etag:
+                return True
+        return False
+
+    def negotiate(self, accept_encoding):
+        """Pick the best encoding the client accepts (brotli, then gzip, then none)."""
+        accepted = {}
+        for part in (accept_encoding or '').split(','):
+            coding, _, params = part.strip().partition(';')
+            quality = 1.0
+            params = params.strip()
+            if params.startswith('q='):
+                try:
+                    quality = float(params[2:])
+                except ValueError:
+                    quality = 0.0
+            if coding:
+                accepted[coding.strip().lower()] = quality
+        for encoding in (BROTLI, GZIP):
+            if encoding in self.bodies and accepted.get(encoding, accepted.get('*', 0)) > 0:
+                return encoding
+        return IDENTITY
+
+
+class PublicMenu:
+    """The public menu of one catalog version, ready to serve."""
+
+    def __init__(self, catalog):
+        self.catalog_etag = catalog.etag
+        self.version = catalog.version
+        self.built_at = timezone.now()
+        categories = catalog.public_categories()
+        # The new version may be due to thumbnails made since (see thumbnails.published)
+        thumbnails.forget_missing()
+
+        html = render_to_string(TEMPLATE, {'categories': categories}).encode('utf-8')
+        data = json.dumps({
+            'version': catalog.version,
+            'categories': [
+                {
+                    'id': category.id,
+                    'name': category.name,
+                    'items': [
+                        {
+                            'id': item.id,
+                            'name': item.name,
+                            'description': item.description,
+                            'price': float(item.price),
+                            'image_url': item.image_url,
+                        }
+                        for item in category.items
+                    ],
+                }
+                for category in categories
+            ],
+        }, separators=(',', ':')).encode('utf-8')
+
+        self.representations = {
+            HTML: Representation(HTML, html),
+            JSON: Representation(JSON, data),
+        }
+        # Files are named <etag>.<kind>[.<encoding>]; keep the latest versions of both kinds
+        file_cache.prune(cache_dir(), DISK_VERSIONS_KEPT * len(CONTENT_TYPES), key=lambda path: path.name.split('.', 1)[0])
+
+
+def get_public_menu():
+    """Return the pre-rendered public menu for the current catalog version."""
+    global _current
+    catalog = menu_catalog.get_catalog()
+    current = _current
+    if current is None or current.catalog_etag != catalog.etag:
+        with _lock:
+            current = _current
+            if current is None or current.catalog_etag != catalog.etag:
+                current = PublicMenu(catalog)
+                _current = current
+    return current
+
+
+def invalidate_public_menu():
+    """Drop the rendered menu; the next request renders it from the catalog again."""
+    global _current
+    _current = None
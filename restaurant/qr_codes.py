@@ -0,0 +1,189 @@
+"""
+QR code assets: memoized single codes and printable per-table sheets.
+
+A QR image depends only on (data, size, error-correction level, format), so
+each one is built once and kept in memory (LRU) and on disk under
+`QR_CACHE_DIR` (default: MEDIA_ROOT/cache/qr), named by a hash of those
+parameters. Nothing ever needs invalidating: a different URL is a
+different file.
+
+`table_sheet_pdf` lays out one code per table (pointing at the public menu
+for that table number) on A4 pages ready to print and cut. Codes missing
+from the cache are generated in a process pool when there are many of them
+(the `generate_table_qr_sheet` command); the web view renders in-process.
+"""
+
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from io import BytesIO
+from pathlib import Path
+from urllib.parse import urlencode
+
+import qrcode
+import qrcode.image.svg
+from django.conf import settings
+
+from . import file_cache
+
+PNG = 'png'
+SVG = 'svg'
+CONTENT_TYPES = {PNG: 'image/png', SVG: 'image/svg+xml'}
+
+ERROR_CORRECTION = {
+    'L': qrcode.constants.ERROR_CORRECT_L,
+    'M': qrcode.constants.ERROR_CORRECT_M,
+    'Q': qrcode.constants.ERROR_CORRECT_Q,
+    'H': qrcode.constants.ERROR_CORRECT_H,
+}
+
+DEFAULT_SIZE = 10  # pixels (PNG) or tenths of a millimetre (SVG) per module
+MIN_SIZE = 1
+MAX_SIZE = 40
+BORDER = 4
+# Below this many missing codes, a process pool costs more than it saves
+POOL_THRESHOLD = 24
+DISK_ENTRIES_KEPT = 2000
+
+
+def cache_dir():
+    root = getattr(settings, 'QR_CACHE_DIR', None)
+    return Path(root) if root else Path(settings.MEDIA_ROOT) / 'cache' / 'qr'
+
+
+def clean_params(size=None, ec=None, fmt=None):
+    """Validate request-style parameters, falling back to the defaults."""
+    try:
+        size = min(max(int(size), MIN_SIZE), MAX_SIZE)
+    except (TypeError, ValueError):
+        size = DEFAULT_SIZE
+    ec = (ec or 'L').upper()
+    if ec not in ERROR_CORRECTION:
+        ec = 'L'
+    fmt = (fmt or PNG).lower()
+    if fmt not in CONTENT_TYPES:
+        fmt = PNG
+    return size, ec, fmt
+
+
+def cache_key(data, size, ec, fmt):
+    raw = f'{data}\n{size}\n{ec}\n{BORDER}\n{fmt}'.encode('utf-8')
+    return hashlib.sha256(raw).hexdigest()[:32]
+
+
+def render(data, size, ec, fmt):
+    """Build one QR image. Pure function of its arguments (runs in pool workers)."""
+    qr = qrcode.QRCode(
+        error_correction=ERROR_CORRECTION[ec],
+        box_size=size,
+        border=BORDER,
+    )
+    qr.add_data(data)
+    qr.make(fit=True)
+    buffer = BytesIO()
+    if fmt == SVG:
+        qr.make_image(image_factory=qrcode.image.svg.SvgPathImage).save(buffer)
+    else:
+        qr.make_image(fill_color='black', back_color='white').save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def _render_args(args):
+    return render(*args)
+
+
+@lru_cache(maxsize=256)
+def qr_image(data, size=DEFAULT_SIZE, ec='L', fmt=PNG):
+    """QR image bytes for `data`, from memory, then disk, then freshly built."""
+    key = cache_key(data, size, ec, fmt)
+    return file_cache.cached_bytes(cache_dir() / f'{key}.{fmt}', lambda: render(data, size, ec, fmt))
+
+
+def qr_images(requests, workers=None):
+    """Bytes for many (data, size, ec, fmt) tuples, in order.
+
+    Codes already on disk are read back; the rest are generated, in a
+    process pool when there are at least POOL_THRESHOLD of them.
+    """
+    results = {}
+    missing = []
+    for args in dict.fromkeys(requests):
+        path = cache_dir() / f'{cache_key(*args)}.{args[3]}'
+        try:
+            results[args] = path.read_bytes()
+        except OSError:
+            missing.append(args)
+
+    if len(missing) >= POOL_THRESHOLD and (workers is None or workers > 1):
+        workers = workers or min(len(missing) // POOL_THRESHOLD + 1, os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            built = list(pool.map(_render_args, missing, chunksize=max(1, len(missing) // (workers * 4))))
+    else:
+        built = [render(*args) for args in missing]
+
+    for args, data in zip(missing, built):
+        file_cache.store(cache_dir() / f'{cache_key(*args)}.{args[3]}', data)
+        results[args] = data
+    file_cache.prune(cache_dir(), DISK_ENTRIES_KEPT)
+    return [results[args] for args in requests]
+
+
+def table_url(menu_url, table_number):
+    """The URL printed on a table's code: the public menu, tagged with the table number.
+
+    The public menu page ignores `table` (every table gets the same
+    pre-rendered page); the tag only tells the tables' scans apart in access logs.
+    """
+    separator = '&' if '?' in menu_url else '?'
+    return f'{menu_url}{separator}{urlencode({"table": table_number})}'
+
+
+def table_sheet_pdf(menu_url, tables, ec='M', columns=3, workers=None, title='Scan for our menu'):
+    """Print-ready A4 PDF with one labelled QR code per table.
+
+    `tables` is an iterable of objects with a `number` attribute. Requires
+    `reportlab` (ImportError otherwise).
+    """
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import mm
+    from reportlab.lib.utils import ImageReader
+    from reportlab.pdfgen import canvas
+
+    numbers = sorted(table.number for table in tables)
+    urls = [table_url(menu_url, number) for number in numbers]
+    images = qr_images([(url, DEFAULT_SIZE, ec, PNG) for url in urls], workers=workers)
+
+    page_width, page_height = A4
+    margin = 12 * mm
+    cell_width = (page_width - 2 * margin) / columns
+    cell_height = cell_width + 16 * mm  # code + caption
+    rows = max(1, int((page_height - 2 * margin) // cell_height))
+    code_size = cell_width - 10 * mm
+
+    buffer = BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4)
+    pdf.setTitle('Table QR codes')
+    per_page = rows * columns
+    for index, (number, url, image) in enumerate(zip(numbers, urls, images)):
+        if index and index % per_page == 0:
+            pdf.showPage()
+        slot = index % per_page
+        row, column = divmod(slot, columns)
+        x = margin + column * cell_width
+        y = page_height - margin - (row + 1) * cell_height
+
+        # Light cut guide around each cell
+        pdf.setStrokeGray(0.8)
+        pdf.setDash(2, 2)
+        pdf.rect(x, y, cell_width, cell_height)
+        pdf.setDash()
+
+        pdf.drawImage(ImageReader(BytesIO(image)), x + 5 * mm, y + 14 * mm, code_size, code_size)
+        pdf.setFont('Helvetica-Bold', 14)
+        pdf.drawCentredString(x + cell_width / 2, y + 8 * mm, f'Table {number}')
+        pdf.setFont('Helvetica', 7)
+        pdf.drawCentredString(x + cell_width / 2, y + 4 * mm, title)
+    pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
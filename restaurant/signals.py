@@ -3,29 +3,118 @@ Signal handlers for the restaurant app.
 Handles events like order status changes, payment updates, etc.
 """
 
-from django.db.models.signals import post_save, post_delete
+from decimal import Decimal
+
+from django.db.models.signals import pre_save, post_save, post_delete, post_migrate
 from django.dispatch import receiver
-from .models import Order, OrderHistoryItem, MenuItem
+from .models import Order, OrderHistory, MenuItem, Category, Table, Payment, OrderItem
+from .menu_catalog import STATS_FIELDS, invalidate_menu_catalog
+from .public_menu import invalidate_public_menu
+from . import history_search, menu_ranking, thumbnails
+from django.conf import settings
+from django.db import transaction
+from .table_registry import invalidate_table_registry
+from . import order_totals
 from django.db.models import Sum
 
 
-@receiver(post_save, sender=OrderHistoryItem)
-def update_menu_item_stats(sender, instance, created, **kwargs):
-    """
-    Update MenuItem stats when an OrderHistoryItem is created or updated.
-    This keeps track of total orders and quantities.
-    """
-    if created:
-        try:
-            menu_item = instance.item
-            if menu_item:
-                # Update order count and total quantity
-                menu_item.order_count = OrderHistoryItem.objects.filter(
-                    item=menu_item
-                ).values('order_history_id').distinct().count()
-                menu_item.save(update_fields=['order_count'])
-        except Exception as e:
-            pass  # Silently fail to avoid blocking order completion
+@receiver(post_save, sender=OrderHistory)
+def refresh_menu_ranking(sender, instance, created, raw=False, **kwargs):
+    """Mark the menu ranking out of date once an archived order is committed."""
+    if created and not raw:
+        transaction.on_commit(menu_ranking.mark_dirty)
+
+
+@receiver(post_save, sender=Table)
+@receiver(post_delete, sender=Table)
+def refresh_table_registry(sender, instance, **kwargs):
+    """Drop the cached table snapshot whenever a table is added, edited or removed."""
+    invalidate_table_registry()
+
+
+@receiver(post_save, sender=MenuItem)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=MenuItem)
+@receiver(post_delete, sender=Category)
+def refresh_menu_catalog(sender, instance, update_fields=None, **kwargs):
+    """Bump the menu catalog version whenever the menu changes."""
+    # Order-count / demand-tier bookkeeping doesn't change what the menu shows
+    if update_fields and STATS_FIELDS.issuperset(update_fields):
+        return
+    invalidate_menu_catalog()
+    invalidate_public_menu()
+
+
+@receiver(post_save, sender=MenuItem)
+def create_menu_item_thumbnails(sender, instance, raw=False, **kwargs):
+    """Resize a newly uploaded image once the save commits (no-op if variants exist)."""
+    if raw or not instance.image or not getattr(settings, 'THUMBNAILS_ON_UPLOAD', True):
+        return
+    name = instance.image.name
+    transaction.on_commit(lambda: thumbnails.create(name))
+
+
+def _money(value):
+    return Decimal(str(value or 0))
+
+
+@receiver(pre_save, sender=Payment)
+def remember_previous_payment(sender, instance, raw=False, **kwargs):
+    """Stash the stored amount/order of an edited payment so post_save can apply the difference."""
+    instance._previous_payment = None
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    instance._previous_payment = (
+        Payment.objects.filter(pk=instance.pk).values_list('order_id', 'amount').first()
+    )
+
+
+@receiver(post_save, sender=Payment)
+def update_order_paid_amount(sender, instance, created, raw=False, **kwargs):
+    """Keep Order.paid_amount in step with the order's payments."""
+    if raw:
+        return
+    previous = getattr(instance, '_previous_payment', None)
+    if created or previous is None:
+        order_totals.apply_payment_delta(instance.order_id, _money(instance.amount))
+        return
+    old_order_id, old_amount = previous
+    if old_order_id == instance.order_id:
+        order_totals.apply_payment_delta(instance.order_id, _money(instance.amount) - _money(old_amount))
+    else:
+        order_totals.apply_payment_delta(old_order_id, -_money(old_amount))
+        order_totals.apply_payment_delta(instance.order_id, _money(instance.amount))
+
+
+@receiver(post_delete, sender=Payment)
+def subtract_deleted_payment(sender, instance, **kwargs):
+    if order_totals.is_suspended():
+        return
+    order_totals.apply_payment_delta(instance.order_id, -_money(instance.amount))
+
+
+@receiver(post_save, sender=OrderItem)
+def count_added_order_item(sender, instance, created, raw=False, **kwargs):
+    """Keep Order.item_count in step with the order's item lines."""
+    if created and not raw:
+        order_totals.apply_item_count_delta(instance.order_id, 1)
+
+
+@receiver(post_delete, sender=OrderItem)
+def count_removed_order_item(sender, instance, **kwargs):
+    if order_totals.is_suspended():
+        return
+    order_totals.apply_item_count_delta(instance.order_id, -1)
+
+
+@receiver(post_migrate)
+def restore_history_search(sender, using='default', verbosity=1, **kwargs):
+    """Re-create the SQLite search triggers once a migration has rebuilt the history table."""
+    if sender.label != 'restaurant':
+        return
+    indexed = history_search.restore_index(using)
+    if indexed is not None and verbosity >= 1:
+        print(f"Restored the order history search index ({indexed} rows).")
 
 
 # Add more signal handlers as needed
@@ -126,25 +126,89 @@ function updateCounts() {
     document.getElementById('readyCount').textContent = ready;
 }
 
+function newIdempotencyKey() {
+    if (window.crypto && crypto.randomUUID) return crypto.randomUUID();
+    return Date.now().toString(36) + '-' + Math.random().toString(36).slice(2);
+}
+
 async function persistOrderStatus(orderPk, status) {
     const url = '/kitchen/ajax/update_order_status/';
     const csrftoken = getCookie('csrftoken');
+    // The same key on the retry lets the server ignore a change it already applied
+    const key = newIdempotencyKey();
+    const card = document.querySelector(`[data-order-id="${orderPk}"]`);
+    const payload = { order_id: orderPk, status: status };
+    if (card && card.dataset.version !== undefined) payload.version = Number(card.dataset.version);
+    for (let attempt = 0; attempt < 2; attempt++) {
+        try {
+            const resp = await fetch(url, {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                    'X-CSRFToken': csrftoken,
+                    'Idempotency-Key': key
+                },
+                body: JSON.stringify(payload)
+            });
+            let data = null;
+            try { data = await resp.json(); } catch (e) { data = null; }
+            if (!resp.ok) return data || { success: false, message: 'Network error', status: null };
+            if (card && data && data.version !== undefined) card.dataset.version = data.version;
+            return data;
+        } catch (e) {
+            // Network failure: the request may or may not have reached the server
+        }
+    }
+    return { success: false, message: 'Network error', status: null };
+}
+
+// Move every card in the Cooking column to Ready with one batch request
+async function markAllReady() {
+    const cookingColumn = document.getElementById('cooking-column');
+    const readyColumn = document.getElementById('ready-column');
+    const cards = Array.from(cookingColumn.children);
+    if (!cards.length) return;
+    const changes = cards.map(card => {
+        const change = { order_id: Number(card.dataset.orderId), status: 'ready' };
+        if (card.dataset.version !== undefined) change.version = Number(card.dataset.version);
+        return change;
+    });
+    let data = null;
     try {
-        const resp = await fetch(url, {
+        const resp = await fetch('/kitchen/ajax/update_order_status/batch/', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
-                'X-CSRFToken': csrftoken
+                'X-CSRFToken': getCookie('csrftoken'),
+                'Idempotency-Key': newIdempotencyKey()
             },
-            body: JSON.stringify({ order_id: orderPk, status: status })
+            body: JSON.stringify({ changes: changes })
         });
-        let data = null;
-        try { data = await resp.json(); } catch (e) { data = null; }
-        if (!resp.ok) return data || { success: false, message: 'Network error', status: null };
-        return data;
+        data = await resp.json();
     } catch (e) {
-        return { success: false, message: 'Network error', status: null };
+        showKitchenAlert('Network error while updating orders');
+        return;
     }
+    if (!data || !Array.isArray(data.results)) {
+        showKitchenAlert((data && data.message) ? data.message : 'Failed to update orders');
+        return;
+    }
+    let moved = 0;
+    data.results.forEach(result => {
+        const card = cookingColumn.querySelector(`[data-order-id="${result.order_id}"]`);
+        if (!card || !result.success) return;
+        card.dataset.version = result.version;
+        readyColumn.appendChild(card);
+        moved++;
+    });
+    updateCounts();
+    if (moved) {
+        playKitchenChime();
+        flashColumn('ready-column');
+    }
+    const failed = data.results.length - moved;
+    showKitchenAlert(failed ? `${moved} order(s) ready, ${failed} not updated (refreshing)` : `${moved} order(s) marked ready`);
+    if (failed) refreshKitchenBoard();
 }
 
 /* --- Alert helpers --- */
@@ -363,6 +427,8 @@ function createOrderCard(order) {
     card.setAttribute('role', 'article');
     card.setAttribute('aria-label', `Order ${order.order_id} - ${order.type}`);
     card.dataset.orderId = order.id;
+    // Status version from the server; sent back so stale changes are rejected
+    if (order.version !== undefined) card.dataset.version = order.version;
     card.style.cursor = 'move';
 
     const normalized = (order.status || '').toString().trim().toLowerCase();
@@ -439,23 +505,42 @@ function createOrderCard(order) {
 document.addEventListener('DOMContentLoaded', () => {
     initializeKitchenBoard();
     setupDragDrop();
+    const allReady = document.getElementById('markAllReady');
+    if (allReady) allReady.addEventListener('click', markAllReady);
 });
 
-// Auto-refresh every 5 seconds: fetch latest orders and re-render board
+// Keep the board fresh. Served over ASGI the API holds each request until the
+// board changes (long poll), so the next one is sent right away; otherwise
+// fetch the latest orders every 5 seconds.
+const ordersJsonEl = document.getElementById('orders-json');
+const LONG_POLL = !!(ordersJsonEl && ordersJsonEl.dataset.longPoll === '1');
+let boardEtag = null;
+
 function refreshKitchenBoard() {
-    fetch('/kitchen/orders/api/')
+    const url = LONG_POLL && boardEtag
+        ? `/kitchen/orders/api/?since=${encodeURIComponent(boardEtag)}&wait=25`
+        : '/kitchen/orders/api/';
+    return fetch(url)
         .then(resp => {
             if (!resp.ok) throw new Error('Network response was not ok');
             return resp.json();
         })
         .then(data => {
             if (data && Array.isArray(data.orders)) {
+                boardEtag = data.etag || null;
                 initializeKitchenBoard(data.orders);
             }
         })
         .catch(err => {
+            boardEtag = null;
             console.error('Failed to refresh kitchen board:', err);
         });
 }
 
-setInterval(refreshKitchenBoard, 5000);
+function scheduleKitchenRefresh(delay) {
+    setTimeout(() => {
+        refreshKitchenBoard().then(() => scheduleKitchenRefresh(LONG_POLL && boardEtag ? 0 : 5000));
+    }, delay);
+}
+
+scheduleKitchenRefresh(LONG_POLL ? 0 : 5000);
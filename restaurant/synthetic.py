@@ -0,0 +1,364 @@
+"""
+Synthetic restaurant data at scale, for benchmarks and demand forecasting.
+
+`build_plan` fixes everything that must agree across worker processes: the
+menu and its popularity weights (Zipf with exponent `skew`, so a few dishes
+sell most), how many orders each day gets (base volume x weekday curve x
+yearly wave x noise), and the primary keys each day will use. `generate_days`
+then writes whole days of `OrderHistory` with items, payments and status
+logs using `bulk_create`; days are independent, so they can be split across
+a process pool. `generate_active_orders` adds today's open orders.
+
+Every random draw comes from a generator seeded with (seed, day), so the
+same seed produces the same rows whatever the number of workers. Rows are
+written with explicit primary keys (SQLite does not return them from bulk
+inserts on this Django version); `finish` resets the sequences and rebuilds
+the derived counters afterwards.
+"""
+
+import bisect
+import itertools
+import math
+import random
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from . import history_partitions, menu_counters, menu_ranking
+from .models import (
+    Category, MenuItem, Order, OrderHistory, OrderHistoryItem, OrderHistoryPayment, OrderHistoryStatus, OrderItem,
+    OrderStatusLog, Payment, Table,
+)
+
+# Monday .. Sunday
+WEEKDAY_WEIGHTS = (0.85, 0.8, 0.85, 0.95, 1.2, 1.45, 1.3)
+# 00:00 .. 23:00; lunch and dinner peaks
+HOUR_WEIGHTS = (0, 0, 0, 0, 0, 0, 0, 0.2, 0.5, 0.5, 0.6, 1.3, 2.2, 2.0, 1.0, 0.5, 0.5, 0.8, 1.6, 2.4, 2.2, 1.2, 0.4, 0)
+ORDER_TYPES = (('table', 0.6), ('takeaway', 0.3), ('delivery', 0.1))
+PAYMENT_METHODS = (('cash', 0.45), ('fonepay', 0.2), ('esewa', 0.15), ('card', 0.1), ('khalti', 0.1))
+# Items per order: 1..6
+LINE_COUNT_WEIGHTS = (0.25, 0.3, 0.2, 0.12, 0.08, 0.05)
+ACTIVE_STATUSES = ('pending', 'preparing', 'ready', 'served')
+FLOW = {
+    'table': ('pending', 'preparing', 'ready', 'served', 'completed'),
+    'takeaway': ('pending', 'preparing', 'ready_to_pickup', 'completed'),
+    'delivery': ('pending', 'preparing', 'on_the_way', 'completed'),
+}
+DELIVERY_CHARGE = Decimal('100')
+ORDER_ID_PREFIX = 'S'
+BASE36 = '0123456789abcdefghijklmnopqrstuvwxyz'
+
+
+def synthetic_order_id(pk):
+    """'S' + 7 base-36 digits: never clashes with the numeric ids of real orders."""
+    digits = []
+    for _ in range(7):
+        pk, remainder = divmod(pk, 36)
+        digits.append(BASE36[remainder])
+    return ORDER_ID_PREFIX + ''.join(reversed(digits))
+
+
+def _cumulative(weights):
+    return list(itertools.accumulate(weights))
+
+
+def _next_pk(model):
+    return (model.objects.aggregate(top=Max('pk'))['top'] or 0) + 1
+
+
+@contextmanager
+def backdating(*models):
+    """Let bulk_create keep the timestamps we set on auto_now/auto_now_add fields."""
+    changed = []
+    for model in models:
+        for field in model._meta.concrete_fields:
+            if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False):
+                changed.append((field, field.auto_now, field.auto_now_add))
+                field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in changed:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Plan:
+    """Everything workers need to generate their days identically. Picklable."""
+
+    def __init__(self, seed, days, items, item_weights, table_ids, staff_ids, history_pks,
+                 weekday_weights, hour_weights, cancel_rate):
+        self.seed = seed
+        self.days = days                  # [(date, order count, first history pk)]
+        self.items = items                # [(item id, price)]
+        self.item_cum_weights = _cumulative(item_weights)
+        self.table_ids = table_ids
+        self.staff_ids = staff_ids
+        self.history_pks = history_pks    # (first, last + 1)
+        self.weekday_weights = weekday_weights
+        self.hour_cum_weights = _cumulative(hour_weights)
+        self.cancel_rate = cancel_rate
+
+    @property
+    def order_count(self):
+        return sum(count for _, count, _ in self.days)
+
+
+def ensure_menu(categories, items_per_category, seed):
+    """Create a menu of the given size unless one exists; return its (id, price) list."""
+    if not MenuItem.objects.exists():
+        rng = random.Random(f'{seed}:menu')
+        created = Category.objects.bulk_create([Category(name=f'Category {n}') for n in range(1, categories + 1)])
+        if created and created[0].pk is None:
+            created = list(Category.objects.order_by('pk'))
+        MenuItem.objects.bulk_create([
+            MenuItem(
+                name=f'{category.name} Dish {n}',
+                description='Generated by seed_restaurant',
+                price=Decimal(rng.randrange(80, 1500, 10)),
+                category=category,
+            )
+            for category in created
+            for n in range(1, items_per_category + 1)
+        ])
+    return list(MenuItem.objects.filter(is_available=True).order_by('pk').values_list('pk', 'price'))
+
+
+def ensure_tables(count):
+    existing = set(Table.objects.values_list('number', flat=True))
+    Table.objects.bulk_create([Table(number=n) for n in range(1, count + 1) if n not in existing])
+    return list(Table.objects.order_by('pk').values_list('pk', flat=True))
+
+
+def ensure_staff(count):
+    """accounts.User rows that sign off generated orders (no usable password)."""
+    from accounts.models import User
+
+    ids = []
+    for n in range(1, count + 1):
+        user, created = User.objects.get_or_create(
+            username=f'seed_staff_{n}',
+            defaults={'email': f'seed_staff_{n}@example.com', 'role': 'staff', 'is_staff': True},
+        )
+        if created:
+            user.set_unusable_password()
+            user.save(update_fields=['password'])
+        ids.append(user.pk)
+    return ids
+
+
+def popularity_weights(item_count, skew, seed):
+    """Zipf weights over a seeded shuffle of the menu (so popularity isn't just menu order)."""
+    ranks = list(range(1, item_count + 1))
+    random.Random(f'{seed}:popularity').shuffle(ranks)
+    return [1.0 / rank ** skew for rank in ranks]
+
+
+def build_plan(days, orders_per_day, seed=42, end=None, skew=1.1, yearly_amplitude=0.15,
+               weekday_weights=WEEKDAY_WEIGHTS, hour_weights=HOUR_WEIGHTS, cancel_rate=0.03,
+               categories=8, items_per_category=12, tables=30, staff=5):
+    """Create the menu, tables and staff if needed and fix per-day volumes and keys.
+
+    History covers the `days` days before `end` (default: today).
+    """
+    if len(weekday_weights) != 7 or len(hour_weights) != 24:
+        raise ValueError('Need 7 weekday weights and 24 hour weights')
+    end = end or timezone.localdate()
+    items = ensure_menu(categories, items_per_category, seed)
+    if not items:
+        raise ValueError('No available menu items to order')
+    table_ids = ensure_tables(tables)
+    staff_ids = ensure_staff(staff)
+
+    first_pk = next_pk = _next_pk(OrderHistory)
+    planned = []
+    for offset in range(days, 0, -1):
+        day = end - timedelta(days=offset)
+        rng = random.Random(f'{seed}:{day.isoformat()}:count')
+        yearly = 1 + yearly_amplitude * math.sin(2 * math.pi * (day.timetuple().tm_yday - 80) / 365.25)
+        volume = orders_per_day * weekday_weights[day.weekday()] / (sum(weekday_weights) / 7) * yearly
+        count = max(0, round(rng.gauss(volume, volume * 0.1)))
+        planned.append((day, count, next_pk))
+        next_pk += count
+
+    return Plan(
+        seed=seed,
+        days=planned,
+        items=items,
+        item_weights=popularity_weights(len(items), skew, seed),
+        table_ids=table_ids,
+        staff_ids=staff_ids,
+        history_pks=(first_pk, next_pk),
+        weekday_weights=tuple(weekday_weights),
+        hour_weights=tuple(hour_weights),
+        cancel_rate=cancel_rate,
+    )
+
+
+def _choice(rng, pairs):
+    values, weights = zip(*pairs)
+    return rng.choices(values, weights=weights)[0]
+
+
+def _draw_order(plan, rng, day):
+    """One order's shape: type, time, lines, total, status path."""
+    hour = bisect.bisect(plan.hour_cum_weights, rng.random() * plan.hour_cum_weights[-1])
+    created_at = timezone.make_aware(
+        datetime.combine(day, time(min(hour, 23), rng.randrange(60), rng.randrange(60))),
+        timezone.get_default_timezone(),
+    )
+    order_type = _choice(rng, ORDER_TYPES)
+    line_count = rng.choices(range(1, len(LINE_COUNT_WEIGHTS) + 1), weights=LINE_COUNT_WEIGHTS)[0]
+    lines = {}
+    for index in rng.choices(range(len(plan.items)), cum_weights=plan.item_cum_weights, k=line_count):
+        item_id, price = plan.items[index]
+        lines[item_id] = (price, lines.get(item_id, (price, 0))[1] + rng.choices((1, 2, 3), weights=(6, 3, 1))[0])
+    total = sum((price * quantity for price, quantity in lines.values()), Decimal('0'))
+    return created_at, order_type, lines, total
+
+
+def _status_times(rng, created_at, statuses):
+    moment = created_at
+    for status in statuses:
+        yield status, moment
+        moment += timedelta(minutes=rng.randint(2, 20))
+
+
+def generate_days(plan, days, batch_size=2000):
+    """Write history for `days` (entries of plan.days). Returns the number of orders written."""
+    written = 0
+    histories, items, payments, logs = [], [], [], []
+
+    def flush():
+        with transaction.atomic():
+            OrderHistory.objects.bulk_create(histories, batch_size=batch_size)
+            OrderHistoryItem.objects.bulk_create(items, batch_size=batch_size)
+            OrderHistoryPayment.objects.bulk_create(payments, batch_size=batch_size)
+            OrderHistoryStatus.objects.bulk_create(logs, batch_size=batch_size)
+        for rows in (histories, items, payments, logs):
+            rows.clear()
+
+    with backdating(OrderHistoryPayment, OrderHistoryStatus):
+        for day, count, first_pk in days:
+            rng = random.Random(f'{plan.seed}:{day.isoformat()}')
+            for pk in range(first_pk, first_pk + count):
+                created_at, order_type, lines, total = _draw_order(plan, rng, day)
+                cancelled = rng.random() < plan.cancel_rate
+                flow = FLOW[order_type]
+                statuses = flow[:rng.randint(1, len(flow) - 1)] + ('cancelled',) if cancelled else flow
+                timeline = list(_status_times(rng, created_at, statuses))
+                staff_id = rng.choice(plan.staff_ids)
+                method = _choice(rng, PAYMENT_METHODS)
+                delivery_charge = DELIVERY_CHARGE if order_type == 'delivery' else Decimal('0')
+                histories.append(OrderHistory(
+                    pk=pk,
+                    order_id=synthetic_order_id(pk),
+                    table_id=rng.choice(plan.table_ids) if order_type == 'table' and plan.table_ids else None,
+                    customer_name=f'Customer {rng.randint(1, 20000)}',
+                    customer_phone=f'98{rng.randint(10000000, 99999999)}',
+                    order_type=order_type,
+                    status=timeline[-1][0],
+                    payment_method=method,
+                    created_at=created_at,
+                    updated_at=timeline[-1][1],
+                    special_notes='',
+                    delivery_address='Generated address' if order_type == 'delivery' else None,
+                    cancellation_reason='Customer changed their mind' if cancelled else None,
+                    total_amount=total,
+                    delivery_charge=delivery_charge,
+                    completed_by_id=staff_id,
+                ))
+                items.extend(
+                    OrderHistoryItem(order_history_id=pk, item_id=item_id, quantity=quantity, price=price)
+                    for item_id, (price, quantity) in lines.items()
+                )
+                if not cancelled:
+                    payments.append(OrderHistoryPayment(
+                        order_history_id=pk, payment_method=method, amount=total + delivery_charge,
+                        date_added=timeline[-1][1],
+                    ))
+                logs.extend(
+                    OrderHistoryStatus(order_history_id=pk, previous_status=previous, new_status=status,
+                                       changed_by_id=staff_id, timestamp=moment)
+                    for (previous, _), (status, moment) in zip(timeline, timeline[1:])
+                )
+                written += 1
+                if len(histories) >= batch_size:
+                    flush()
+        if histories:
+            flush()
+    return written
+
+
+def generate_active_orders(plan, count, batch_size=2000):
+    """Today's open orders (Order, items, part payments, status logs). Returns the count."""
+    if count <= 0:
+        return 0
+    rng = random.Random(f'{plan.seed}:active')
+    today = timezone.localdate()
+    now = timezone.now()
+    first_pk = _next_pk(Order)
+    orders, items, payments, logs = [], [], [], []
+    for pk in range(first_pk, first_pk + count):
+        created_at, order_type, lines, total = _draw_order(plan, rng, today)
+        created_at = min(created_at, now - timedelta(minutes=rng.randint(1, 90)))
+        status = rng.choice(ACTIVE_STATUSES)
+        flow = ('pending', 'preparing', 'ready', 'served')
+        timeline = list(_status_times(rng, created_at, flow[:flow.index(status) + 1]))
+        staff_id = rng.choice(plan.staff_ids)
+        paid = (total / 2).quantize(Decimal('0.01')) if rng.random() < 0.3 else Decimal('0')
+        orders.append(Order(
+            pk=pk,
+            order_id=synthetic_order_id(pk),
+            customer_name=f'Customer {rng.randint(1, 20000)}',
+            customer_phone=f'98{rng.randint(10000000, 99999999)}',
+            order_type='table',
+            table_id=rng.choice(plan.table_ids) if plan.table_ids else None,
+            status=status,
+            total_amount=total,
+            paid_amount=paid,
+            item_count=len(lines),
+            created_by_id=staff_id,
+            created_at=created_at,
+            updated_at=timeline[-1][1],
+        ))
+        items.extend(
+            OrderItem(order_id=pk, item_id=item_id, quantity=quantity, price=price)
+            for item_id, (price, quantity) in lines.items()
+        )
+        if paid:
+            payments.append(Payment(order_id=pk, payment_method='cash', amount=paid, edited_by_id=staff_id,
+                                    date_edited=created_at))
+        logs.extend(
+            OrderStatusLog(order_id=pk, previous_status=previous, new_status=new, changed_by_id=staff_id,
+                           timestamp=moment)
+            for (previous, _), (new, moment) in zip(timeline, timeline[1:])
+        )
+    with backdating(Order, Payment, OrderStatusLog), transaction.atomic():
+        # Totals are set directly above; bulk_create sends no signals to redo them
+        Order.objects.bulk_create(orders, batch_size=batch_size)
+        OrderItem.objects.bulk_create(items, batch_size=batch_size)
+        Payment.objects.bulk_create(payments, batch_size=batch_size)
+        OrderStatusLog.objects.bulk_create(logs, batch_size=batch_size)
+    return count
+
+
+def prepare(plan):
+    """Before generating: give every generated month its own history partition (Postgres)."""
+    history_partitions.create_partitions({day for day, _, _ in plan.days})
+
+
+def finish():
+    """After generating: reset sequences and rebuild counters derived from history."""
+    statements = connection.ops.sequence_reset_sql(no_style(), [Order, OrderHistory])
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+    drifted = menu_counters.find_drift()
+    with transaction.atomic():
+        menu_counters.repair(drifted)
+    menu_ranking.refresh_rankings()
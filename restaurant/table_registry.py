@@ -0,0 +1,113 @@
+"""
+In-process snapshot of the restaurant's tables.
+
+Tables change rarely (a few edits a year) but are read on almost every page:
+the table list, the dashboard's active-table count, the place-order screen
+and the `add_valid_table_id` context processor. Instead of querying `Table`
+each time, we keep one immutable snapshot per process and rebuild it lazily
+after a `Table` save/delete (see `restaurant.signals`).
+
+Each worker process has its own snapshot, so edits made through another
+worker are picked up after `TABLE_REGISTRY_TTL` seconds at the latest.
+"""
+
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Table
+
+DEFAULT_TTL = 300
+
+TableEntry = namedtuple('TableEntry', ['id', 'number', 'capacity', 'is_occupied'])
+
+_lock = threading.Lock()
+_snapshot = None
+
+
+class TableSnapshot:
+    """Immutable view of all tables, ordered by primary key."""
+
+    def __init__(self, entries, db_alias):
+        self.entries = tuple(entries)
+        self.by_id = {entry.id: entry for entry in self.entries}
+        self.ids = frozenset(self.by_id)
+        self.db_alias = db_alias
+        self.loaded_at = time.monotonic()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def is_expired(self):
+        ttl = getattr(settings, 'TABLE_REGISTRY_TTL', DEFAULT_TTL)
+        return ttl is not None and time.monotonic() - self.loaded_at > ttl
+
+    def first_id(self):
+        return self.entries[0].id if self.entries else None
+
+    def to_instance(self, entry):
+        """Build a `Table` model instance from a snapshot entry without a query."""
+        return Table.from_db(self.db_alias, TableEntry._fields, tuple(entry))
+
+
+def _load_snapshot():
+    qs = Table.objects.order_by('id').values_list(*TableEntry._fields)
+    return TableSnapshot((TableEntry(*row) for row in qs), qs.db)
+
+
+def get_table_snapshot():
+    """Return the current table snapshot, loading it if missing or stale."""
+    global _snapshot
+    snapshot = _snapshot
+    if snapshot is None or snapshot.is_expired():
+        with _lock:
+            snapshot = _snapshot
+            if snapshot is None or snapshot.is_expired():
+                snapshot = _load_snapshot()
+                _snapshot = snapshot
+    return snapshot
+
+
+def invalidate_table_registry():
+    """Drop the snapshot now and again once the surrounding transaction commits.
+
+    The second drop prevents another thread from caching rows it read
+    before the writing transaction was committed.
+    """
+    global _snapshot
+    _snapshot = None
+
+    def _drop():
+        global _snapshot
+        _snapshot = None
+
+    transaction.on_commit(_drop)
+
+
+def first_table_id():
+    """Primary key of the first table, or None when no tables exist."""
+    return get_table_snapshot().first_id()
+
+
+def get_table(table_id):
+    """Return a `Table` instance for `table_id` from the snapshot, or None."""
+    snapshot = get_table_snapshot()
+    try:
+        entry = snapshot.by_id.get(int(table_id))
+    except (TypeError, ValueError):
+        return None
+    return snapshot.to_instance(entry) if entry else None
+
+
+def get_tables():
+    """Return fresh `Table` instances for every table (safe to mutate)."""
+    snapshot = get_table_snapshot()
+    return [snapshot.to_instance(entry) for entry in snapshot.entries]
+
+
+def count_existing(table_ids):
+    """How many of `table_ids` refer to tables that still exist."""
+    return len(get_table_snapshot().ids.intersection(table_ids))
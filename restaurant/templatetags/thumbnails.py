@@ -0,0 +1,46 @@
+from django import template
+from django.core.files.storage import default_storage
+from django.utils.html import format_html
+
+from restaurant import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def image_srcset(name, fmt='webp'):
+    """srcset value for an uploaded image name, e.g. `srcset="{% image_srcset item.image_name %}"`."""
+    return thumbnails.srcset(getattr(name, 'name', name), fmt)
+
+
+@register.simple_tag
+def thumbnail_url(name, width=320, fmt='jpeg'):
+    """URL of a single resized variant at least `width` pixels wide."""
+    return thumbnails.url(getattr(name, 'name', name), int(width), fmt)
+
+
+@register.simple_tag
+def responsive_image(name, alt='', sizes='100vw', css_class='', loading='lazy'):
+    """<picture> with WebP and JPEG srcsets; falls back to the original upload if no variants exist.
+
+    `name` is an image name (`item.image_name`) or an ImageField file (`item.image`).
+    """
+    name = getattr(name, 'name', name)
+    if not name:
+        return ''
+    manifest = thumbnails.get_manifest(name)
+    if not manifest:
+        return format_html(
+            '<img src="{}" alt="{}" class="{}" loading="{}">',
+            default_storage.url(name), alt, css_class, loading,
+        )
+    largest = manifest['variants'][-1]
+    return format_html(
+        '<picture>'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" alt="{}" class="{}" loading="{}">'
+        '</picture>',
+        thumbnails.srcset(name, thumbnails.WEBP), sizes,
+        thumbnails.url(name, 320, thumbnails.JPEG), thumbnails.srcset(name, thumbnails.JPEG), sizes,
+        largest['width'], largest['height'], alt, css_class, loading,
+    )
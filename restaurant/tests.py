@@ -0,0 +1,485 @@
+import json
+import re
+import tempfile
+from decimal import Decimal
+from io import BytesIO
+from pathlib import Path
+from unittest import mock, skipUnless
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from PIL import Image
+
+from accounts.models import User
+
+from . import history_export, history_partitions, history_search, menu_catalog, order_status, order_totals, pricing, public_menu, table_registry, thumbnails
+from .history_queries import filter_order_history
+from .models import (
+    Category, MenuItem, Order, OrderHistory, OrderHistoryItem, OrderItem, OrderStatusLog, Payment, Table,
+)
+from .views import OrderListView
+
+_PARTITION_RE = re.compile(r'\b(restaurant_orderhistory_(?:p\d{6}|default))\b')
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Order history is only partitioned on Postgres')
+class OrderHistoryPartitionPruningTests(TestCase):
+    def scanned_partitions(self, queryset):
+        return set(_PARTITION_RE.findall(queryset.explain()))
+
+    def test_table_is_partitioned_by_month(self):
+        self.assertTrue(history_partitions.is_partitioned())
+        this_month = history_partitions.month_start(timezone.now())
+        self.assertIn(this_month, history_partitions.list_partitions())
+
+    def test_date_range_only_scans_matching_month(self):
+        today = timezone.localdate().isoformat()
+        queryset = filter_order_history({'start_date': today, 'end_date': today})
+
+        this_month = history_partitions.month_start(timezone.now())
+        self.assertEqual(self.scanned_partitions(queryset), {history_partitions.partition_name(this_month)})
+
+    def test_unfiltered_listing_scans_every_partition(self):
+        # Guards the test above: the regex must see partitions when nothing is pruned
+        scanned = self.scanned_partitions(filter_order_history({}))
+        self.assertEqual(len(scanned), len(history_partitions.list_partitions()) + 1)
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class OrderListViewQueryCountTests(TestCase):
+    # Session, user and one page of orders with the table and creator joined;
+    # none of it may depend on the number of orders or their items and payments
+    QUERIES = 3
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('manager', 'manager@example.com', 'secret')
+        category = Category.objects.create(name='Mains')
+        cls.items = [MenuItem.objects.create(name=f'Dish {n}', price=Decimal('10'), category=category) for n in range(3)]
+        cls.table = Table.objects.create(number=1)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        # The rollback after each test sends no signals; don't leave its rows in the process caches
+        self.addCleanup(table_registry.invalidate_table_registry)
+        self.addCleanup(menu_catalog.invalidate_menu_catalog)
+
+    def add_orders(self, count):
+        for _ in range(count):
+            order = Order.objects.create(
+                customer_name='Guest', order_type='table', table=self.table, created_by=self.user,
+            )
+            pricing.add_items(order, [(item.pk, 2) for item in self.items])
+            Payment.objects.create(order=order, payment_method='cash', amount=Decimal('5'))
+
+    def test_query_count_does_not_grow_with_orders(self):
+        self.add_orders(3)
+        # Warm the per-process caches (menu catalog, table registry) first
+        self.client.get(reverse('restaurant:order_list'))
+        with self.assertNumQueries(self.QUERIES):
+            response = self.client.get(reverse('restaurant:order_list'))
+        self.assertEqual(len(response.context['orders']), 3)
+        order = response.context['orders'][0]
+        self.assertEqual((order.item_count, order.paid_amount), (3, Decimal('5')))
+
+        self.add_orders(60)
+        with self.assertNumQueries(self.QUERIES):
+            response = self.client.get(reverse('restaurant:order_list'))
+        # One keyset page, with the running totals read off the order rows
+        self.assertEqual(len(response.context['orders']), OrderListView.keyset_page_size)
+
+
+class OrderStatusIdempotencyTests(TestCase):
+    def setUp(self):
+        self.first = Order.objects.create(customer_name='First', order_type='takeaway')
+        self.second = Order.objects.create(customer_name='Second', order_type='takeaway')
+
+    def test_key_reused_on_another_archived_order_is_a_new_request(self):
+        cancelled = order_status.transition(self.first.pk, 'cancelled', idempotency_key='tablet-1')
+        self.assertTrue(cancelled.archived)
+
+        result = order_status.transition(self.second.pk, 'preparing', idempotency_key='tablet-1')
+
+        self.assertFalse(result.replayed)
+        self.assertEqual((result.order_id, result.status), (self.second.order_id, 'preparing'))
+        self.second.refresh_from_db()
+        self.assertEqual(self.second.status, 'preparing')
+
+    def test_key_reused_on_another_live_order_is_a_new_request(self):
+        order_status.transition(self.first.pk, 'preparing', idempotency_key='tablet-1')
+        result = order_status.transition(self.second.pk, 'preparing', idempotency_key='tablet-1')
+        self.assertTrue(result.changed)
+        self.assertFalse(result.replayed)
+
+    def test_retry_on_a_live_order_returns_the_first_outcome(self):
+        first = order_status.transition(self.first.pk, 'preparing', idempotency_key='tablet-1')
+        # The retry arrives after someone else moved the order on
+        order_status.transition(self.first.pk, 'ready_to_pickup')
+
+        retry = order_status.transition(self.first.pk, 'preparing', idempotency_key='tablet-1')
+
+        self.assertTrue(retry.replayed)
+        self.assertFalse(retry.changed)
+        self.assertEqual((retry.status, retry.previous), (first.status, first.previous))
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.status, 'ready_to_pickup')
+
+    def test_retry_on_an_archived_order_returns_the_first_outcome(self):
+        order_status.transition(self.first.pk, 'cancelled', idempotency_key='tablet-1', reason='Left')
+
+        retry = order_status.transition(self.first.pk, 'cancelled', idempotency_key='tablet-1')
+
+        self.assertTrue(retry.replayed)
+        self.assertTrue(retry.archived)
+        self.assertEqual((retry.order_id, retry.status), (self.first.order_id, 'cancelled'))
+        self.assertEqual(OrderHistory.objects.filter(order_id=self.first.order_id).count(), 1)
+
+
+class OrderStatusTransitionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Mains')
+        cls.momo = MenuItem.objects.create(name='Momo', price=Decimal('4.50'), category=category)
+
+    def setUp(self):
+        self.order = Order.objects.create(customer_name='Guest', order_type='takeaway')
+        pricing.add_items(self.order, [(self.momo.pk, 2)])
+
+    def assertRejected(self, code, status, **kwargs):
+        with self.assertRaises(order_status.TransitionError) as raised:
+            order_status.transition(self.order.pk, status, **kwargs)
+        self.assertEqual(raised.exception.code, code)
+        return raised.exception
+
+    def test_status_of_another_order_type_is_invalid(self):
+        self.assertRejected('invalid', 'on_the_way')
+        self.assertRejected('invalid', 'no-such-status')
+
+    def test_completing_needs_settled_payments(self):
+        self.assertRejected('unsettled', 'completed')
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'pending')
+
+        Payment.objects.create(order=self.order, payment_method='cash', amount=Decimal('9'))
+        result = order_status.transition(self.order.pk, 'completed')
+        self.assertTrue(result.archived)
+        self.assertFalse(Order.objects.filter(pk=self.order.pk).exists())
+
+    def test_cancelling_a_paid_order_is_refused(self):
+        Payment.objects.create(order=self.order, payment_method='cash', amount=Decimal('1'))
+        self.assertRejected('paid', 'cancelled')
+
+    def test_final_status_cannot_be_left(self):
+        order_status.transition(self.order.pk, 'cancelled', archive=False)
+        self.assertRejected('final', 'preparing')
+
+    def test_archived_order_is_not_found(self):
+        order_status.transition(self.order.pk, 'cancelled')
+        self.assertRejected('not_found', 'preparing')
+
+    def test_aliases_and_same_status(self):
+        result = order_status.transition(self.order.pk, 'ready')
+        self.assertEqual((result.status, result.previous), ('ready_to_pickup', 'pending'))
+
+        again = order_status.transition(self.order.pk, 'ready_to_pickup')
+        self.assertFalse(again.changed)
+        self.assertEqual(OrderStatusLog.objects.filter(order=self.order).count(), 1)
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class PublicMenuThumbnailTests(TestCase):
+    def setUp(self):
+        media_root = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(MEDIA_ROOT=media_root, THUMBNAIL_WIDTHS=(160,)))
+        for invalidate in (thumbnails.forget, menu_catalog.invalidate_menu_catalog, public_menu.invalidate_public_menu):
+            self.addCleanup(invalidate)
+        upload = BytesIO()
+        Image.new('RGB', (400, 300), 'white').save(upload, 'JPEG')
+        category = Category.objects.create(name='Mains')
+        self.item = MenuItem.objects.create(
+            name='Momo', price=Decimal('5'), category=category,
+            image=SimpleUploadedFile('momo.jpg', upload.getvalue(), content_type='image/jpeg'),
+        )
+
+    def html(self):
+        return public_menu.get_public_menu().representations[public_menu.HTML].bodies[public_menu.IDENTITY]
+
+    def test_menu_rendered_before_the_thumbnails_is_rendered_again(self):
+        self.assertNotIn(b'thumbs/', self.html())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertIsNotNone(thumbnails.create(self.item.image.name))
+
+        self.assertIn(b'thumbs/', self.html())
+
+    def test_other_workers_render_again_on_the_shared_version(self):
+        self.assertNotIn(b'thumbs/', self.html())
+        # Another worker makes the variants; this one still remembers the miss
+        with mock.patch.dict(thumbnails._manifests), mock.patch.dict(thumbnails._missing):
+            thumbnails.generate(self.item.image.name)
+        self.assertNotIn(b'thumbs/', self.html())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            menu_catalog.invalidate_menu_catalog()
+
+        self.assertIn(b'thumbs/', self.html())
+
+
+class HistoryExportTests(TestCase):
+    def setUp(self):
+        self.root = self.enterContext(tempfile.TemporaryDirectory())
+        category = Category.objects.create(name='Mains')
+        self.item = MenuItem.objects.create(name='Momo', price=Decimal('5'), category=category)
+
+    def archive(self, **fields):
+        now = timezone.now()
+        history = OrderHistory.objects.create(order_id='A1B2C3D4', created_at=now, updated_at=now, **fields)
+        OrderHistoryItem.objects.create(order_history=history, item=self.item, quantity=1, price=Decimal('5'))
+        return history
+
+    def export(self, **kwargs):
+        return history_export.export_history(fmt='csv', root=self.root, **kwargs)
+
+    def test_archive_committed_below_the_watermark_is_exported_once(self):
+        first = self.archive()
+        self.archive(id=first.id + 100)
+        self.export()
+        # A transaction that took its id before the export committed after it
+        self.archive(id=first.id + 50)
+
+        summary = self.export()
+
+        self.assertEqual(summary['exported'], {'orders': 1, 'items': 1, 'payments': 0})
+        self.assertEqual(self.export()['exported'], {'orders': 0, 'items': 0, 'payments': 0})
+        self.assertEqual(history_export.read_watermark(Path(self.root))['rows']['orders'], 3)
+
+    def test_max_chunks_leaves_the_rest_for_the_next_run(self):
+        for _ in range(3):
+            self.archive()
+
+        summary = self.export(chunk_size=2, max_chunks=1)
+        self.assertEqual((summary['exported']['orders'], summary['complete']), (2, False))
+
+        summary = self.export(chunk_size=2, max_chunks=1)
+        self.assertEqual((summary['exported']['orders'], summary['complete']), (1, False))
+        self.assertTrue(self.export(chunk_size=2, max_chunks=1)['complete'])
+
+
+@skipUnless(connection.vendor == 'sqlite', 'The FTS5 index is SQLite-only')
+class HistorySearchIndexTests(TestCase):
+    def setUp(self):
+        history_search.forget_index_state()
+        self.addCleanup(history_search.forget_index_state)
+
+    def test_index_check_is_remembered(self):
+        self.assertTrue(history_search.search_index_available())
+        with self.assertNumQueries(0):
+            self.assertTrue(history_search.search_index_available())
+
+    def test_sqlite_without_trigram_tokenizer_is_left_alone(self):
+        with mock.patch.object(connection.Database, 'sqlite_version_info', (3, 31, 1)):
+            self.assertIsNone(history_search.rebuild_index())
+        self.assertTrue(history_search.search_index_available())
+
+
+class PricingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Mains')
+        cls.momo = MenuItem.objects.create(name='Momo', price=Decimal('4.50'), category=category)
+        cls.tea = MenuItem.objects.create(name='Tea', price=Decimal('1.25'), category=category)
+
+    def setUp(self):
+        self.order = Order.objects.create(customer_name='Guest', order_type='takeaway')
+
+    def stored_total(self):
+        return Order.objects.values_list('total_amount', flat=True).get(pk=self.order.pk)
+
+    def test_add_items_prices_lines_at_menu_prices(self):
+        total = pricing.add_items(self.order, [(self.momo.pk, 2), (self.tea.pk, 3), (0, 1)])
+
+        self.assertEqual(total, Decimal('12.75'))
+        self.assertEqual((self.order.total_amount, self.stored_total()), (total, total))
+        # Unknown menu items are skipped
+        self.assertEqual(self.order.items.count(), 2)
+
+    def test_line_price_is_kept_when_the_menu_price_changes(self):
+        pricing.add_items(self.order, [(self.momo.pk, 2)])
+        MenuItem.objects.filter(pk=self.momo.pk).update(price=Decimal('9'))
+
+        self.assertEqual(pricing.recalculate_total(self.order), Decimal('9.00'))
+
+    def test_quantity_changes_and_removal_recompute_the_total(self):
+        order_item, total = pricing.set_item(self.order, self.momo, 1)
+        self.assertEqual(total, Decimal('4.50'))
+        _, total = pricing.set_item(self.order, self.momo, 3)
+        self.assertEqual(total, Decimal('13.50'))
+        self.assertEqual(self.order.items.count(), 1)
+
+        self.assertEqual(pricing.update_item_quantity(self.order, order_item, 2), Decimal('9.00'))
+        tea = OrderItem.objects.create(order=self.order, item=self.tea, quantity=4, price=self.tea.price)
+        self.assertEqual(pricing.update_quantities(self.order, {order_item.pk: 1, tea.pk: 2}), Decimal('7.00'))
+        self.assertEqual(pricing.remove_item(self.order, order_item), Decimal('2.50'))
+        self.assertEqual(self.stored_total(), Decimal('2.50'))
+
+    def test_stale_instance_does_not_overwrite_the_total(self):
+        stale = Order.objects.get(pk=self.order.pk)
+        pricing.add_items(self.order, [(self.momo.pk, 1)])
+
+        self.assertEqual(pricing.add_items(stale, [(self.tea.pk, 2)]), Decimal('7.00'))
+        self.assertEqual(self.stored_total(), Decimal('7.00'))
+
+
+class OrderRunningTotalsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Mains')
+        cls.momo = MenuItem.objects.create(name='Momo', price=Decimal('4.50'), category=category)
+        cls.tea = MenuItem.objects.create(name='Tea', price=Decimal('1.25'), category=category)
+
+    def setUp(self):
+        self.order = Order.objects.create(customer_name='Guest', order_type='takeaway')
+
+    def totals(self):
+        return Order.objects.values_list('item_count', 'paid_amount').get(pk=self.order.pk)
+
+    def test_item_count_follows_added_and_removed_lines(self):
+        pricing.add_items(self.order, [(self.momo.pk, 2), (self.tea.pk, 1)])
+        self.assertEqual(self.totals()[0], 2)
+        order_item, _ = pricing.set_item(self.order, self.tea, 5)
+        self.assertEqual(self.totals()[0], 2)
+
+        pricing.remove_item(self.order, order_item)
+        self.assertEqual(self.totals()[0], 1)
+        self.assertEqual(order_totals.find_drift(), [])
+
+    def test_paid_amount_follows_payments(self):
+        cash = Payment.objects.create(order=self.order, payment_method='cash', amount=Decimal('5'))
+        Payment.objects.create(order=self.order, payment_method='card', amount=Decimal('2.50'))
+        self.assertEqual(self.totals()[1], Decimal('7.50'))
+
+        cash.amount = Decimal('3')
+        cash.save()
+        self.assertEqual(self.totals()[1], Decimal('5.50'))
+        cash.delete()
+        self.assertEqual(self.totals()[1], Decimal('2.50'))
+        self.assertEqual(order_totals.find_drift(), [])
+
+    def test_stale_order_instance_does_not_overwrite_increments(self):
+        stale = Order.objects.get(pk=self.order.pk)
+        Payment.objects.create(order=self.order, payment_method='cash', amount=Decimal('5'))
+        pricing.add_items(stale, [(self.momo.pk, 1)])
+        Payment.objects.create(order=stale, payment_method='cash', amount=Decimal('1'))
+
+        self.assertEqual(self.totals(), (1, Decimal('6')))
+
+    def test_repair_fixes_drifted_totals(self):
+        pricing.add_items(self.order, [(self.momo.pk, 2)])
+        Payment.objects.create(order=self.order, payment_method='cash', amount=Decimal('5'))
+        Order.objects.filter(pk=self.order.pk).update(item_count=7, paid_amount=Decimal('0'))
+        self.assertEqual([drift['pk'] for drift in order_totals.find_drift()], [self.order.pk])
+
+        self.assertEqual(order_totals.repair([self.order.pk]), 1)
+        self.assertEqual(self.totals(), (1, Decimal('5')))
+
+
+class OrderVersionTests(TestCase):
+    def setUp(self):
+        self.order = Order.objects.create(customer_name='Guest', order_type='takeaway')
+
+    def test_stale_version_is_a_conflict(self):
+        result = order_status.transition(self.order.pk, 'preparing', version=0)
+        self.assertEqual(result.version, 1)
+
+        with self.assertRaises(order_status.TransitionError) as raised:
+            order_status.transition(self.order.pk, 'ready', version=0)
+        self.assertEqual(raised.exception.code, 'conflict')
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.status, self.order.version), ('preparing', 1))
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class KitchenBatchStatusTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('chef', 'chef@example.com', 'secret')
+        category = Category.objects.create(name='Mains')
+        cls.momo = MenuItem.objects.create(name='Momo', price=Decimal('4.50'), category=category)
+        cls.table = Table.objects.create(number=1)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def order(self, order_type='table', paid=False):
+        order = Order.objects.create(
+            customer_name='Guest', order_type=order_type, status='preparing',
+            table=self.table if order_type == 'table' else None,
+        )
+        pricing.add_items(order, [(self.momo.pk, 1)])
+        if paid:
+            Payment.objects.create(order=order, payment_method='cash', amount=Decimal('4.50'))
+        return order
+
+    def post(self, changes, key=None):
+        headers = {'HTTP_IDEMPOTENCY_KEY': key} if key else {}
+        return self.client.post(
+            reverse('restaurant:kitchen_update_order_status_batch'),
+            json.dumps({'changes': changes}), content_type='application/json', **headers,
+        )
+
+    def test_each_change_gets_its_own_result(self):
+        table, takeaway, paid, unpaid = self.order(), self.order('takeaway'), self.order(paid=True), self.order()
+        response = self.post([
+            {'order_id': table.pk, 'status': 'ready', 'version': 0},
+            {'order_id': takeaway.pk, 'status': 'ready'},
+            {'order_id': paid.pk, 'status': 'completed', 'version': 0},
+            {'order_id': unpaid.pk, 'status': 'completed'},
+            {'order_id': table.pk, 'status': 'served'},
+            {'order_id': 0, 'status': 'ready'},
+        ])
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertFalse(data['success'])
+        results = data['results']
+        self.assertEqual([result['order_id'] for result in results], [table.pk, takeaway.pk, paid.pk, unpaid.pk, table.pk, 0])
+        self.assertEqual(results[0], {
+            'order_id': table.pk, 'success': True, 'status': 'ready', 'version': 1, 'archived': False,
+        })
+        self.assertEqual(results[1]['status'], 'ready_to_pickup')
+        self.assertTrue(results[2]['archived'])
+        self.assertEqual([result.get('code') for result in results[3:]], ['unsettled', 'invalid', 'not_found'])
+        self.assertFalse(Order.objects.filter(pk=paid.pk).exists())
+        self.assertEqual(Order.objects.get(pk=unpaid.pk).status, 'preparing')
+
+    def test_stale_version_fails_only_its_own_change(self):
+        stale, fresh = self.order(), self.order()
+        order_status.transition(stale.pk, 'ready')
+
+        results = self.post([
+            {'order_id': stale.pk, 'status': 'served', 'version': 0},
+            {'order_id': fresh.pk, 'status': 'ready', 'version': 0},
+        ]).json()['results']
+
+        self.assertEqual([result['success'] for result in results], [False, True])
+        self.assertEqual(results[0]['code'], 'conflict')
+
+    def test_retried_batch_replays_live_and_archived_orders(self):
+        live, done = self.order(), self.order(paid=True)
+        changes = [{'order_id': live.pk, 'status': 'ready'}, {'order_id': done.pk, 'status': 'completed'}]
+        first = self.post(changes, key='board-1').json()['results']
+
+        retry = self.post(changes, key='board-1').json()['results']
+
+        # An archived order has no version left to report
+        self.assertEqual(retry, [first[0], {**first[1], 'version': None}])
+        self.assertEqual(OrderStatusLog.objects.filter(order=live).count(), 1)
+
+    def test_malformed_batches_are_rejected(self):
+        self.assertEqual(self.post([]).status_code, 400)
+        self.assertEqual(self.post([{'order_id': 'x', 'status': 'ready'}]).status_code, 400)
+        self.assertEqual(self.post([{'order_id': 1, 'status': 'ready', 'version': True}]).status_code, 400)
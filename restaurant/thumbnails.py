@@ -0,0 +1,210 @@
+"""
+Resized, metadata-free variants of menu item images.
+
+Phone uploads are often several megabytes; menus only need a few hundred
+pixels. For every uploaded image we write WebP and JPEG copies at the
+widths in `THUMBNAIL_WIDTHS` (never wider than the original) to the media
+storage under `thumbs/`, plus a small JSON manifest listing them. Variants
+are made right after upload (see `restaurant.signals`) or in bulk by
+`manage.py backfill_thumbnails`, never while a page renders: until an image
+has its manifest, templates fall back to the original upload.
+
+EXIF orientation is applied to the pixels and then all metadata (EXIF, GPS,
+ICC, comments) is dropped, since Pillow only writes what it is given.
+"""
+
+import json
+import logging
+import posixpath
+import time
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WIDTHS = (160, 320, 640, 1024)
+WEBP = 'webp'
+JPEG = 'jpeg'
+FORMATS = {
+    WEBP: {'ext': 'webp', 'pil': 'WEBP', 'content_type': 'image/webp', 'options': {'quality': 80, 'method': 6}},
+    JPEG: {'ext': 'jpg', 'pil': 'JPEG', 'content_type': 'image/jpeg',
+           'options': {'quality': 82, 'optimize': True, 'progressive': True}},
+}
+PREFIX = 'thumbs'
+MANIFEST_VERSION = 1
+
+# Seconds a missing manifest is remembered before storage is checked again
+MISSING_TTL = 60
+
+# image name -> manifest dict
+_manifests = {}
+# image name -> time.monotonic() of the last lookup that found no manifest
+_missing = {}
+
+
+def widths():
+    return tuple(sorted(getattr(settings, 'THUMBNAIL_WIDTHS', DEFAULT_WIDTHS)))
+
+
+def _stem(name):
+    return posixpath.join(PREFIX, posixpath.splitext(name)[0])
+
+
+def manifest_name(name):
+    return f'{_stem(name)}.json'
+
+
+def variant_name(name, width, fmt):
+    return f"{_stem(name)}-{width}w.{FORMATS[fmt]['ext']}"
+
+
+def _flatten(image, fmt):
+    """Convert to a mode the target format can store, keeping alpha for WebP."""
+    if fmt == WEBP:
+        return image.convert('RGBA' if 'A' in image.getbands() or image.mode == 'P' else 'RGB')
+    if 'A' in image.getbands() or image.mode == 'P':
+        rgba = image.convert('RGBA')
+        background = Image.new('RGB', rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def generate(name, storage=None, force=False):
+    """Write every variant of image `name` and its manifest; return the manifest.
+
+    Existing variants are kept unless `force`. Raises OSError (or a Pillow
+    error) if the original can't be read.
+    """
+    storage = storage or default_storage
+    if not force and storage.exists(manifest_name(name)):
+        return load_manifest(name, storage)
+
+    with storage.open(name, 'rb') as handle:
+        original = Image.open(handle)
+        original.load()
+    original = ImageOps.exif_transpose(original)
+    source_width, source_height = original.size
+
+    # Configured widths below the original, plus the original width itself
+    # when it falls short of the largest one (nothing is ever upscaled)
+    targets = [w for w in widths() if w < source_width]
+    if source_width <= widths()[-1]:
+        targets.append(source_width)
+    manifest = {'version': MANIFEST_VERSION, 'source': name, 'width': source_width,
+                'height': source_height, 'variants': []}
+    for width in targets:
+        height = max(1, round(source_height * width / source_width))
+        resized = original.resize((width, height), Image.LANCZOS) if width != source_width else original
+        entry = {'width': width, 'height': height}
+        for fmt, spec in FORMATS.items():
+            buffer = BytesIO()
+            # No exif=/icc_profile= arguments: the copy carries no metadata
+            _flatten(resized, fmt).save(buffer, format=spec['pil'], **spec['options'])
+            target = variant_name(name, width, fmt)
+            if storage.exists(target):
+                storage.delete(target)
+            entry[fmt] = storage.save(target, ContentFile(buffer.getvalue()))
+        manifest['variants'].append(entry)
+
+    target = manifest_name(name)
+    if storage.exists(target):
+        storage.delete(target)
+    storage.save(target, ContentFile(json.dumps(manifest).encode('utf-8')))
+    _manifests[name] = manifest
+    _missing.pop(name, None)
+    return manifest
+
+
+def load_manifest(name, storage=None):
+    storage = storage or default_storage
+    with storage.open(manifest_name(name), 'rb') as handle:
+        manifest = json.loads(handle.read().decode('utf-8'))
+    _manifests[name] = manifest
+    _missing.pop(name, None)
+    return manifest
+
+
+def create(name):
+    """Generate the variants of a new upload; returns the manifest, or None on failure."""
+    try:
+        manifest = generate(name)
+    except Exception as e:
+        # Missing or unreadable original: templates keep using the original URL
+        logger.warning('Could not create thumbnails for %s: %s', name, e)
+        return None
+    published()
+    return manifest
+
+
+def published():
+    """Re-render pages built ahead of time with the original URLs (the public menu).
+
+    Bumps the shared menu catalog version, so every worker renders again,
+    not just this one.
+    """
+    from . import menu_catalog, public_menu
+
+    menu_catalog.invalidate_menu_catalog()
+    public_menu.invalidate_public_menu()
+
+
+def get_manifest(name):
+    """Manifest for image `name` if its variants exist, else None. Never resizes.
+
+    A miss is remembered for MISSING_TTL seconds, so pages do not hit the
+    storage on every render and variants made later (backfill, another
+    worker) are still picked up.
+    """
+    if not name:
+        return None
+    manifest = _manifests.get(name)
+    if manifest is not None:
+        return manifest
+    checked = _missing.get(name)
+    if checked is not None and time.monotonic() - checked < MISSING_TTL:
+        return None
+    try:
+        return load_manifest(name)
+    except (OSError, ValueError):
+        _missing[name] = time.monotonic()
+        return None
+
+
+def srcset(name, fmt=WEBP):
+    """`srcset` attribute value ("<url> 160w, <url> 320w, ...") for image `name`."""
+    manifest = get_manifest(name)
+    if not manifest:
+        return ''
+    return ', '.join(
+        f"{default_storage.url(entry[fmt])} {entry['width']}w" for entry in manifest['variants']
+    )
+
+
+def url(name, width, fmt=JPEG):
+    """URL of the smallest variant at least `width` wide (the largest one if none is)."""
+    manifest = get_manifest(name)
+    if not manifest:
+        return default_storage.url(name) if name else ''
+    variants = manifest['variants']
+    entry = next((v for v in variants if v['width'] >= width), variants[-1])
+    return default_storage.url(entry[fmt])
+
+
+def forget_missing():
+    """Look for every manifest not found so far again on its next use."""
+    _missing.clear()
+
+
+def forget(name=None):
+    """Drop cached manifests (all of them, or one image's)."""
+    if name is None:
+        _manifests.clear()
+        _missing.clear()
+    else:
+        _manifests.pop(name, None)
+        _missing.pop(name, None)
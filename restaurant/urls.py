@@ -12,6 +12,7 @@ urlpatterns = [
     path('kitchen/', views.kitchen_view, name='kitchen'),
     path('kitchen/orders/api/', views.kitchen_orders_api, name='kitchen_orders_api'),
     path('kitchen/ajax/update_order_status/', views.kitchen_update_order_status_ajax, name='kitchen_update_order_status_ajax'),
+    path('kitchen/ajax/update_order_status/batch/', views.kitchen_update_order_status_batch, name='kitchen_update_order_status_batch'),
     
     # Menu Management
     path('menu/', views.menu_view, name='menu'),
@@ -23,6 +24,10 @@ urlpatterns = [
     
     # Public Menu View
     path('menu/view/', views.public_menu_view, name='public_menu_view'),
+    path('menu/catalog.json', views.menu_catalog_json, name='menu_catalog_json'),
+    # Anonymous; exempted in LoginRequiredMiddleware
+    path('menu/public/', views.public_menu_page, name='public_menu_page'),
+    path('menu/public.json', views.public_menu_json, name='public_menu_json'),
     
     # QR Code Generation
     path('menu/qr-code/', views.generate_qr_code, name='generate_qr_code'),
@@ -38,6 +43,7 @@ urlpatterns = [
     path('table/create/', views.TableCreateView.as_view(), name='table_create'),
     path('table/<int:pk>/update/', views.TableUpdateView.as_view(), name='table_update'),
     path('table/<int:pk>/delete/', views.TableDeleteView.as_view(), name='table_delete'),
+    path('tables/qr-sheet/', views.table_qr_sheet, name='table_qr_sheet'),
     
     # Order Management - More specific patterns first
     path('order/close/<int:pk>/', views.close_order, name='close_order'),
@@ -69,8 +75,10 @@ urlpatterns = [
     
     # Transaction History
     path('transaction_history/', views.transaction_history, name='transaction_history'),
+    path('transaction_history/search/', views.transaction_history_search, name='transaction_history_search'),
     path('transaction_history/export/csv/', views.export_orders_csv, name='export_orders_csv'),
     path('transaction_history/export/pdf/', views.export_orders_pdf, name='export_orders_pdf'),
+    path('transaction_history/export/parquet/', views.export_history_parquet, name='export_history_parquet'),
     path('order_history_details/<str:order_id>/', views.order_history_details, name='order_history_details'),
     path('order_update_notes/<str:order_id>/', views.order_update_notes, name='order_update_notes'),
     # serve a favicon shortcut to avoid 404 in dev
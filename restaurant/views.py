@@ -14,7 +14,8 @@ def process_payment(request, pk):
             payment = form.save(commit=False)
             payment.order = order
             payment.edited_by = request.user
-            payment.save()
+            with transaction.atomic():
+                payment.save()
             return redirect('restaurant:order_details', order_id=order.order_id)
     else:
         form = PaymentForm()
@@ -26,7 +27,7 @@ def process_payment(request, pk):
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.forms import modelformset_factory
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, Http404
 from django.urls import reverse_lazy, reverse
 from django.views.generic import ListView, CreateView, UpdateView, DeleteView, DetailView
 from django.contrib.auth.mixins import LoginRequiredMixin
@@ -41,19 +42,28 @@ from django.shortcuts import render, get_object_or_404
 from django.forms import modelformset_factory
 from .models import Table, MenuItem, OrderItem
 from .forms import OrderForm, OrderItemForm
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth import views as auth_views
-import qrcode
 from io import BytesIO
+import asyncio
+import hashlib
 import logging
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
 from django.contrib.auth.decorators import login_required
 from django.views import View as DjangoView
+from django.conf import settings
+from django.views.decorators.http import condition, require_safe
+from django.utils.cache import patch_cache_control
 from datetime import datetime
 import numpy as np
 from sklearn.cluster import KMeans
 from django.utils import timezone
 from django.utils.dateparse import parse_datetime
 from .models import OrderHistoryItem
+from . import (
+    history_queries, history_reports, menu_catalog, menu_counters, menu_ranking, order_status, pricing, table_registry,
+)
 
 
 # ---- Merged from `home.views` ----
@@ -98,36 +108,88 @@ class LogoutView(auth_views.LogoutView):
 @require_module_access('menu')
 def menu_view(request):
     # Pass all categories (active and inactive) so staff can manage visibility
-    categories = Category.objects.all().prefetch_related('menuitem_set')
+    categories = menu_catalog.get_catalog().categories
     return render(request, 'restaurant/menu.html', {'categories': categories})
 
 @login_required
 def public_menu_view(request):
     # Show only items from active categories that are available
-    categories = Category.objects.filter(is_active=True).prefetch_related('menuitem_set')
-    menu_items = MenuItem.objects.filter(is_available=True, category__is_active=True)
+    catalog = menu_catalog.get_catalog()
     return render(request, 'restaurant/public_menu.html', {
-        'categories': categories,
-        'menu_items': menu_items
+        'categories': catalog.public_categories(),
+        'menu_items': catalog.orderable_items,
     })
 
+@login_required
+@condition(etag_func=lambda request: menu_catalog.get_catalog().etag)
+def menu_catalog_json(request):
+    """Full menu as JSON; terminals revalidate with If-None-Match and get a 304 while it is unchanged."""
+    catalog = menu_catalog.get_catalog()
+    response = HttpResponse(catalog.json_bytes, content_type='application/json')
+    response['X-Menu-Version'] = str(catalog.version)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+def _serve_public_menu(request, kind):
+    from django.http import HttpResponseNotModified
+    from .public_menu import get_public_menu
+
+    menu = get_public_menu()
+    representation = menu.representations[kind]
+    encoding = representation.negotiate(request.headers.get('Accept-Encoding'))
+
+    if representation.matches(request.headers.get('If-None-Match')):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(representation.bodies[encoding], content_type=representation.content_type)
+        if encoding != 'identity':
+            response['Content-Encoding'] = encoding
+        response['Content-Length'] = str(len(representation.bodies[encoding]))
+    response['ETag'] = representation.etag_for(encoding)
+    response['Vary'] = 'Accept-Encoding'
+    response['X-Menu-Version'] = str(menu.version)
+    patch_cache_control(response, public=True, max_age=settings.PUBLIC_MENU_MAX_AGE)
+    return response
+
+@require_safe
+def public_menu_page(request):
+    """Anonymous, pre-rendered menu page that table QR codes point to."""
+    return _serve_public_menu(request, 'html')
+
+@require_safe
+def public_menu_json(request):
+    """Anonymous JSON version of the public menu."""
+    return _serve_public_menu(request, 'json')
+
 @login_required
 def generate_qr_code(request):
-    menu_url = request.build_absolute_uri(reverse('restaurant:public_menu_view'))
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_L,
-        box_size=10,
-        border=4,
-    )
-    qr.add_data(menu_url)
-    qr.make(fit=True)
+    """QR code for the public menu; `size`, `ec` (L/M/Q/H) and `format` (png/svg) are optional."""
+    from . import qr_codes
 
-    img = qr.make_image(fill_color="black", back_color="white")
-    buffer = BytesIO()
-    img.save(buffer, format="PNG")
-    buffer.seek(0)
-    return HttpResponse(buffer, content_type="image/png")
+    menu_url = request.build_absolute_uri(reverse('restaurant:public_menu_page'))
+    size, ec, fmt = qr_codes.clean_params(request.GET.get('size'), request.GET.get('ec'), request.GET.get('format'))
+    response = HttpResponse(qr_codes.qr_image(menu_url, size, ec, fmt), content_type=qr_codes.CONTENT_TYPES[fmt])
+    patch_cache_control(response, private=True, max_age=86400)
+    return response
+
+@require_module_access('tables')
+@login_required
+def table_qr_sheet(request):
+    """Printable A4 PDF with one QR code per table, each pointing at the public menu for that table."""
+    from . import qr_codes
+
+    menu_url = request.build_absolute_uri(reverse('restaurant:public_menu_page'))
+    _, ec, _ = qr_codes.clean_params(ec=request.GET.get('ec', 'M'))
+    try:
+        # No process pool inside a web worker; generate_table_qr_sheet uses one
+        pdf = qr_codes.table_sheet_pdf(menu_url, table_registry.get_tables(), ec=ec, workers=1)
+    except ImportError:
+        return HttpResponse(
+            'QR sheets require the `reportlab` package. Install with: pip install reportlab',
+            status=501,
+            content_type='text/plain'
+        )
+    return HttpResponse(pdf, content_type='application/pdf', headers={'Content-Disposition': 'attachment; filename="table_qr_codes.pdf"'})
 
 @require_module_access('dashboard')
 def dashboard_view(request):
@@ -147,7 +209,7 @@ def dashboard_view(request):
             status__in=['pending', 'preparing', 'ready', 'served']
         ).values_list('table_id', flat=True)
     )
-    active_tables = Table.objects.filter(id__in=table_ids_with_pending_orders).count()
+    active_tables = table_registry.count_existing(table_ids_with_pending_orders)
     total_menu_items = MenuItem.objects.filter(is_available=True).count()
     # Prefer actual payments recorded today to reflect collected revenue.
     payments_total = Payment.objects.filter(
@@ -176,11 +238,6 @@ def dashboard_view(request):
     
     recent_orders = Order.objects.order_by('-created_at')[:5]
     
-    # K-Means Clustering Analytics (persisted tiers)
-    bestsellers = MenuItem.objects.filter(demand_tier='high', is_available=True).order_by('-order_count')[:5]
-    average_items = MenuItem.objects.filter(demand_tier='medium', is_available=True).order_by('-order_count')[:5]
-    slow_movers = MenuItem.objects.filter(demand_tier='low', is_available=True).order_by('-order_count')[:5]
-
     # Optional on-the-fly analysis by date/time range (GET params: start, end, apply=1)
     analysis_results = None
     start_str = request.GET.get('start')
@@ -202,16 +259,9 @@ def dashboard_view(request):
             if timezone.is_naive(end):
                 end = timezone.make_aware(end)
 
-            # Query OrderHistoryItem within the provided range
-            item_order_counts = (
-                OrderHistoryItem.objects
-                .filter(order_history__created_at__gte=start, order_history__created_at__lte=end)
-                .values('item__id', 'item__name')
-                .annotate(order_count=Count('id'))
-                .order_by('-order_count')
-            )
-
-            items_data = list(item_order_counts)
+            # Per-item sales within the provided (inclusive) range, including
+            # months that were moved to the history archive
+            items_data = history_reports.item_sales(start, end + timedelta(microseconds=1))
             if items_data:
                 order_counts = np.array([i['order_count'] for i in items_data]).reshape(-1, 1)
                 n_clusters = min(3, max(1, len(items_data)))
@@ -230,33 +280,22 @@ def dashboard_view(request):
                 for data, lab in zip(items_data, labels):
                     # include price and category for display
                     try:
-                        mi = MenuItem.objects.filter(id=data['item__id']).values('price', 'category__name').first()
+                        mi = MenuItem.objects.filter(id=data['item_id']).values('price', 'category__name').first()
                         price = mi['price'] if mi else None
                         category_name = mi['category__name'] if mi else ''
                     except Exception:
                         price = None
                         category_name = ''
 
-                    # collect order numbers and quantities for this item within the range
-                    history_orders = (
-                        OrderHistoryItem.objects
-                        .filter(item_id=data['item__id'], order_history__created_at__gte=start, order_history__created_at__lte=end)
-                        .values('order_history__order_id')
-                        .annotate(total_qty=Sum('quantity'))
-                        .order_by('-total_qty')
-                    )
-                    orders_count = history_orders.count()
-                    orders_qty = sum([ho['total_qty'] for ho in history_orders]) if orders_count else 0
-
                     analysis_results.append({
-                        'item_id': data['item__id'],
-                        'name': data['item__name'],
+                        'item_id': data['item_id'],
+                        'name': data['item_name'],
                         'order_count': data['order_count'],
                         'tier': cluster_to_tier[lab],
                         'price': price,
                         'category_name': category_name,
-                        'orders_count': orders_count,
-                        'orders_qty': orders_qty,
+                        'orders_count': data['orders'],
+                        'orders_qty': data['quantity'],
                     })
 
                 # If user requested to apply clusters to MenuItem records, update them
@@ -266,12 +305,14 @@ def dashboard_view(request):
                         try:
                             mi = MenuItem.objects.get(id=entry['item_id'])
                             mi.demand_tier = entry['tier']
-                            mi.order_count = entry['order_count']
                             mi.last_tier_update = timezone.now()
-                            mi.save()
+                            # order_count stays the all-time counter kept by menu_counters;
+                            # entry['order_count'] only covers the analysed range
+                            mi.save(update_fields=['demand_tier', 'last_tier_update'])
                             updated_count += 1
                         except MenuItem.DoesNotExist:
                             continue
+                    menu_ranking.refresh_rankings()
                     messages.success(request, f'Applied clusters to {updated_count} menu items')
 
         except Exception as e:
@@ -289,31 +330,29 @@ def dashboard_view(request):
             else:
                 low_results.append(r)
 
-    # Build persisted-item data (orders_qty and orders_count) for template and CSV fallback
-    def mi_to_data(mi, tier_name):
-        try:
-            from .models import OrderHistoryItem
-            qty_agg = OrderHistoryItem.objects.filter(item_id=getattr(mi, 'id', None)).aggregate(total_qty=Sum('quantity'))
-            orders_qty = qty_agg.get('total_qty') or 0
-            orders_count = OrderHistoryItem.objects.filter(item_id=getattr(mi, 'id', None)).values('order_history_id').distinct().count()
-        except Exception:
-            orders_qty = 0
-            orders_count = getattr(mi, 'order_count', 0)
+    # K-Means Clustering Analytics (persisted tiers): top items per tier come
+    # straight from the precomputed ranking index, no per-item queries
+    catalog = menu_catalog.get_catalog()
+    ranking = menu_ranking.get_ranking()
+    available_ids = {item.id for item in catalog.items if item.is_available}
 
+    def rank_to_data(entry, tier_name):
+        item = catalog.by_id[entry.item_id]
         return {
-            'item_id': getattr(mi, 'id', ''),
-            'name': getattr(mi, 'name', ''),
-            'category_name': getattr(getattr(mi, 'category', None), 'name', ''),
-            'price': getattr(mi, 'price', ''),
-            'order_count': getattr(mi, 'order_count', 0),
-            'orders_count': orders_count,
-            'orders_qty': orders_qty,
+            'item_id': item.id,
+            'name': item.name,
+            'category_name': item.category_name,
+            'price': item.price,
+            'order_count': entry.order_count,
+            'orders_count': entry.order_count,
+            'orders_qty': entry.total_quantity,
             'tier': tier_name,
         }
 
-    bestsellers_data = [mi_to_data(mi, 'high') for mi in bestsellers]
-    average_items_data = [mi_to_data(mi, 'medium') for mi in average_items]
-    slow_movers_data = [mi_to_data(mi, 'low') for mi in slow_movers]
+    bestsellers_data = [rank_to_data(entry, 'high') for entry in ranking.top('high', 5, available_ids)]
+    average_items_data = [rank_to_data(entry, 'medium') for entry in ranking.top('medium', 5, available_ids)]
+    slow_movers_data = [rank_to_data(entry, 'low') for entry in ranking.top('low', 5, available_ids)]
+    bestsellers, average_items, slow_movers = bestsellers_data, average_items_data, slow_movers_data
 
     # CSV export support: allow exporting analysis results or fall back to persisted MenuItem tiers
     if request.GET.get('export') == '1':
@@ -385,13 +424,25 @@ def kitchen_view(request):
     # Show active orders for the kitchen station. Include pending and preparing orders
     # so staff can see incoming orders and start preparing them. Exclude completed/cancelled.
     orders = Order.objects.exclude(status__in=['completed', 'cancelled']).order_by('created_at')
-    return render(request, 'restaurant/kitchen.html', {'orders': orders})
+    return render(request, 'restaurant/kitchen.html', {
+        'orders': orders,
+        # A held request only costs a coroutine under ASGI; under WSGI it would hold a worker
+        'long_poll': isinstance(request, ASGIRequest),
+    })
 
 
-@require_module_access('kitchen')
-def kitchen_orders_api(request):
-    """Return JSON list of active orders for the kitchen board (used by AJAX polling)."""
-    orders_qs = Order.objects.exclude(status__in=['completed', 'cancelled']).order_by('created_at')
+# Longest a kitchen board poll is held open, and how often it re-checks meanwhile
+KITCHEN_POLL_MAX_WAIT = 25
+KITCHEN_POLL_INTERVAL = 1.0
+
+
+def _kitchen_orders():
+    """Active orders as the kitchen board shows them, and an etag of that list."""
+    orders_qs = (
+        Order.objects.exclude(status__in=['completed', 'cancelled'])
+        .select_related('table')
+        .order_by('created_at')
+    )
     orders_list = []
     for order in orders_qs:
         orders_list.append({
@@ -400,14 +451,58 @@ def kitchen_orders_api(request):
             'type': f"table #{order.table.number}" if order.table else ("Takeaway" if order.order_type == 'takeaway' else "Delivery"),
             'amount': float(order.total_amount or 0),
             'status': order.status,
-            'items': order.items.count(),
+            'items': order.item_count,
+            'version': order.version,
         })
-    return JsonResponse({'orders': orders_list})
+    etag = hashlib.sha1(json.dumps(orders_list, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+    return orders_list, etag
+
+
+@require_module_access('kitchen')
+async def kitchen_orders_api(request):
+    """Return JSON list of active orders for the kitchen board (used by AJAX polling).
+
+    With ?since=<etag>&wait=<seconds> it long-polls: the response is held until
+    the board no longer matches `since` or `wait` (at most KITCHEN_POLL_MAX_WAIT)
+    runs out. The response carries the board's current etag.
+    """
+    try:
+        wait = max(0.0, min(float(request.GET.get('wait') or 0), KITCHEN_POLL_MAX_WAIT))
+    except ValueError:
+        wait = 0.0
+    since = request.GET.get('since')
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + wait
+
+    orders_list, etag = await sync_to_async(_kitchen_orders)()
+    while etag == since and loop.time() < deadline:
+        await asyncio.sleep(min(KITCHEN_POLL_INTERVAL, deadline - loop.time()))
+        orders_list, etag = await sync_to_async(_kitchen_orders)()
+    return JsonResponse({'orders': orders_list, 'etag': etag})
+
+
+def _idempotency_key(request, data=None):
+    """Key a client sends so that retrying a status change is a no-op (see order_status)."""
+    if data is None:
+        data = request.POST
+    key = request.headers.get('Idempotency-Key') or data.get('idempotency_key') or ''
+    return str(key).strip()[:64] or None
+
+
+def _parse_version(value):
+    """An order version sent by a client: None when absent, else a non-negative int (ValueError otherwise)."""
+    if value is None or value == '':
+        return None
+    if isinstance(value, bool):
+        raise ValueError('Invalid version')
+    version = int(value)
+    if version < 0:
+        raise ValueError('Invalid version')
+    return version
 
 
-@login_required
 @require_module_access('kitchen')
-def kitchen_update_order_status_ajax(request):
+async def kitchen_update_order_status_ajax(request):
     """AJAX endpoint to update an order's status from the kitchen board.
     Expects JSON: { "order_id": <int>, "status": "pending|preparing|ready|..." }
     Returns JSON { success: true } or { success: false, message: '...' }
@@ -438,62 +533,20 @@ def kitchen_update_order_status_ajax(request):
             order_pk = int(order_pk)
         except (TypeError, ValueError):
             return JsonResponse({'success': False, 'message': 'Invalid order_id'}, status=400)
+        try:
+            version = _parse_version(data.get('version'))
+        except (TypeError, ValueError):
+            return JsonResponse({'success': False, 'message': 'Invalid version'}, status=400)
 
-        order = get_object_or_404(Order, pk=order_pk)
-
-        # Reuse server-side validation rules from update_order_status
-        status_aliases = {
-            'cooking': 'preparing',
-            'cook': 'preparing',
-            'ready': 'ready',
-            'complete': 'completed',
-            'completed': 'completed'
-        }
-        normalized = status_aliases.get(new_status, new_status)
-
-        # Map generic 'ready' to the takeaway-specific status
-        # so that kitchen UI posting 'ready' will work for takeaways.
-        if normalized == 'ready' and getattr(order, 'order_type', None) == 'takeaway':
-            normalized = 'ready_to_pickup'
-
-        allowed_statuses_by_type = {
-            'delivery': ['pending', 'preparing', 'ready', 'on_the_way', 'completed', 'cancelled'],
-            'takeaway': ['pending', 'preparing', 'ready_to_pickup', 'completed', 'cancelled'],
-            'table': ['pending', 'preparing', 'ready', 'served', 'completed', 'cancelled'],
-            None: list(dict(Order.ORDER_STATUS_CHOICES).keys()),
-        }
-        allowed_for_type = allowed_statuses_by_type.get(order.order_type, allowed_statuses_by_type[None])
-
-        if normalized not in allowed_for_type:
-            return JsonResponse({'success': False, 'message': 'Invalid status for this order type'}, status=400)
-
-        # If marking completed, ensure payments are settled
-        if normalized == 'completed':
-            paid = order.payments.aggregate(total=Sum('amount'))['total'] or 0
-            try:
-                from decimal import Decimal
-                paid_val = Decimal(paid)
-                required = Decimal(order.total_amount) + (Decimal(order.delivery_charge or 0) if order.order_type == 'delivery' else Decimal(order.total_amount))
-            except Exception:
-                paid_val = paid
-                required = order.total_amount
-            if paid_val < required:
-                return JsonResponse({'success': False, 'message': 'Payments not settled'}, status=400)
-            order.status = 'completed'
-            order.payment_status = 'paid'
-            order.completed_by = request.user
-            order.save()
-            # attempt to move to history but don't fail the request if it errors
-            try:
-                order.move_to_history()
-            except Exception:
-                pass
-            return JsonResponse({'success': True, 'status': 'completed'})
-
-        # Otherwise just update
-        order.status = normalized
-        order.save()
-        return JsonResponse({'success': True, 'status': normalized})
+        try:
+            result = await sync_to_async(order_status.transition)(
+                order_pk, new_status, user=request.user, idempotency_key=_idempotency_key(request, data),
+                version=version,
+            )
+        except order_status.TransitionError as e:
+            status = {'not_found': 404, 'conflict': 409}.get(e.code, 400)
+            return JsonResponse({'success': False, 'message': str(e), 'code': e.code}, status=status)
+        return JsonResponse({'success': True, 'status': result.status, 'version': result.version})
 
     except json.JSONDecodeError:
         return JsonResponse({'success': False, 'message': 'Invalid JSON'}, status=400)
@@ -502,39 +555,87 @@ def kitchen_update_order_status_ajax(request):
     except Exception as e:
         return JsonResponse({'success': False, 'message': str(e)}, status=500)
 
+@require_module_access('kitchen')
+async def kitchen_update_order_status_batch(request):
+    """AJAX endpoint applying several kitchen board status changes at once.
+    Expects JSON: { "changes": [ { "order_id": <int>, "status": "...", "version": <int> }, ... ] }
+    ("version" is optional). Returns JSON { success: <all applied>, results: [...] } with one
+    { order_id, success, status, version, archived } or { order_id, success: false, code, message }
+    per change, in order.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'message': 'Method not allowed'}, status=405)
+    try:
+        data = json.loads(request.body.decode('utf-8') or '{}')
+        changes = data.get('changes') or []
+        if not isinstance(changes, list):
+            raise ValueError('changes must be a list')
+    except (ValueError, TypeError, AttributeError):
+        return JsonResponse({'success': False, 'message': 'Invalid JSON'}, status=400)
+    try:
+        changes = [
+            (int(change['order_id']), str(change.get('status') or ''), _parse_version(change.get('version')))
+            for change in changes
+        ]
+    except (ValueError, TypeError, KeyError, AttributeError):
+        return JsonResponse(
+            {'success': False, 'message': 'Invalid change: order_id and version must be integers'}, status=400
+        )
+    if not changes:
+        return JsonResponse({'success': False, 'message': 'No changes given'}, status=400)
+    if len(changes) > order_status.MAX_BATCH:
+        return JsonResponse(
+            {'success': False, 'message': f'At most {order_status.MAX_BATCH} changes per request'}, status=400
+        )
+
+    results = []
+    applied = await sync_to_async(order_status.transition_many)(
+        changes, user=request.user, idempotency_key=_idempotency_key(request, data)
+    )
+    for order_pk, result in applied:
+        if isinstance(result, order_status.TransitionError):
+            results.append({'order_id': order_pk, 'success': False, 'code': result.code, 'message': str(result)})
+        else:
+            results.append({
+                'order_id': order_pk,
+                'success': True,
+                'status': result.status,
+                'version': result.version,
+                'archived': result.archived,
+            })
+    return JsonResponse({'success': all(result['success'] for result in results), 'results': results})
+
+
+def _formset_lines(formset):
+    """(menu_item_id, quantity) pairs for the filled-in rows of an order item formset."""
+    return [
+        (form.cleaned_data['item'].pk, form.cleaned_data['quantity'])
+        for form in formset
+        if form.cleaned_data
+    ]
+
+
 @require_module_access('orders')
 @login_required
 def place_order(request, table_id):
-    table = get_object_or_404(Table, id=table_id)
+    table = table_registry.get_table(table_id)
+    if table is None:
+        raise Http404('No Table matches the given query.')
     OrderItemFormSet = modelformset_factory(OrderItem, form=OrderItemForm, extra=1)
-    import json
-    menu_items_qs = MenuItem.objects.filter(is_available=True, category__is_active=True).select_related('category')
-    menu_items = list(menu_items_qs.values('id', 'name', 'price', 'category_id', 'category__name'))
-    for item in menu_items:
-        if isinstance(item['price'], Decimal):
-            item['price'] = float(item['price'])
-    menu_items_json = json.dumps(menu_items)
+    menu_items_json = menu_ranking.get_ranking().order_items_json(menu_catalog.get_catalog())
     if request.method == 'POST':
         order_form = OrderForm(request.POST)
         formset = OrderItemFormSet(request.POST, queryset=OrderItem.objects.none())
 
         if order_form.is_valid() and formset.is_valid():
-            order = order_form.save(commit=False)
-            order.table = table
-            order.created_by = request.user
-            order.status = 'pending'
-            order.save()
-
-            for form in formset:
-                if form.cleaned_data:
-                    order_item = form.save(commit=False)
-                    menu_item = MenuItem.objects.get(id=order_item.item.id)
-                    order_item.price = menu_item.price
-                    order_item.order = order
-                    order_item.save()
-            total_amount = sum(item.price * item.quantity for item in order.items.all())
-            order.total_amount = total_amount
-            order.save()
+            with transaction.atomic():
+                order = order_form.save(commit=False)
+                order.table = table
+                order.created_by = request.user
+                order.status = 'pending'
+                order.save()
+                # Prices come from one menu query; items are bulk-inserted and totalled in SQL
+                pricing.add_items(order, _formset_lines(formset))
             return redirect('restaurant:order_list')
     # Handle GET and all other cases
     order_form = OrderForm()
@@ -550,14 +651,7 @@ def place_order(request, table_id):
 def place_order_takeaway(request):
     OrderItemFormSet = modelformset_factory(OrderItem, form=OrderItemForm, extra=1)
     # Show only available items from active categories
-    import json
-    menu_items_qs = MenuItem.objects.filter(is_available=True, category__is_active=True).select_related('category')
-    menu_items = list(menu_items_qs.values('id', 'name', 'price', 'category_id', 'category__name'))
-    # Convert Decimal price to float for JSON serialization
-    for item in menu_items:
-        if isinstance(item['price'], Decimal):
-            item['price'] = float(item['price'])
-    menu_items_json = json.dumps(menu_items)
+    menu_items_json = menu_ranking.get_ranking().order_items_json(menu_catalog.get_catalog())
 
     if request.method == 'POST':
         order_form = OrderForm(request.POST)
@@ -569,22 +663,10 @@ def place_order_takeaway(request):
             # record creator
             order.created_by = request.user
             order.status = 'pending'
-            order.save()
-
-            total_amount = 0  # Initialize total_amount
-
-            # Then save order items and calculate total
-            for form in formset:
-                if form.cleaned_data:  # Check if form has data
-                    order_item = form.save(commit=False)
-                    menu_item = MenuItem.objects.get(id=order_item.item.id)
-                    order_item.price = menu_item.price
-                    order_item.order = order
-                    order_item.save()
-            # Calculate total_amount
-            total_amount = sum(item.price * item.quantity for item in order.items.all())
-            order.total_amount = total_amount
-            order.save()
+            with transaction.atomic():
+                order.save()
+                # Then save order items and calculate total
+                pricing.add_items(order, _formset_lines(formset))
 
             return redirect('restaurant:order_list')
 
@@ -603,13 +685,7 @@ def place_order_takeaway(request):
 def place_order_delivery(request):
     OrderItemFormSet = modelformset_factory(OrderItem, form=OrderItemForm, extra=1)
     # Show only available items from active categories
-    import json
-    menu_items_qs = MenuItem.objects.filter(is_available=True, category__is_active=True).select_related('category')
-    menu_items = list(menu_items_qs.values('id', 'name', 'price', 'category_id', 'category__name'))
-    for item in menu_items:
-        if isinstance(item['price'], Decimal):
-            item['price'] = float(item['price'])
-    menu_items_json = json.dumps(menu_items)
+    menu_items_json = menu_ranking.get_ranking().order_items_json(menu_catalog.get_catalog())
 
     if request.method == 'POST':
         order_form = OrderForm(request.POST)
@@ -623,21 +699,9 @@ def place_order_delivery(request):
             order.created_by = request.user
             order.status = 'pending'
             order.delivery_charge = delivery_charge  # Save delivery charge
-            order.save()
-
-            total_amount = 0
-
-            for form in formset:
-                if form.cleaned_data:
-                    order_item = form.save(commit=False)
-                    menu_item = MenuItem.objects.get(id=order_item.item.id)
-                    order_item.price = menu_item.price
-                    order_item.order = order
-                    order_item.save()
-            # Calculate total_amount
-            total_amount = sum(item.price * item.quantity for item in order.items.all())
-            order.total_amount = total_amount
-            order.save()
+            with transaction.atomic():
+                order.save()
+                pricing.add_items(order, _formset_lines(formset))
 
             return redirect('restaurant:order_list')
 
@@ -667,47 +731,31 @@ def close_order(request, pk):
         return redirect('restaurant:order_details', order_id=order.order_id)
     
     if request.method == 'POST':
-        # Calculate settled payments
-        settled_payments = order.payments.all()
-        settled_amount = sum((Decimal(p.amount) for p in settled_payments), Decimal('0'))
-        
-        # Calculate required amount (include delivery charge)
-        required = Decimal(order.total_amount)
-        if order.order_type == 'delivery':
-            required = required + Decimal(order.delivery_charge or 0)
-        
-        # Check if payment is fully settled
-        if settled_amount < required:
-            shortage = required - settled_amount
-            messages.error(request, f'Cannot close order. Payment not fully settled. Remaining amount: Rs.{shortage}. Please collect payment first.')
-            return redirect('restaurant:order_details', order_id=order.order_id)
-        
-        # Payment is settled, proceed with closing order
-        prev = order.status
-        order.status = 'completed'
-        order.payment_status = 'paid'  # Mark as paid when closing
-        order.completed_by = request.user
-        order.save()
-        
-        # Move the order to history (which deletes the original order after copying all details)
-        order_history = None
+        # Locks the order, re-checks settlement and archives it in one transaction
         try:
-            import logging
-            logger = logging.getLogger(__name__)
-            logger.info(f"Attempting to move order {order.order_id} (pk={order.id}) to history")
-            order_history = order.move_to_history()
-            if order_history:
-                logger.info(f"Order {order.order_id} successfully moved to history (history pk={order_history.id})")
-                messages.success(request, f'Order {order.order_id} completed and moved to history.')
+            result = order_status.transition(
+                order.pk, 'completed', user=request.user, idempotency_key=_idempotency_key(request)
+            )
+        except order_status.TransitionError as e:
+            if e.code == 'not_found':
+                messages.info(request, 'This order has already been completed and moved to history.')
+                return redirect('restaurant:order_list')
+            if e.code == 'unsettled':
+                messages.error(request, f'Cannot close order. {e} Please collect payment first.')
             else:
-                logger.warning(f"move_to_history() returned None for order {order.order_id}")
-                messages.success(request, f'Order {order.order_id} marked completed.')
-        except Exception as e:
-            import logging
-            logger = logging.getLogger(__name__)
-            logger.error(f"Error moving order {order.order_id} to history: {e}", exc_info=True)
-            messages.error(request, f'Order marked completed but failed to move to history: {e}')
-        
+                messages.warning(request, f'Cannot close order. {e}')
+            return redirect('restaurant:order_details', order_id=order.order_id)
+
+        logger = logging.getLogger(__name__)
+        if result.archived:
+            logger.info(f"Order {order.order_id} moved to history by {request.user}")
+            messages.success(request, f'Order {order.order_id} completed and moved to history.')
+        elif result.changed:
+            logger.warning(f"Order {order.order_id} completed but not moved to history")
+            messages.error(request, f'Order {order.order_id} marked completed but failed to move to history.')
+        else:
+            messages.info(request, f'Order {order.order_id} was already completed.')
+
         # Always redirect to order list after processing
         return redirect('restaurant:order_list')
     
@@ -722,79 +770,30 @@ def payment_success(request):
 @login_required
 def update_order_status(request, pk):
     order = get_object_or_404(Order, pk=pk)
+    normalized = None
     if request.method == 'POST':
-        status = request.POST.get('status')
-        # map UI-friendly aliases to model status values
-        status_aliases = {
-            'cooking': 'preparing',
-            'cook': 'preparing',
-            'ready': 'ready',
-            'complete': 'completed',
-            'completed': 'completed'
-        }
-        normalized = status_aliases.get(status, (status or '').strip())
-
-        # Define allowed statuses per order type (server-side authoritative)
-        allowed_statuses_by_type = {
-            'delivery': ['pending', 'preparing', 'ready', 'on_the_way', 'completed', 'cancelled'],
-            'takeaway': ['pending', 'preparing', 'ready_to_pickup', 'completed', 'cancelled'],
-            'table': ['pending', 'preparing', 'ready', 'served', 'completed', 'cancelled'],
-            None: list(dict(Order.ORDER_STATUS_CHOICES).keys()),
-        }
-
-        allowed_for_type = allowed_statuses_by_type.get(order.order_type, allowed_statuses_by_type[None])
-
-        # Validate normalized status is allowed for this order type
-        if normalized in allowed_for_type:
-            # If attempting to mark completed, ensure payments cover total
-            if normalized == 'completed':
-                # calculate required amount (include delivery charge)
-                required = order.total_amount
-                if order.order_type == 'delivery':
-                    required = required + (order.delivery_charge or 0)
-
-                paid = order.payments.aggregate(total=Sum('amount'))['total'] or 0
-                # use Decimal comparison if needed
-                try:
-                    from decimal import Decimal
-                    paid_val = Decimal(paid)
-                    required_val = Decimal(required)
-                except Exception:
-                    paid_val = paid
-                    required_val = required
-
-                # Check payment sufficiency
-                if paid_val >= required_val:
-                    prev = order.status
-                    order.status = 'completed'
-                    order.payment_status = 'paid'
-                    order.completed_by = request.user  # Track who completed the order
-                    order.save()
-                    # Status log removed
-                    # Move to history (this will delete the order if move_to_history succeeds)
-                    order_history = None
-                    try:
-                        order_history = order.move_to_history()
-                        if order_history:
-                            messages.success(request, f'Order {order.order_id} completed and moved to history by {request.user.get_full_name() or request.user.username}.')
-                        else:
-                            messages.success(request, f'Order {order.order_id} marked completed by {request.user.get_full_name() or request.user.username}.')
-                    except Exception as e:
-                        # If move_to_history fails, keep order and report error
-                        messages.error(request, f'Order marked completed but failed to move to history: {e}')
-                    # If moved to history, later redirect to order history details; otherwise fall through
-                    # NOTE: don't return here so final redirect logic can choose appropriate destination
-                else:
-                    messages.error(request, 'Cannot complete order: payments are not settled.')
-                    # keep order in its current state
-                    return redirect(request.META.get('HTTP_REFERER', reverse('restaurant:order_list')))
-            else:
-                prev = order.status
-                order.status = normalized
-                order.save()
-                messages.success(request, f'Order {order.order_id} status updated to {order.get_status_display()}.')
+        try:
+            result = order_status.transition(
+                order.pk, request.POST.get('status'), user=request.user, idempotency_key=_idempotency_key(request)
+            )
+        except order_status.TransitionError as e:
+            if e.code == 'unsettled':
+                messages.error(request, 'Cannot complete order: payments are not settled.')
+                # keep order in its current state
+                return redirect(request.META.get('HTTP_REFERER', reverse('restaurant:order_list')))
+            messages.error(request, 'Invalid status' if e.code == 'invalid' else str(e))
         else:
-            messages.error(request, 'Invalid status')
+            normalized = result.status
+            done_by = request.user.get_full_name() or request.user.username
+            if not result.changed:
+                pass
+            elif result.status == 'completed' and result.archived:
+                messages.success(request, f'Order {order.order_id} completed and moved to history by {done_by}.')
+            elif result.status == 'completed':
+                messages.success(request, f'Order {order.order_id} marked completed by {done_by}.')
+            else:
+                label = dict(Order.ORDER_STATUS_CHOICES).get(result.status, result.status)
+                messages.success(request, f'Order {order.order_id} status updated to {label}.')
     # Redirect back to the referring page when possible so UX remains on the same view
     # Decide redirect destination: if the requested status is 'completed' or 'cancelled',
     # send the user to the order details (or order history if the order was moved).
@@ -823,215 +822,90 @@ def update_order_status(request, pk):
 
 @login_required
 def cancel_order(request, pk):
-    """Cancel an order with confirmation. Expects POST. Checks settled payments and moves to history."""
-    import logging
-    from decimal import Decimal
-    from django.db import transaction
+    """Cancel an order with confirmation. Expects POST. Refuses orders with settled payments and moves it to history."""
+    # A retried POST finds the order already in history; transition() replays its outcome
+    order = Order.objects.filter(pk=pk).first()
     if request.method == 'POST':
-        import logging
         logger = logging.getLogger(__name__)
-        order = get_object_or_404(Order, pk=pk)
-        logger.info(f"POST request for cancelling order {order.order_id}")
-        # Calculate settled payments
-        from decimal import Decimal
-        settled_payments = order.payments.all()
-        settled_amount = sum((Decimal(p.amount) for p in settled_payments), Decimal('0'))
-        # Prevent cancellation if there are settled payments
-        if settled_amount > 0:
-            messages.error(request, f'Cannot cancel order with settled payments (Rs.{settled_amount}). Please clear the settled amount first or contact support.')
-            logger.warning(f"Cannot cancel {order.order_id} - has settled payments")
-            return redirect('restaurant:order_details', order_id=order.order_id)
-
-        # Get cancellation reason from form
         cancellation_reason = request.POST.get('cancellation_reason', '').strip()
-        logger.info(f"Cancellation reason: {cancellation_reason}")
-
-        # Move order to history with cancellation status and reason
+        # Locks the order, re-checks payments and archives it in one transaction
         try:
-            with transaction.atomic():
-                logger.info(f"Creating OrderHistory for {order.order_id}")
-                order_history = OrderHistory.objects.create(
-                    order_id=order.order_id,
-                    customer_name=order.customer_name,
-                    customer_phone=order.customer_phone,
-                    order_type=order.order_type,
-                    status='cancelled',
-                    total_amount=order.total_amount,
-                    special_notes=order.special_notes or '',  # Provide empty string if None
-                    cancellation_reason=cancellation_reason,
-                    table=order.table,
-                    completed_by=request.user,
-                    created_at=order.created_at,
-                    updated_at=order.updated_at
-                )
-                logger.info(f"OrderHistory created successfully: {order_history.id}")
-
-                # Copy order items to history
-                items_count = 0
-                for order_item in order.items.all():
-                    try:
-                        OrderHistoryItem.objects.create(
-                            order_history=order_history,
-                            item=order_item.item,
-                            quantity=order_item.quantity,
-                            price=order_item.price
-                        )
-                        items_count += 1
-                    except Exception as e:
-                        logger.error(f"Error copying order item: {e}")
-                logger.info(f"Copied {items_count} items to history")
-
-                # Copy payment information to history
-                payments_count = 0
-                for payment in order.payments.all():
-                    try:
-                        OrderHistoryPayment.objects.create(
-                            order_history=order_history,
-                            payment_method=payment.payment_method,
-                            amount=payment.amount,
-                            transaction_id=payment.transaction_id
-                        )
-                        payments_count += 1
-                    except Exception as e:
-                        logger.error(f"Error copying payment: {e}")
-                logger.info(f"Copied {payments_count} payments to history")
-
-                # Success - delete the original order now that everything is copied
-                order_id_backup = order.order_id
-                order.delete()
-                logger.info(f"Deleted original order {order_id_backup}")
+            result = order_status.transition(
+                pk, 'cancelled', user=request.user, idempotency_key=_idempotency_key(request),
+                reason=cancellation_reason,
+            )
+        except order_status.TransitionError as e:
+            if e.code == 'not_found':
+                messages.info(request, 'This order has already been moved to history.')
+                return redirect('restaurant:order_list')
+            logger.warning(f"Cannot cancel {order.order_id}: {e}")
+            messages.error(request, str(e))
+            return redirect('restaurant:order_details', order_id=order.order_id)
 
+        if result.replayed or not result.changed:
+            messages.info(request, f'Order {result.order_id} was already cancelled.')
+        else:
+            logger.info(f"Order {result.order_id} cancelled and moved to history by {request.user}")
             reason_text = f" - Reason: {cancellation_reason}" if cancellation_reason else ""
-            messages.success(request, f'Order {order_id_backup} cancelled and moved to history by {request.user.get_full_name() or request.user.username}.{reason_text}')
-            return redirect('restaurant:order_list')
-        except Exception as e:
-            logger.exception(f"Error cancelling order {order.order_id}: {e}")
-            messages.error(request, f'Error cancelling order: {str(e)}')
-            return redirect('restaurant:order_details', order_id=order.order_id)
+            messages.success(request, f'Order {result.order_id} cancelled and moved to history by {request.user.get_full_name() or request.user.username}.{reason_text}')
+        return redirect('restaurant:order_list')
+
+    if order is None:
+        raise Http404('No Order matches the given query.')
+    # GET request shouldn't happen normally, but just in case, redirect back
+    return redirect('restaurant:order_details', order_id=order.order_id)
 
 
 @login_required
 def bulk_cancel_orders(request):
-    """Bulk cancel multiple orders via AJAX. All orders must have settled payments."""
-    import json
-    import logging
-    from decimal import Decimal
-    from django.db import transaction
-    from django.http import JsonResponse
-    
+    """Bulk cancel multiple orders via AJAX. Orders with settled payments cannot be cancelled."""
     logger = logging.getLogger(__name__)
-    
+
     if request.method != 'POST':
         return JsonResponse({'success': False, 'message': 'Method not allowed'}, status=405)
-    
+
     try:
         data = json.loads(request.body)
-        order_ids = data.get('order_ids', [])
-        
-        if not order_ids:
-            return JsonResponse({'success': False, 'message': 'No orders selected'})
-        
-        # Get all selected orders
-        orders = Order.objects.filter(id__in=order_ids)
-        
-        if not orders.exists():
-            return JsonResponse({'success': False, 'message': 'Orders not found'})
-        
-        # Check if all orders have NO settled payments (can only cancel unpaid orders)
-        settled_order_numbers = []
-        for order in orders:
-            settled_payments = order.payments.all()
-            settled_amount = sum((Decimal(p.amount) for p in settled_payments), Decimal('0'))
-            
-            # Calculate required amount based on order type
-            if order.order_type == 'delivery':
-                required_amount = order.total_amount + order.delivery_charge
-            else:
-                required_amount = order.total_amount
-            
-            # If payment IS settled, add to list (cannot cancel)
-            if settled_amount > 0:
-                settled_order_numbers.append(order.order_id)
-        
-        # If there are settled orders, return error
-        if settled_order_numbers:
-            return JsonResponse({
-                'success': False,
-                'message': f'Cannot cancel these orders - Please clear the payment first:\n\n{", ".join(settled_order_numbers)}'
-            })
-        
-        # All orders have no payment - proceed with cancellation
-        cancelled_count = 0
-        
-        try:
-            with transaction.atomic():
-                for order in orders:
-                    try:
-                        # Create OrderHistory record
-                        order_history = OrderHistory.objects.create(
-                            order_id=order.order_id,
-                            customer_name=order.customer_name,
-                            customer_phone=order.customer_phone,
-                            order_type=order.order_type,
-                            status='cancelled',
-                            total_amount=order.total_amount,
-                            special_notes=order.special_notes or '',
-                            cancellation_reason='Bulk cancelled by admin',
-                            table=order.table,
-                            completed_by=request.user,
-                            created_at=order.created_at,
-                            updated_at=order.updated_at
-                        )
-                        
-                        # Copy items
-                        for order_item in order.items.all():
-                            OrderHistoryItem.objects.create(
-                                order_history=order_history,
-                                item=order_item.item,
-                                quantity=order_item.quantity,
-                                price=order_item.price
-                            )
-                        
-                        # Copy payments
-                        for payment in order.payments.all():
-                            OrderHistoryPayment.objects.create(
-                                order_history=order_history,
-                                payment_method=payment.payment_method,
-                                amount=payment.amount,
-                                transaction_id=payment.transaction_id
-                            )
-                        
-                        # Delete original order
-                        order_id_backup = order.order_id
-                        order.delete()
-                        logger.info(f"Bulk cancelled order {order_id_backup}")
-                        cancelled_count += 1
-                        
-                    except Exception as e:
-                        logger.error(f"Error cancelling order {order.order_id}: {e}")
-                        continue
-            
-            return JsonResponse({
-                'success': True,
-                'cancelled_count': cancelled_count,
-                'message': f'Successfully cancelled {cancelled_count} order(s)'
-            })
-        
-        except Exception as e:
-            logger.exception(f"Error in bulk cancellation: {e}")
-            return JsonResponse({
-                'success': False,
-                'message': f'Error during bulk cancellation: {str(e)}'
-            })
-    
-    except json.JSONDecodeError:
+        order_ids = [int(order_id) for order_id in data.get('order_ids', [])]
+    except (json.JSONDecodeError, TypeError, ValueError):
         return JsonResponse({'success': False, 'message': 'Invalid JSON'}, status=400)
-    except Exception as e:
-        logger.exception(f"Unexpected error in bulk_cancel_orders: {e}")
-        return JsonResponse({'success': False, 'message': 'An unexpected error occurred'}, status=500)
 
-    # GET request shouldn't happen normally, but just in case, redirect back
-    return redirect('restaurant:order_details', order_id=order.order_id)
+    if not order_ids:
+        return JsonResponse({'success': False, 'message': 'No orders selected'})
+    if len(order_ids) > order_status.MAX_BATCH:
+        return JsonResponse(
+            {'success': False, 'message': f'At most {order_status.MAX_BATCH} orders per request'}, status=400
+        )
+
+    # All or nothing: refuse the batch if any order has settled payments
+    settled_order_numbers = list(
+        Order.objects.filter(id__in=order_ids, paid_amount__gt=0).values_list('order_id', flat=True)
+    )
+    if settled_order_numbers:
+        return JsonResponse({
+            'success': False,
+            'message': f'Cannot cancel these orders - Please clear the payment first:\n\n{", ".join(settled_order_numbers)}'
+        })
+
+    # Locks the orders and archives them with one transaction and one idempotency key
+    applied = order_status.transition_many(
+        [(order_pk, 'cancelled', None) for order_pk in dict.fromkeys(order_ids)],
+        user=request.user, idempotency_key=_idempotency_key(request, data), reason='Bulk cancelled by admin',
+    )
+    cancelled_count = 0
+    for order_pk, result in applied:
+        if isinstance(result, order_status.TransitionError):
+            logger.warning(f"Bulk cancel skipped order {order_pk}: {result}")
+        elif result.changed or result.replayed:
+            cancelled_count += 1
+    if not cancelled_count:
+        return JsonResponse({'success': False, 'message': 'Orders not found'})
+
+    return JsonResponse({
+        'success': True,
+        'cancelled_count': cancelled_count,
+        'message': f'Successfully cancelled {cancelled_count} order(s)'
+    })
 
 #
 # If you need this functionality later, re-implement with strict permission checks (admins only).
@@ -1045,7 +919,8 @@ def edit_payment(request, pk):
         payment.amount = data.get('amount')
         payment.transaction_id = data.get('transaction_id')
         payment.edited_by = request.user
-        payment.save()
+        with transaction.atomic():
+            payment.save()
         return JsonResponse({'status': 'success'})
     return JsonResponse({'status': 'error'}, status=400)
 
@@ -1053,7 +928,8 @@ def edit_payment(request, pk):
 def delete_payment(request, pk):
     payment = get_object_or_404(Payment, pk=pk)
     if request.method == 'POST':
-        payment.delete()
+        with transaction.atomic():
+            payment.delete()
         return JsonResponse({'status': 'success'})
     return JsonResponse({'status': 'error'}, status=400)
 
@@ -1083,25 +959,8 @@ def add_order_item(request, order_id):
             
             menu_item = get_object_or_404(MenuItem, id=item_id, is_available=True)
             
-            # Check if item already exists in order
-            order_item, created = OrderItem.objects.get_or_create(
-                order=order,
-                item=menu_item,
-                defaults={
-                    'quantity': quantity,
-                    'price': menu_item.price
-                }
-            )
-            
-            if not created:
-                order_item.quantity = quantity
-                order_item.save()
-            
-            # Recalculate order total
-            order_items = order.items.all()
-            total_amount = sum(item.price * item.quantity for item in order_items)
-            order.total_amount = total_amount
-            order.save()
+            # Add the item (or update its quantity) and recalculate the total in SQL
+            order_item, total_amount = pricing.set_item(order, menu_item, quantity)
             
             return JsonResponse({
                 'status': 'success',
@@ -1149,18 +1008,8 @@ def update_order_item(request, order_id, item_id):
             order = get_object_or_404(Order, order_id=order_id)
             order_item = get_object_or_404(OrderItem, id=item_id, order=order)
             
-            # Calculate the difference in total amount
-            old_total = order_item.price * order_item.quantity
-            new_total = order_item.price * new_quantity
-            difference = new_total - old_total
-            
-            # Update the order item quantity
-            order_item.quantity = new_quantity
-            order_item.save()
-            
-            # Update the order's total amount
-            order.total_amount += difference
-            order.save()
+            # Update the quantity; the order total is recomputed from all items
+            pricing.update_item_quantity(order, order_item, new_quantity)
 
             logger.info(f"Successfully updated item {item_id} quantity to {new_quantity} in order {order_id}")
             return JsonResponse({
@@ -1194,15 +1043,8 @@ def remove_order_item(request, order_id, item_id):
             order_item = get_object_or_404(OrderItem, id=item_id, order=order)
             logger.info(f"Order item found: {order_item}")
             
-            # Calculate the reduction in total amount
-            reduction = order_item.price * order_item.quantity
-            
-            # Delete the order item
-            order_item.delete()
-            
-            # Update the order's total amount
-            order.total_amount -= reduction
-            order.save()
+            # Delete the order item and recompute the order's total amount
+            pricing.remove_item(order, order_item)
 
             logger.info(f"Successfully removed item {item_id} from order {order_id}")
             return JsonResponse({
@@ -1250,7 +1092,10 @@ def update_order_address(request, order_id):
         order.delivery_landmark = landmark or None
         order.delivery_building = building or None
         order.delivery_unit = unit or None
-        order.save()
+        # Only the address: a full save would write back stale running totals and status
+        order.save(update_fields=[
+            'delivery_address', 'delivery_landmark', 'delivery_building', 'delivery_unit', 'updated_at',
+        ])
 
         # Build returned HTML snippet for updated address display
         address_lines = []
@@ -1278,16 +1123,13 @@ def update_order_items(request, order_id):
     order = get_object_or_404(Order, order_id=order_id)
     if request.method == 'POST':
         try:
-            total_amount = 0
-            for item in order.items.all():
-                quantity = request.POST.get(f'quantity_{item.id}')
+            quantities = {}
+            for item_id in order.items.values_list('id', flat=True):
+                quantity = request.POST.get(f'quantity_{item_id}')
                 if quantity is not None:
-                    item.quantity = int(quantity)
-                    item.save()
-                    total_amount += item.price * item.quantity
-            
-            order.total_amount = total_amount
-            order.save()
+                    quantities[item_id] = int(quantity)
+
+            total_amount = pricing.update_quantities(order, quantities)
             return JsonResponse({'success': True, 'new_total': str(total_amount)})
         except Exception as e:
             return JsonResponse({'success': False, 'error': str(e)})
@@ -1337,24 +1179,20 @@ def get_order_details(request, order_id):
 def order_details(request, order_id):
     from decimal import Decimal
     order = get_object_or_404(Order, order_id=order_id)
-    categories = Category.objects.filter(is_active=True)
-    menu_items = MenuItem.objects.filter(is_available=True)
+    catalog = menu_catalog.get_catalog()
+    categories = catalog.active_categories()
+    menu_items = catalog.available_items()
     
-    # Calculate settled payments amount (all payments are settled)
-    settled_payments = order.payments.all()
-    settled_amount = sum((Decimal(p.amount) for p in settled_payments), Decimal('0'))
-
-    # Calculate total and remaining amount
-    if order.order_type == 'delivery':
-        total = Decimal(order.total_amount) + Decimal(order.delivery_charge)
-    else:
-        total = Decimal(order.total_amount)
-    remaining_amount = float(total) - float(settled_amount)
+    # Settled amount is kept on the order itself (all payments are settled)
+    settled_amount = order.paid_amount
+    remaining_amount = float(order.remaining_amount)
 
     context = {
         'order': order,
         'categories': categories,
         'menu_items': menu_items,
+        # Versions the cached menu fragments of the template
+        'menu_version': catalog.etag,
         'payment_methods': Payment.PAYMENT_METHOD_CHOICES,
         'settled_amount': settled_amount,
         'has_settled_payments': settled_amount > 0,
@@ -1502,7 +1340,7 @@ class TableListView(ModuleAccessMixin, ListView):
 
     def get_queryset(self):
         # Annotate each table with occupied status based on pending orders
-        tables = Table.objects.all()
+        tables = table_registry.get_tables()
         table_ids_with_pending_orders = set(
             Order.objects.filter(
                 table__isnull=False,
@@ -1552,69 +1390,63 @@ class MenuItemCreateView(ModuleAccessMixin, CreateView):
         form.fields['category'].queryset = Category.objects.filter(is_active=True)
         return form
 
-from django.core.paginator import Paginator
+HISTORY_PAGE_SIZES = (10, 50, 100)
+HISTORY_ORDERING = ['-created_at', '-id']
 
-def transaction_history(request):
-    # Server-side filtering for transaction history (date range, type, search) and pagination
-    orders_qs = OrderHistory.objects.select_related('table').all().order_by('-created_at')
 
-    # Filters from query params
-    q = request.GET.get('q', '').strip()
-    start_date = request.GET.get('start_date')
-    end_date = request.GET.get('end_date')
-    order_type = request.GET.get('order_type')
-    status = request.GET.get('status')  # New status filter
+def transaction_history(request):
+    # Server-side filtering for transaction history (date range, type, search) and
+    # keyset pagination on (created_at, id): every page is one index seek, with no
+    # COUNT(*) over the whole history and no OFFSET scan.
+    from django.template.loader import render_to_string
+    from .pagination import approximate_count, keyset_paginate
+
+    filters = history_queries.get_history_filters(request.GET)
+    q = filters['q']
+    start_date = filters['start_date']
+    end_date = filters['end_date']
+    order_type = filters['order_type']
+    status = filters['status']
     try:
         entries = int(request.GET.get('entries', 10))
     except Exception:
         entries = 10
+    if entries not in HISTORY_PAGE_SIZES:
+        entries = HISTORY_PAGE_SIZES[0]
 
-    if q:
-        from django.db.models import Q
-        orders_qs = orders_qs.filter(
-            Q(order_id__icontains=q) | Q(customer_name__icontains=q) | Q(customer_phone__icontains=q)
-        )
-
-    from datetime import datetime
-    if start_date:
-        try:
-            sd = datetime.strptime(start_date, '%Y-%m-%d').date()
-            orders_qs = orders_qs.filter(created_at__date__gte=sd)
-        except Exception:
-            pass
-    if end_date:
-        try:
-            ed = datetime.strptime(end_date, '%Y-%m-%d').date()
-            orders_qs = orders_qs.filter(created_at__date__lte=ed)
-        except Exception:
-            pass
-
-    if order_type:
-        # Some historical records may have table information stored
-        # even if order_type field is inconsistent. For 'table' filter,
-        # include records where order_type == 'table' OR a table FK exists.
-        from django.db.models import Q
-        if order_type == 'table':
-            orders_qs = orders_qs.filter(Q(order_type='table') | Q(table__isnull=False))
-        else:
-            orders_qs = orders_qs.filter(order_type=order_type)
-    
-    if status:
-        orders_qs = orders_qs.filter(status=status)
+    orders_qs = history_queries.filter_order_history(filters).select_related('completed_by')
+    orders = keyset_paginate(orders_qs, HISTORY_ORDERING, cursor=request.GET.get('cursor'), per_page=entries)
 
-    paginator = Paginator(orders_qs, entries)
-    page = request.GET.get('page')
-    orders = paginator.get_page(page)
+    # JSON variant used by the infinite scroll: the next batch of rendered rows
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'rows_html': render_to_string('restaurant/transaction_history_rows.html', {'orders': orders}, request=request),
+            'orders': [
+                {
+                    'order_id': order.order_id,
+                    'customer_name': order.customer_name,
+                    'order_type': order.order_type,
+                    'table': order.table.number if order.table else None,
+                    'status': order.status,
+                    'total_amount': float(order.total_amount),
+                    'delivery_charge': float(order.delivery_charge),
+                    'created_at': order.created_at.isoformat() if order.created_at else None,
+                }
+                for order in orders
+            ],
+            'next_cursor': orders.next_cursor,
+            'previous_cursor': orders.previous_cursor,
+        })
 
     # Preserve other query params for pagination links
-    from urllib.parse import urlencode
     params = request.GET.copy()
-    if 'page' in params:
-        params.pop('page')
+    for key in ('page', 'cursor', 'format'):
+        params.pop(key, None)
     params_str = params.urlencode()
 
     context = {
         'orders': orders,
+        'total_count': approximate_count(orders_qs),
         'payment_method_choices': Payment.PAYMENT_METHOD_CHOICES,
         'params': params_str,
         'q': q,
@@ -1627,47 +1459,50 @@ def transaction_history(request):
     return render(request, 'restaurant/transaction_history.html', context)
 
 
+@require_module_access('history')
 @login_required
-def export_orders_csv(request):
-    """Export filtered OrderHistory rows as CSV (opens in Excel)."""
-    orders_qs = OrderHistory.objects.select_related('table').all().order_by('-created_at')
+def transaction_history_search(request):
+    """Ranked history search by order ID, customer name or (fuzzy) phone number."""
+    import time
+    from .history_search import search
 
-    # Apply same filters as transaction_history
     q = request.GET.get('q', '').strip()
-    start_date = request.GET.get('start_date')
-    end_date = request.GET.get('end_date')
-    order_type = request.GET.get('order_type')
-    status = request.GET.get('status')
+    try:
+        limit = min(max(int(request.GET.get('limit', 20)), 1), 100)
+    except (TypeError, ValueError):
+        limit = 20
 
-    if q:
-        from django.db.models import Q
-        orders_qs = orders_qs.filter(
-            Q(order_id__icontains=q) | Q(customer_name__icontains=q) | Q(customer_phone__icontains=q)
-        )
+    started = time.perf_counter()
+    results = search(q, limit=limit)
+    took_ms = (time.perf_counter() - started) * 1000
 
-    from datetime import datetime
-    if start_date:
-        try:
-            sd = datetime.strptime(start_date, '%Y-%m-%d').date()
-            orders_qs = orders_qs.filter(created_at__date__gte=sd)
-        except Exception:
-            pass
-    if end_date:
-        try:
-            ed = datetime.strptime(end_date, '%Y-%m-%d').date()
-            orders_qs = orders_qs.filter(created_at__date__lte=ed)
-        except Exception:
-            pass
+    return JsonResponse({
+        'q': q,
+        'took_ms': round(took_ms, 2),
+        'results': [
+            {
+                'order_id': order.order_id,
+                'customer_name': order.customer_name,
+                'customer_phone': order.customer_phone,
+                'order_type': order.order_type,
+                'table': order.table.number if order.table else None,
+                'status': order.status,
+                'total_amount': float(order.total_amount),
+                'created_at': order.created_at.isoformat() if order.created_at else None,
+                'rank': round(order.search_rank, 4),
+                'details_url': reverse('restaurant:order_history_details', args=[order.order_id]),
+            }
+            for order in results
+        ],
+    })
 
-    if order_type:
-        from django.db.models import Q
-        if order_type == 'table':
-            # For 'table' filter, include records where order_type == 'table' OR a table FK exists
-            orders_qs = orders_qs.filter(Q(order_type='table') | Q(table__isnull=False))
-        else:
-            orders_qs = orders_qs.filter(order_type=order_type)
-    if status:
-        orders_qs = orders_qs.filter(status=status)
+
+@login_required
+def export_orders_csv(request):
+    """Export filtered OrderHistory rows as CSV (opens in Excel)."""
+    # Apply same filters as transaction_history
+    filters = history_queries.get_history_filters(request.GET)
+    orders_qs = history_queries.filter_order_history(filters)
 
     # Prepare CSV
     import csv
@@ -1708,44 +1543,14 @@ def export_orders_pdf(request):
     """Export filtered OrderHistory rows as a professionally formatted PDF with tables.
     Requires `reportlab` package. If not available, returns 501 with installation hint.
     """
-    orders_qs = OrderHistory.objects.select_related('table').all().order_by('-created_at')
-
-    # Reuse same filtering logic
-    q = request.GET.get('q', '').strip()
-    start_date = request.GET.get('start_date')
-    end_date = request.GET.get('end_date')
-    order_type = request.GET.get('order_type')
-    status = request.GET.get('status')
-
-    if q:
-        from django.db.models import Q
-        orders_qs = orders_qs.filter(
-            Q(order_id__icontains=q) | Q(customer_name__icontains=q) | Q(customer_phone__icontains=q)
-        )
-
-    from datetime import datetime
-    if start_date:
-        try:
-            sd = datetime.strptime(start_date, '%Y-%m-%d').date()
-            orders_qs = orders_qs.filter(created_at__date__gte=sd)
-        except Exception:
-            pass
-    if end_date:
-        try:
-            ed = datetime.strptime(end_date, '%Y-%m-%d').date()
-            orders_qs = orders_qs.filter(created_at__date__lte=ed)
-        except Exception:
-            pass
-
-    if order_type:
-        from django.db.models import Q
-        if order_type == 'table':
-            # For 'table' filter, include records where order_type == 'table' OR a table FK exists
-            orders_qs = orders_qs.filter(Q(order_type='table') | Q(table__isnull=False))
-        else:
-            orders_qs = orders_qs.filter(order_type=order_type)
-    if status:
-        orders_qs = orders_qs.filter(status=status)
+    # Apply same filters as transaction_history
+    filters = history_queries.get_history_filters(request.GET)
+    q = filters['q']
+    start_date = filters['start_date']
+    end_date = filters['end_date']
+    order_type = filters['order_type']
+    status = filters['status']
+    orders_qs = history_queries.filter_order_history(filters)
 
     try:
         from reportlab.lib.pagesizes import letter, A4
@@ -1888,6 +1693,49 @@ def export_orders_pdf(request):
     return HttpResponse(buffer, content_type='application/pdf', headers={'Content-Disposition': 'attachment; filename="transaction_history.pdf"'})
 
 
+@require_module_access('history')
+@login_required
+def export_history_parquet(request):
+    """Staff endpoint for the incremental columnar history export.
+
+    GET returns the export watermark and file list, or downloads one file
+    with `?file=<relative path>`. POST appends orders newer than the
+    watermark (`full=1` re-exports everything), a few chunks per request:
+    while the response says `"complete": false`, POST again. Large
+    backlogs are better left to `manage.py export_history_parquet`.
+    """
+    from django.http import FileResponse
+    from .history_export import (
+        REQUEST_MAX_CHUNKS, ExportInProgress, export_history, export_root, list_files, read_watermark,
+    )
+
+    if not request.user.is_staff and not request.user.is_superuser:
+        return JsonResponse({'status': 'error', 'message': 'Staff only'}, status=403)
+
+    if request.method == 'POST':
+        try:
+            summary = export_history(
+                fmt=request.POST.get('format') or None,
+                full=request.POST.get('full') in ('1', 'true'),
+                max_chunks=REQUEST_MAX_CHUNKS,
+            )
+        except ExportInProgress as e:
+            return JsonResponse({'status': 'error', 'message': str(e)}, status=409)
+        except ValueError as e:
+            return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+        return JsonResponse({'status': 'success', **summary})
+
+    root = export_root()
+    requested = request.GET.get('file')
+    if requested:
+        # Only files listed by the export itself can be downloaded
+        if requested not in list_files(root):
+            raise Http404('No such export file')
+        return FileResponse(open(root / requested, 'rb'), as_attachment=True, filename=requested.replace('/', '_'))
+
+    return JsonResponse({'watermark': read_watermark(root), 'files': list_files(root)})
+
+
 class MenuItemUpdateView(ModuleAccessMixin, UpdateView):
     module_required = 'menu'
     model = MenuItem
@@ -1945,15 +1793,29 @@ class OrderListView(ModuleAccessMixin, ListView):
     model = Order
     template_name = 'restaurant/order_list.html'
     context_object_name = 'orders'
-    ordering = ['-created_at']
-    
+    ordering = ['-created_at', '-id']
+    keyset_page_size = 50
+
     def get_queryset(self):
         # Show all active orders. Exclude completed+paid and cancelled orders.
         # Keep completed orders if payment pending.
+        # Paid amount and item count are running totals on the order row itself.
         from django.db.models import Q
         return Order.objects.exclude(
             Q(status='completed', payment_status='paid') | Q(status='cancelled')
-        ).order_by('-created_at')
+        ).select_related('table', 'created_by').order_by(*self.ordering)
+
+    def get_context_data(self, **kwargs):
+        # Keyset pagination: constant cost per page no matter how many orders are open
+        from .pagination import keyset_paginate
+        page = keyset_paginate(
+            self.object_list, self.ordering,
+            cursor=self.request.GET.get('cursor'),
+            per_page=self.keyset_page_size,
+        )
+        context = super().get_context_data(object_list=page.object_list, **kwargs)
+        context['page'] = page
+        return context
 
 from django.views.decorators.csrf import csrf_exempt
 
@@ -1969,15 +1831,15 @@ def add_payment(request, order_id):
             payment = form.save(commit=False)
             payment.order = order
             payment.edited_by = request.user
-            payment.save()
-
-            # Update remaining amount including delivery charge for delivery orders
-            total_paid = Decimal(order.payments.aggregate(Sum('amount'))['amount__sum'] or 0)
-            if order.order_type == 'delivery':
-                total_amount = Decimal(order.total_amount) + Decimal(order.delivery_charge)
-            else:
-                total_amount = Decimal(order.total_amount)
-            remaining_amount = float(total_amount - total_paid)
+            with transaction.atomic():
+                # Waits for a concurrent close; the order may be in history by then
+                if not pricing.lock_order(order):
+                    return JsonResponse({'status': 'error', 'message': 'Order is no longer open'}, status=404)
+                payment.save()
+                order.refresh_from_db(fields=['paid_amount'])
+
+            # Remaining amount includes delivery charge for delivery orders
+            remaining_amount = float(order.remaining_amount)
 
             return JsonResponse({'status': 'success', 'remaining_amount': remaining_amount})
         else:
@@ -0,0 +1,61 @@
+"""
+ASGI config for restaurant_project project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+
+Serve it with uvicorn workers under gunicorn (pip install "uvicorn[standard]"):
+
+    gunicorn restaurant_project.asgi:application -k uvicorn.workers.UvicornWorker \\
+        --workers 2 --timeout 60 --graceful-timeout 30 --keep-alive 30
+
+or, for a single process, `uvicorn restaurant_project.asgi:application`.
+
+The kitchen board feed (held open as a long poll), the kitchen status APIs
+and the forecast API are async views, so one ASGI worker keeps hundreds of
+them in flight where a sync WSGI worker serves one at a time. Two or three
+workers per CPU are enough; add workers for CPU (not for open connections).
+Sync views still work: Django runs them on a thread, one request at a time
+per worker, so keep slow sync pages (e.g. PDF and CSV exports) in mind when
+sizing. `--timeout` must exceed the longest held poll (KITCHEN_POLL_MAX_WAIT
+in restaurant/views.py, 25s).
+
+The WSGI deployment (restaurant_project/wsgi.py) keeps working unchanged;
+there the async views run to completion inside the worker, and the kitchen
+board falls back to polling every few seconds. See
+benchmarks/bench_concurrency.py for a comparison of the two.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
+"""
+
+import os
+import logging
+import sys
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'restaurant_project.settings')
+
+# Configure logging early
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    stream=sys.stdout
+)
+logger = logging.getLogger(__name__)
+
+try:
+    application = get_asgi_application()
+    logger.info("Django ASGI application initialized successfully")
+
+    # Check pooler health and set up fallback if needed
+    try:
+        from restaurant_project.db_router import check_pooler_health_on_startup, get_active_db_host
+        check_pooler_health_on_startup()
+        logger.info(f"Database: {get_active_db_host()}")
+    except Exception as e:
+        logger.warning(f"Could not check pooler health: {e}")
+
+except Exception as e:
+    logger.error(f"Failed to initialize Django application: {str(e)}", exc_info=True)
+    raise
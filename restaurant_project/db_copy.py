@@ -0,0 +1,400 @@
+"""
+Streaming copy of the SQLite database into PostgreSQL.
+
+Tables are copied one at a time in foreign-key order (parents first). Each
+table is read from the SQLite file in rowid order, `chunk_size` rows at a
+time, and every chunk is written with `COPY ... FROM STDIN` in its own
+transaction together with a checkpoint row, so memory stays bounded by one
+chunk and a failed run resumes after the last committed chunk. Afterwards
+the serial sequences are moved past the copied ids; restaurant_project.db_verify
+compares the two databases chunk by chunk.
+
+The target schema must already exist (`manage.py migrate`); only columns
+present on both sides are copied and generated columns are left to
+Postgres. The SQLite file is opened read-only and must not be written to
+while a copy is in progress.
+"""
+
+import hashlib
+import io
+import json
+import logging
+import re
+import sqlite3
+import uuid
+from collections import namedtuple
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from psycopg2 import sql
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_TABLE = '_sqlite_copy_checkpoint'
+# Filled in on the target by `migrate` itself
+SKIP_TABLES = frozenset({'django_migrations'})
+DEFAULT_CHUNK_SIZE = 5000
+
+_OFFSET_RE = re.compile(r'(Z|[+-]\d\d(:?\d\d)?)$')
+
+TablePlan = namedtuple('TablePlan', 'name columns kinds')
+
+
+def open_source(path):
+    """Open the SQLite file read-only."""
+    return sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+
+
+def source_tables(source):
+    """{table: ([columns], {referenced tables})} for the user tables in SQLite."""
+    names = [row[0] for row in source.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+    )]
+    tables = {}
+    for name in names:
+        columns = [row[1] for row in source.execute(f'PRAGMA table_info("{name}")')]
+        parents = {row[2] for row in source.execute(f'PRAGMA foreign_key_list("{name}")')} - {name}
+        tables[name] = (columns, parents)
+    return tables
+
+
+def dependency_order(parents):
+    """Order table names so referenced tables come first.
+
+    `parents` maps each table to the tables it references. Returns
+    (ordered names, names caught in a reference cycle); the cyclic ones are
+    appended at the end in name order.
+    """
+    remaining = {name: set(refs) & set(parents) for name, refs in parents.items()}
+    ordered = []
+    while True:
+        ready = sorted(name for name, refs in remaining.items() if not refs)
+        if not ready:
+            break
+        for name in ready:
+            ordered.append(name)
+            del remaining[name]
+        for refs in remaining.values():
+            refs.difference_update(ready)
+    cyclic = sorted(remaining)
+    return ordered + cyclic, cyclic
+
+
+def column_kind(data_type, scale=None):
+    """How values of a Postgres column type are encoded and compared."""
+    if data_type == 'boolean':
+        return 'bool'
+    if data_type in ('smallint', 'integer', 'bigint'):
+        return 'int'
+    if data_type == 'numeric':
+        return f'numeric:{scale}' if scale is not None else 'numeric'
+    if data_type in ('real', 'double precision'):
+        return 'float'
+    if data_type == 'timestamp with time zone':
+        return 'timestamptz'
+    if data_type == 'timestamp without time zone':
+        return 'timestamp'
+    if data_type == 'date':
+        return 'date'
+    if data_type.startswith('time'):
+        return 'time'
+    if data_type == 'interval':
+        return 'interval'
+    if data_type in ('json', 'jsonb'):
+        return 'json'
+    if data_type == 'uuid':
+        return 'uuid'
+    if data_type == 'bytea':
+        return 'bytes'
+    return 'text'
+
+
+def _escape(text):
+    return text.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def copy_value(value, kind):
+    """Encode one SQLite value as a field of COPY's text format."""
+    if value is None:
+        return '\\N'
+    if kind == 'bool':
+        return 't' if value and value not in ('0', 'f', 'false', 'False') else 'f'
+    if kind == 'bytes':
+        data = value if isinstance(value, bytes) else str(value).encode()
+        return '\\\\x' + data.hex()
+    if kind == 'interval':
+        # Django stores DurationField as microseconds on SQLite
+        return f'{int(value)} microseconds'
+    if kind == 'timestamptz':
+        text = str(value)
+        # Django writes aware datetimes to SQLite as naive UTC
+        return _escape(text if _OFFSET_RE.search(text) else text + '+00')
+    if kind == 'json' and not isinstance(value, str):
+        return _escape(json.dumps(value))
+    if isinstance(value, float):
+        return repr(value)
+    return _escape(str(value))
+
+
+def copy_line(row, kinds):
+    return '\t'.join(copy_value(value, kind) for value, kind in zip(row, kinds)) + '\n'
+
+
+def _datetime(value):
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if value.tzinfo is not None:
+        value = value.astimezone(dt_timezone.utc).replace(tzinfo=None)
+    return value.isoformat(sep=' ', timespec='microseconds')
+
+
+def canonical(value, kind):
+    """A text form of `value` that is equal on both sides for equal data.
+
+    Accepts raw SQLite values and the Python values psycopg2 returns for
+    the same column, so checksums can be compared across the databases.
+    """
+    if value is None:
+        return '\\N'
+    if kind == 'bool':
+        return 't' if value and value not in ('0', 'f', 'false', 'False') else 'f'
+    if kind == 'int':
+        return str(int(value))
+    if kind.startswith('numeric'):
+        number = Decimal(str(value))
+        if ':' in kind:
+            return str(number.quantize(Decimal(1).scaleb(-int(kind.split(':')[1]))))
+        return format(number.normalize(), 'f')
+    if kind == 'float':
+        return repr(float(value))
+    if kind in ('timestamptz', 'timestamp'):
+        return _datetime(value)
+    if kind == 'date':
+        return (date.fromisoformat(value[:10]) if isinstance(value, str) else value).isoformat()
+    if kind == 'time':
+        return (time.fromisoformat(value) if isinstance(value, str) else value).isoformat(timespec='microseconds')
+    if kind == 'interval':
+        return str(value // timedelta(microseconds=1) if isinstance(value, timedelta) else int(value))
+    if kind == 'json':
+        return json.dumps(json.loads(value) if isinstance(value, str) else value, sort_keys=True,
+                          separators=(',', ':'))
+    if kind == 'uuid':
+        return uuid.UUID(str(value)).hex
+    if kind == 'bytes':
+        return bytes(value).hex() if not isinstance(value, str) else value.encode().hex()
+    return str(value)
+
+
+def row_hash(row, kinds):
+    """64-bit hash of one row; summed over a range so row order does not matter."""
+    text = '\x1f'.join(canonical(value, kind) for value, kind in zip(row, kinds))
+    return int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], 'big')
+
+
+class SQLiteToPostgresCopier:
+    """Copies an SQLite file into a psycopg2 connection, resumably."""
+
+    def __init__(self, source_path, target, chunk_size=DEFAULT_CHUNK_SIZE, log=None):
+        self.source_path = source_path
+        self.source = open_source(source_path)
+        self.target = target
+        self.chunk_size = chunk_size
+        self.log = log or logger.info
+        self.warnings = []
+        self._plan = None
+
+        with self.target.cursor() as cursor:
+            cursor.execute("SET TIME ZONE 'UTC'")
+        self.target.commit()
+
+    def close(self):
+        self.source.close()
+
+    def warn(self, message):
+        self.warnings.append(message)
+        self.log(f'⚠ {message}')
+
+    # Schema
+
+    def target_columns(self, table):
+        """{column: kind} of a target table, generated columns excluded."""
+        with self.target.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT column_name, data_type, numeric_scale
+                FROM information_schema.columns
+                WHERE table_schema = current_schema() AND table_name = %s AND is_generated = 'NEVER'
+                ORDER BY ordinal_position
+                """,
+                [table],
+            )
+            return {name: column_kind(data_type, scale) for name, data_type, scale in cursor.fetchall()}
+
+    def plan(self):
+        """The tables to copy, in dependency order, with their shared columns."""
+        if self._plan is not None:
+            return self._plan
+
+        tables = {name: info for name, info in source_tables(self.source).items() if name not in SKIP_TABLES}
+        order, cyclic = dependency_order({name: parents for name, (_, parents) in tables.items()})
+        if cyclic:
+            self.warn(f"Reference cycle between {', '.join(cyclic)}; foreign keys may fail mid-copy")
+
+        plans = []
+        for name in order:
+            target = self.target_columns(name)
+            if not target:
+                self.warn(f'{name}: not in the target database, skipped')
+                continue
+            columns = [column for column in tables[name][0] if column in target]
+            dropped = sorted(set(tables[name][0]) - set(columns))
+            if dropped:
+                self.warn(f"{name}: columns missing in the target, not copied: {', '.join(dropped)}")
+            plans.append(TablePlan(name, columns, [target[column] for column in columns]))
+        self._plan = plans
+        return plans
+
+    # Checkpoints
+
+    def _ensure_checkpoint_table(self):
+        with self.target.cursor() as cursor:
+            cursor.execute(
+                sql.SQL(
+                    """
+                    CREATE TABLE IF NOT EXISTS {} (
+                        table_name text PRIMARY KEY,
+                        last_rowid bigint NOT NULL,
+                        copied bigint NOT NULL,
+                        done boolean NOT NULL DEFAULT false,
+                        updated_at timestamptz NOT NULL DEFAULT now()
+                    )
+                    """
+                ).format(sql.Identifier(CHECKPOINT_TABLE))
+            )
+        self.target.commit()
+
+    def checkpoints(self):
+        """{table: (last_rowid, copied, done)} from earlier runs."""
+        with self.target.cursor() as cursor:
+            cursor.execute(
+                sql.SQL('SELECT table_name, last_rowid, copied, done FROM {}').format(sql.Identifier(CHECKPOINT_TABLE))
+            )
+            return {name: (last_rowid, copied, done) for name, last_rowid, copied, done in cursor.fetchall()}
+
+    def _save_checkpoint(self, cursor, table, last_rowid, copied, done=False):
+        cursor.execute(
+            sql.SQL(
+                """
+                INSERT INTO {} (table_name, last_rowid, copied, done, updated_at)
+                VALUES (%s, %s, %s, %s, now())
+                ON CONFLICT (table_name) DO UPDATE
+                SET last_rowid = EXCLUDED.last_rowid, copied = EXCLUDED.copied,
+                    done = EXCLUDED.done, updated_at = EXCLUDED.updated_at
+                """
+            ).format(sql.Identifier(CHECKPOINT_TABLE)),
+            [table, last_rowid, copied, done],
+        )
+
+    def clear_checkpoints(self):
+        """Drop the checkpoint table once the copy has been verified."""
+        with self.target.cursor() as cursor:
+            cursor.execute(sql.SQL('DROP TABLE IF EXISTS {}').format(sql.Identifier(CHECKPOINT_TABLE)))
+        self.target.commit()
+
+    # Copy
+
+    def _truncate(self, plans):
+        self.log(f'Emptying {len(plans)} target table(s)...')
+        with self.target.cursor() as cursor:
+            cursor.execute(
+                sql.SQL('TRUNCATE {} RESTART IDENTITY CASCADE').format(
+                    sql.SQL(', ').join(sql.Identifier(plan.name) for plan in plans)
+                )
+            )
+            cursor.execute(sql.SQL('DELETE FROM {}').format(sql.Identifier(CHECKPOINT_TABLE)))
+        self.target.commit()
+
+    def run(self, restart=False):
+        """Copy every table, resuming from the checkpoints unless `restart`.
+
+        A run without checkpoints (or with `restart`) first empties the
+        target tables, including the rows `migrate` created (content types,
+        permissions), so every id matches the source. Returns
+        {table: rows copied}.
+        """
+        plans = self.plan()
+        self._ensure_checkpoint_table()
+        done = self.checkpoints()
+        if restart or not done:
+            self._truncate(plans)
+            done = {}
+        else:
+            self.log(f'Resuming: {sum(1 for state in done.values() if state[2])} table(s) already copied')
+
+        copied = {}
+        for plan in plans:
+            copied[plan.name] = self.copy_table(plan, *done.get(plan.name, (0, 0, False)))
+        self.reset_sequences(plans)
+        return copied
+
+    def copy_table(self, plan, last_rowid=0, copied=0, done=False):
+        """Copy the rows of one table after `last_rowid`; returns its row count."""
+        if done:
+            return copied
+
+        select = 'SELECT rowid, {} FROM "{}" WHERE rowid > ? ORDER BY rowid LIMIT ?'.format(
+            ', '.join(f'"{column}"' for column in plan.columns), plan.name
+        )
+        copy = sql.SQL('COPY {} ({}) FROM STDIN').format(
+            sql.Identifier(plan.name), sql.SQL(', ').join(sql.Identifier(column) for column in plan.columns)
+        )
+        while True:
+            rows = self.source.execute(select, (last_rowid, self.chunk_size)).fetchall()
+            if not rows:
+                break
+            buffer = io.StringIO()
+            for row in rows:
+                buffer.write(copy_line(row[1:], plan.kinds))
+            buffer.seek(0)
+            last_rowid = rows[-1][0]
+            try:
+                with self.target.cursor() as cursor:
+                    cursor.copy_expert(copy.as_string(self.target), buffer)
+                    self._save_checkpoint(cursor, plan.name, last_rowid, copied + len(rows))
+                self.target.commit()
+            except Exception:
+                self.target.rollback()
+                raise
+            copied += len(rows)
+            if len(rows) < self.chunk_size:
+                break
+            self.log(f'  {plan.name}: {copied} rows')
+
+        with self.target.cursor() as cursor:
+            self._save_checkpoint(cursor, plan.name, last_rowid, copied, done=True)
+        self.target.commit()
+        self.log(f'{plan.name}: {copied} rows copied')
+        return copied
+
+    def reset_sequences(self, plans=None):
+        """Move every serial/identity sequence past the largest copied id."""
+        plans = self.plan() if plans is None else plans
+        with self.target.cursor() as cursor:
+            for plan in plans:
+                cursor.execute(
+                    """
+                    SELECT column_name FROM information_schema.columns
+                    WHERE table_schema = current_schema() AND table_name = %s
+                      AND (column_default LIKE 'nextval(%%' OR is_identity = 'YES')
+                    """,
+                    [plan.name],
+                )
+                for (column,) in cursor.fetchall():
+                    cursor.execute(
+                        sql.SQL(
+                            'SELECT setval(pg_get_serial_sequence(%s, %s), COALESCE(MAX({column}), 1), '
+                            'MAX({column}) IS NOT NULL) FROM {table}'
+                        ).format(column=sql.Identifier(column), table=sql.Identifier(plan.name)),
+                        [sql.Identifier(plan.name).as_string(self.target), column],
+                    )
+        self.target.commit()
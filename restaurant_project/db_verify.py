@@ -0,0 +1,240 @@
+"""
+Chunked checksum comparison of the SQLite database and its PostgreSQL copy.
+
+Every table is split into primary-key ranges of `chunk_size` ids. For each
+range both databases are read by worker processes and reduced to a row
+count and an order-independent checksum (the sum of the 64-bit row hashes
+of restaurant_project.db_copy, over values normalized by column type), so
+equal data gives equal checksums whatever the storage. Only ranges whose
+checksums differ are split further (`fanout` parts at a time) until they
+are small enough to compare row by row, which names the exact primary keys
+that are missing, extra or changed in the target.
+
+Tables whose primary key is not an integer (e.g. django_session) are
+compared row by row as a whole.
+"""
+
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import psycopg2
+
+from .db_copy import SKIP_TABLES, column_kind, open_source, row_hash
+
+DEFAULT_CHUNK_SIZE = 50000
+DEFAULT_LEAF_SIZE = 500
+DEFAULT_FANOUT = 16
+
+_CHECKSUM_MOD = 2 ** 64
+
+# `columns` starts with the primary key, so it is part of every row hash
+TableSpec = namedtuple('TableSpec', 'name pk columns kinds integer_pk')
+Difference = namedtuple('Difference', 'pk kind')  # kind: 'missing', 'extra' or 'changed'
+
+
+class TableReport:
+    """Outcome of verifying one table."""
+
+    def __init__(self, name):
+        self.name = name
+        self.source_rows = 0
+        self.target_rows = 0
+        self.chunks = 0
+        self.differing_chunks = 0
+        self.differences = []
+
+    @property
+    def ok(self):
+        return not self.differences and self.source_rows == self.target_rows
+
+
+# Worker side: each process keeps one connection to each database
+
+_connections = {}
+
+
+def _init_worker(source_path, target_params):
+    _connections.clear()
+    _connections['source'] = open_source(source_path)
+    target = psycopg2.connect(**target_params)
+    target.autocommit = True
+    _connections['target'] = target
+
+
+def _select(side, spec, lo, hi):
+    columns = ', '.join(f'"{column}"' for column in spec.columns)
+    query = f'SELECT {columns} FROM "{spec.name}"'
+    if lo is None:
+        return query, []
+    param = '?' if side == 'source' else '%s'
+    return f'{query} WHERE "{spec.pk}" >= {param} AND "{spec.pk}" < {param}', [lo, hi]
+
+
+def _rows(side, spec, lo, hi):
+    query, params = _select(side, spec, lo, hi)
+    cursor = _connections[side].cursor()
+    try:
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(5000)
+            if not rows:
+                return
+            yield from rows
+    finally:
+        cursor.close()
+
+
+def hash_range(side, spec, lo, hi):
+    """(rows, checksum) of `spec` rows with lo <= pk < hi on one side."""
+    count = total = 0
+    for row in _rows(side, spec, lo, hi):
+        total = (total + row_hash(row, spec.kinds)) % _CHECKSUM_MOD
+        count += 1
+    return count, total
+
+
+def row_hashes(side, spec, lo, hi):
+    """{pk: row hash} of `spec` rows with lo <= pk < hi on one side."""
+    return {row[0]: row_hash(row, spec.kinds) for row in _rows(side, spec, lo, hi)}
+
+
+def _key_range(side, spec):
+    query = f'SELECT MIN("{spec.pk}"), MAX("{spec.pk}") FROM "{spec.name}"'
+    cursor = _connections[side].cursor()
+    try:
+        cursor.execute(query)
+        return cursor.fetchone()
+    finally:
+        cursor.close()
+
+
+def split_range(lo, hi, parts):
+    """Split [lo, hi) into at most `parts` contiguous non-empty ranges."""
+    step = max(1, -(-(hi - lo) // parts))
+    return [(start, min(start + step, hi)) for start in range(lo, hi, step)]
+
+
+class Verifier:
+    """Compares an SQLite file with a PostgreSQL database chunk by chunk."""
+
+    def __init__(self, source_path, target_params, chunk_size=DEFAULT_CHUNK_SIZE, leaf_size=DEFAULT_LEAF_SIZE,
+                 fanout=DEFAULT_FANOUT, workers=None, log=None):
+        self.source_path = source_path
+        self.target_params = target_params
+        self.chunk_size = chunk_size
+        self.leaf_size = leaf_size
+        self.fanout = fanout
+        self.workers = workers or os.cpu_count() or 1
+        self.log = log or (lambda message: None)
+
+    def tables(self):
+        """TableSpec for every SQLite table that also exists in the target."""
+        source = open_source(self.source_path)
+        target = psycopg2.connect(**self.target_params)
+        try:
+            names = [row[0] for row in source.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+            )]
+            specs = []
+            with target.cursor() as cursor:
+                for name in names:
+                    if name in SKIP_TABLES:
+                        continue
+                    cursor.execute(
+                        """
+                        SELECT column_name, data_type, numeric_scale
+                        FROM information_schema.columns
+                        WHERE table_schema = current_schema() AND table_name = %s AND is_generated = 'NEVER'
+                        """,
+                        [name],
+                    )
+                    kinds = {column: column_kind(data_type, scale) for column, data_type, scale in cursor.fetchall()}
+                    info = list(source.execute(f'PRAGMA table_info("{name}")'))
+                    pks = [row[1] for row in info if row[5]]
+                    if not kinds or len(pks) != 1:
+                        continue
+                    columns = (pks[0],) + tuple(row[1] for row in info if row[1] in kinds and row[1] != pks[0])
+                    specs.append(TableSpec(
+                        name, pks[0], columns, tuple(kinds[column] for column in columns),
+                        kinds.get(pks[0]) == 'int',
+                    ))
+            return specs
+        finally:
+            source.close()
+            target.close()
+
+    def run(self, tables=None):
+        """Verify every table (or those named); returns {table: TableReport}."""
+        specs = [spec for spec in self.tables() if tables is None or spec.name in tables]
+        reports = {}
+        with ProcessPoolExecutor(
+            max_workers=self.workers, initializer=_init_worker, initargs=(self.source_path, self.target_params)
+        ) as pool:
+            for spec in specs:
+                reports[spec.name] = self.verify_table(pool, spec)
+                report = reports[spec.name]
+                self.log(
+                    f'{spec.name}: {report.chunks} chunk(s), {report.differing_chunks} differing, '
+                    f'{len(report.differences)} row(s) differ'
+                )
+        return reports
+
+    def verify_table(self, pool, spec):
+        report = TableReport(spec.name)
+        if not spec.integer_pk:
+            # One range covering the whole table, compared row by row
+            report.chunks = 1
+            self._compare_rows(pool, spec, [(None, None)], report)
+            return report
+
+        bounds = [pool.submit(_key_range, side, spec) for side in ('source', 'target')]
+        keys = [key for future in bounds for key in future.result() if key is not None]
+        if not keys:
+            return report
+        ranges = split_range(min(keys), max(keys) + 1, -(-(max(keys) + 1 - min(keys)) // self.chunk_size))
+        report.chunks = len(ranges)
+
+        level = self._hash(pool, spec, ranges, report, count=True)
+        report.differing_chunks = len(level)
+        while level:
+            self._compare_rows(pool, spec, [(lo, hi) for lo, hi in level if hi - lo <= self.leaf_size], report)
+            parts = [part for lo, hi in level if hi - lo > self.leaf_size for part in split_range(lo, hi, self.fanout)]
+            level = self._hash(pool, spec, parts, report) if parts else []
+        report.differences.sort()
+        return report
+
+    def _hash(self, pool, spec, ranges, report, count=False):
+        """Hash `ranges` on both sides in parallel; return those that differ."""
+        futures = [
+            (lo, hi, pool.submit(hash_range, 'source', spec, lo, hi),
+             pool.submit(hash_range, 'target', spec, lo, hi))
+            for lo, hi in ranges
+        ]
+        differing = []
+        for lo, hi, source, target in futures:
+            source, target = source.result(), target.result()
+            if count:
+                report.source_rows += source[0]
+                report.target_rows += target[0]
+            if source != target:
+                differing.append((lo, hi))
+        return differing
+
+    def _compare_rows(self, pool, spec, ranges, report):
+        """Compare `ranges` row by row and record the differing keys."""
+        futures = [
+            (lo, pool.submit(row_hashes, 'source', spec, lo, hi), pool.submit(row_hashes, 'target', spec, lo, hi))
+            for lo, hi in ranges
+        ]
+        for lo, source, target in futures:
+            source, target = source.result(), target.result()
+            if lo is None:
+                report.source_rows, report.target_rows = len(source), len(target)
+            for pk in source.keys() - target.keys():
+                report.differences.append(Difference(pk, 'missing'))
+            for pk in target.keys() - source.keys():
+                report.differences.append(Difference(pk, 'extra'))
+            for pk in source.keys() & target.keys():
+                if source[pk] != target[pk]:
+                    report.differences.append(Difference(pk, 'changed'))
@@ -59,7 +59,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'restaurant.middleware.StaticFilesMiddleware',  # WhiteNoise, async-capable for ASGI
     'restaurant.middleware.DatabaseHealthMiddleware',  # Add early to catch DB errors
     'django.contrib.sessions.middleware.SessionMiddleware',
     'restaurant.middleware.TimezoneMiddleware',
@@ -73,12 +73,25 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'restaurant_project.urls'
 
+# The cached loader keeps compiled templates for the life of the process.
+# With DEBUG on templates are re-read on every render so that edits show up;
+# CACHED_TEMPLATES overrides that either way.
+CACHED_TEMPLATES = config('CACHED_TEMPLATES', default=not DEBUG, cast=bool)
+_template_loaders = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+if CACHED_TEMPLATES:
+    _template_loaders = [('django.template.loaders.cached.Loader', _template_loaders)]
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'restaurant/templates')],
-        'APP_DIRS': True,
+        # App directories are searched by the loaders below
+        'APP_DIRS': False,
         'OPTIONS': {
+            'loaders': _template_loaders,
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -86,7 +99,8 @@ TEMPLATES = [
                 'django.contrib.messages.context_processors.messages',
                 # Temporarily disabled custom context processors to debug issue
                 # 'accounts.context_processors.user_permissions',
-                # 'restaurant.context_processors.add_valid_table_id',
+                # Served from the in-process table registry (no per-request queries)
+                'restaurant.context_processors.add_valid_table_id',
             ],
         },
     },
@@ -94,6 +108,19 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'restaurant_project.wsgi.application'
 
+# Per-process caches. {% cache %} fragments go to their own cache; their keys
+# include the version of what they show (e.g. the menu catalog etag), so an
+# entry is never stale and its timeout only bounds memory.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'template_fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'template-fragments',
+    },
+}
+
 # Database - Supabase PostgreSQL with improved connection handling and fallback
 import ssl
 
@@ -267,6 +294,16 @@ USE_TZ = True
 STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR.parent, 'staticfiles')
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+
+# Uploaded files (menu images and their thumbnails), served under MEDIA_URL.
+# Before MEDIA_ROOT was set, uploads were saved relative to the working directory;
+# `manage.py move_media_uploads --from <that directory>` moves them here.
+MEDIA_URL = '/media/'
+MEDIA_ROOT = config('MEDIA_ROOT', default=os.path.join(BASE_DIR.parent, 'media'))
+
+# Generated files that must not be publicly served (history archives and
+# exports); keep it outside MEDIA_ROOT
+PRIVATE_ROOT = config('PRIVATE_ROOT', default=os.path.join(BASE_DIR.parent, 'private'))
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Use custom user model from accounts app
@@ -282,3 +319,37 @@ if not DEBUG:
     SECURE_HSTS_PRELOAD = True
 
 
+
+# Seconds before a worker re-reads the in-process table registry even without
+# a local Table save/delete (edits made through other workers)
+TABLE_REGISTRY_TTL = config('TABLE_REGISTRY_TTL', default=300, cast=int)
+
+# Same for the menu catalog when the cache is per-process (LocMem); a shared
+# cache picks up menu edits from other workers immediately
+MENU_CATALOG_TTL = config('MENU_CATALOG_TTL', default=300, cast=int)
+
+# Menu popularity ranking (restaurant.menu_ranking): snapshot lifetime, and the
+# minimum gap in seconds between re-ranks triggered by archived orders
+MENU_RANKING_TTL = config('MENU_RANKING_TTL', default=300, cast=int)
+MENU_RANKING_REFRESH_INTERVAL = config('MENU_RANKING_REFRESH_INTERVAL', default=60, cast=int)
+
+# Anonymous public menu (menu/public/): browser/proxy cache lifetime in seconds,
+# and where pre-rendered, precompressed bodies are kept (default: MEDIA_ROOT/cache/public_menu)
+PUBLIC_MENU_MAX_AGE = config('PUBLIC_MENU_MAX_AGE', default=60, cast=int)
+PUBLIC_MENU_CACHE_DIR = config('PUBLIC_MENU_CACHE_DIR', default='') or None
+
+# Where generated QR images are cached (default: MEDIA_ROOT/cache/qr)
+QR_CACHE_DIR = config('QR_CACHE_DIR', default='') or None
+
+# Resized WebP/JPEG variants of menu images (restaurant.thumbnails): widths in
+# pixels, and whether to create them right after upload (otherwise only
+# `manage.py backfill_thumbnails` does; pages never resize on view)
+THUMBNAIL_WIDTHS = (160, 320, 640, 1024)
+THUMBNAILS_ON_UPLOAD = config('THUMBNAILS_ON_UPLOAD', default=True, cast=bool)
+
+# Where archive_order_history writes archived months (default: PRIVATE_ROOT/archive/order_history)
+HISTORY_ARCHIVE_ROOT = config('HISTORY_ARCHIVE_ROOT', default='') or None
+
+# Where export_history_parquet writes the analytics export (default: PRIVATE_ROOT/exports/order_history);
+# staff download it through the export endpoint, so keep it outside MEDIA_ROOT
+HISTORY_EXPORT_ROOT = config('HISTORY_EXPORT_ROOT', default='') or None
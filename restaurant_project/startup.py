@@ -0,0 +1,138 @@
+"""
+Process start-up: warm the application once before workers fork.
+
+With gunicorn's `preload_app` (see gunicorn.conf.py) the master imports
+the WSGI/ASGI application, which runs the settings (including their DNS
+checks for DB_HOST) and the pooler health check in wsgi.py once, and then
+`warm_up()` fills what every request would otherwise build lazily in each
+worker: the URL resolver, compiled templates (kept by the cached loader
+when DEBUG is off), the menu catalog, ranking and table snapshots, and the heavy
+ML imports (pandas, statsmodels). Workers inherit all of it through fork.
+
+The master closes its database connections before forking, so no socket
+is ever shared; `setup_worker()` then opens a worker's own persistent
+connection in `post_fork`. Each step's duration is logged.
+"""
+
+import importlib
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Imported in the master so that workers do not pay for them on first use
+WARM_MODULES = (
+    'restaurant.views',
+    'restaurant.ml',
+    'restaurant.ml.views',
+)
+
+
+@contextmanager
+def timed(step, timings):
+    """Time the block as `step`; failures are logged and do not propagate."""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        logger.warning(f"Warm-up step {step} failed: {e}")
+    finally:
+        timings[step] = round((time.perf_counter() - started) * 1000.0, 1)
+
+
+def _warm_urls():
+    from django.urls import get_resolver
+
+    resolver = get_resolver()
+    # Touching reverse_dict imports every URLconf and builds the reverse lookup tables
+    return len(resolver.reverse_dict)
+
+
+def _warm_templates():
+    """Load every template in DIRS and the app directories; returns (loaded, failed)."""
+    from django.template import engines
+    from django.template.utils import get_app_template_dirs
+
+    loaded = failed = 0
+    for engine in engines.all():
+        # APP_DIRS is off when the loaders are configured explicitly
+        directories = dict.fromkeys(tuple(engine.dirs) + get_app_template_dirs('templates'))
+        for directory in directories:
+            for root, _, files in os.walk(directory):
+                for filename in files:
+                    if not filename.endswith(('.html', '.txt')):
+                        continue
+                    name = os.path.relpath(os.path.join(root, filename), directory).replace(os.sep, '/')
+                    try:
+                        engine.get_template(name)
+                        loaded += 1
+                    except Exception:
+                        failed += 1
+    return loaded, failed
+
+
+def _warm_caches():
+    from restaurant import menu_catalog, menu_ranking, table_registry
+
+    catalog = menu_catalog.get_catalog()
+    menu_ranking.get_ranking()
+    table_registry.get_table_snapshot()
+    return len(catalog.items)
+
+
+def _warm_modules():
+    """Import WARM_MODULES; returns those that failed."""
+    failed = []
+    for module in WARM_MODULES:
+        try:
+            importlib.import_module(module)
+        except Exception as e:
+            logger.warning(f"Warm-up could not import {module}: {e}")
+            failed.append(module)
+    return failed
+
+
+def warm_up():
+    """Warm the loaded application in this process; returns {step: ms}."""
+    from django.db import connections
+
+    timings = {}
+    with timed('urls', timings):
+        _warm_urls()
+    with timed('templates', timings):
+        loaded, failed = _warm_templates()
+        logger.info(f"Warm-up: {loaded} templates loaded, {failed} failed")
+    with timed('menu_cache', timings):
+        _warm_caches()
+    with timed('modules', timings):
+        _warm_modules()
+    # Forked workers must not share the master's database sockets
+    connections.close_all()
+    logger.info(
+        f"Warm-up done in {sum(timings.values()):.0f}ms: "
+        + ', '.join(f'{step} {ms:.0f}ms' for step, ms in timings.items())
+    )
+    return timings
+
+
+def setup_worker(connect=True):
+    """Per-worker setup after fork: open this worker's database connection.
+
+    The connection is opened up front only when it outlives a request
+    (CONN_MAX_AGE); otherwise the first request would close it again.
+    Skip `connect` for workers that query from other threads (ASGI, gthread).
+    """
+    from django.db import connections
+
+    from restaurant_project.db_router import get_active_db_alias
+
+    started = time.perf_counter()
+    connection = connections[get_active_db_alias()]
+    if connect and connection.settings_dict.get('CONN_MAX_AGE'):
+        try:
+            connection.ensure_connection()
+        except Exception as e:
+            logger.warning(f"Worker {os.getpid()} could not connect to the database yet: {e}")
+    return round((time.perf_counter() - started) * 1000.0, 1)
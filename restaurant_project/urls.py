@@ -1,3 +1,5 @@
+from django.conf import settings
+from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path, include
 
@@ -6,3 +8,6 @@ urlpatterns = [
     path('accounts/', include('accounts.urls')),
     path('', include('restaurant.urls')),
 ]
+
+# Uploaded menu images and their thumbnails (served by the web server in production)
+urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)